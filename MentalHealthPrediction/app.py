@@ -1,100 +1,174 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
-import numpy as np
-import pickle
-import json
-import pandas as pd
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, g
+import calendar
+import concurrent.futures
+import hmac
+import io
+import logging
 import os
+import signal
+import sys
 import time
+import warnings
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-
-from models import db, User
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, set_password_policy, user_change_listeners
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from inference_pool import InferencePool, PoolSaturated
+from micro_batch import MicroBatcher
+from user_cache import UserCache
+from page_cache import PageCache
+import app_logging
+import batch_predict
+import dashboard_stats
+import db_profile
+import history_archive
+import history_store
+import static_assets
+import metrics
+import whatif
+from app_logging import log_event
+from explain import SHAP_AVAILABLE, BackgroundExplanations
+
+# Models are fitted on DataFrames but scored on plain arrays laid out as FEATURE_COLS
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
 app = Flask(__name__)
 # Use environment variable for SECRET_KEY in production, fallback for development
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(BASE_DIR, "instance", "users.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# DATABASE_URL (default: SQLite in instance/users.db), SQLite pragmas and pool sizes: see db_profile.py
+db_profile.configure(app, BASE_DIR)
+# 'sync' explains inline with a cached explainer, 'async' renders first and explains in a worker pool
+app.config['EXPLAIN_MODE'] = os.environ.get('EXPLAIN_MODE', 'sync')
+app.config['EXPLAIN_WORKERS'] = int(os.environ.get('EXPLAIN_WORKERS', '2'))
+# 'sklearn' scores with the pickled estimator, 'compiled' with its flattened NumPy copy (forest_engine.py)
+app.config['FOREST_ENGINE'] = os.environ.get('FOREST_ENGINE', 'sklearn')
+# Re-check bundle file checksums on every load (reads each array file once); they are hashed when published
+app.config['MODEL_BUNDLE_VERIFY'] = os.environ.get('MODEL_BUNDLE_VERIFY', '0') == '1'
+# Signal that triggers a background model reload in the receiving process ('' disables). A real-time
+# signal by default: gunicorn owns HUP/USR1/USR2/TTIN/TTOU/WINCH and resets them in every worker.
+app.config['MODEL_RELOAD_SIGNAL'] = os.environ.get('MODEL_RELOAD_SIGNAL', 'SIGRTMIN+1')
+# Seconds between background artifact mtime checks (0 disables; reload via signal or /admin/reload)
+app.config['MODEL_WATCH_INTERVAL'] = float(os.environ.get('MODEL_WATCH_INTERVAL', '0'))
+# Token required by POST /admin/reload (disabled when unset), /metrics and the full /status. Sent as the
+# X-Admin-Token header, or as "Authorization: Bearer <token>" (what Prometheus scrape configs send)
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN', '')
+# In-process prediction cache: max entries, TTL in seconds, and an optional SQLite file shared by workers
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', '4096'))
+app.config['PREDICTION_CACHE_TTL'] = float(os.environ.get('PREDICTION_CACHE_TTL', '3600'))
+app.config['PREDICTION_CACHE_PATH'] = os.environ.get('PREDICTION_CACHE_PATH', '')
+# Rows encoded and scored per predict_proba call by the batch API
+app.config['BATCH_CHUNK_SIZE'] = int(os.environ.get('BATCH_CHUNK_SIZE', '1000'))
+# Bounded pool for the CPU-bound forest + SHAP work of /predict (0 workers = run inline in the request thread).
+# Beyond INFERENCE_QUEUE waiting jobs requests get 503 with Retry-After instead of queueing.
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', '0'))
+app.config['INFERENCE_QUEUE'] = int(os.environ.get('INFERENCE_QUEUE', '8'))
+app.config['INFERENCE_POOL'] = os.environ.get('INFERENCE_POOL', 'thread')  # 'thread' or 'process' (needs model/bundle)
+app.config['INFERENCE_TIMEOUT'] = float(os.environ.get('INFERENCE_TIMEOUT', '30'))
+app.config['RETRY_AFTER'] = int(os.environ.get('RETRY_AFTER', '1'))
+# Largest perturbation grid /api/whatif scores in one call (pairwise changes are dropped beyond it)
+app.config['WHATIF_MAX_ROWS'] = int(os.environ.get('WHATIF_MAX_ROWS', str(whatif.MAX_ROWS)))
+# Micro-batching of /predict: hold a batch open up to PREDICT_BATCH_WAIT_MS (0 disables) or
+# PREDICT_BATCH_MAX rows, then score it with one predict_proba and one SHAP call
+app.config['PREDICT_BATCH_WAIT_MS'] = float(os.environ.get('PREDICT_BATCH_WAIT_MS', '0'))
+app.config['PREDICT_BATCH_MAX'] = int(os.environ.get('PREDICT_BATCH_MAX', '32'))
+# Cached current_user lookups: entries per process (0 disables) and seconds before a row is re-read
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', '60'))
+# werkzeug method for new password hashes; logins re-hash passwords stored under a different method or cost
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# Rendered resources/settings pages kept per process (0 disables; ETag revalidation still applies)
+app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('PAGE_CACHE_SIZE', '2048'))
+# Prediction history older than HISTORY_HOT_DAYS is moved from the database into compressed archive files
+# (history_archive.py, under HISTORY_ARCHIVE_DIR) every HISTORY_COMPACT_INTERVAL seconds (0: only via its CLI)
+app.config['HISTORY_HOT_DAYS'] = int(os.environ.get('HISTORY_HOT_DAYS', '90'))
+app.config['HISTORY_COMPACT_INTERVAL'] = float(os.environ.get('HISTORY_COMPACT_INTERVAL', '0'))
+# Build the SHAP explainer at startup instead of on the first /predict (gunicorn.conf.py turns
+# this on with preload, so the master builds it once and every worker inherits it)
+app.config['WARM_EXPLAINER'] = os.environ.get('WARM_EXPLAINER', '0') == '1'
+# Structured logging: level (DEBUG logs every prediction's input vector) and 'json' or 'text' lines
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+
+app_logging.configure(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
 
 db.init_app(app)
+db_profile.attach(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+set_password_policy(app.config['PASSWORD_HASH_METHOD'])
+
+user_cache = None
+if app.config['USER_CACHE_SIZE'] > 0:
+    user_cache = UserCache(max_entries=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+    user_change_listeners.append(user_cache.invalidate)
+
+
+def _get_user(user_id):
+    return db.session.get(User, user_id)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    if user_cache is not None:
+        return user_cache.get(int(user_id), _get_user)
+    return _get_user(int(user_id))
 
 # Paths for model artifacts (relative to this file's directory)
 MODEL_PATH = os.path.join(BASE_DIR, 'model', 'rf_model.pkl')
 ENCODER_PATH = os.path.join(BASE_DIR, 'model', 'label_encoder.pkl')
 FEATURES_PATH = os.path.join(BASE_DIR, 'model', 'feature_columns.json')
 ORIG_PATH = os.path.join(BASE_DIR, 'model', 'original_features.json')
+# Memory-mapped bundle written by the training scripts; preferred over the files above when present
+BUNDLE_DIR = os.path.join(BASE_DIR, 'model', 'bundle')
 
-# Globals to hold loaded artifacts and mtimes
-model = None
-encoder = None
-FEATURE_COLS = []
-ORIGINAL_FEATURES = []
-_mtimes = {}
-
-def load_model_files(force=False):
-    global model, encoder, FEATURE_COLS, ORIGINAL_FEATURES, _mtimes
-    paths = [MODEL_PATH, ENCODER_PATH, FEATURES_PATH, ORIG_PATH]
-    changed = force
-    for p in paths:
-        try:
-            m = os.path.getmtime(p)
-        except Exception:
-            m = None
-        if p not in _mtimes or (_mtimes[p] is None and m is not None) or (m is not None and m != _mtimes.get(p)):
-            changed = True
-        _mtimes[p] = m
-    if not changed and model is not None:
+HISTORY_PAGE_SIZE = 50
+DASHBOARD_RECENT = 5
+
+# Active artifact bundle; requests read registry.active once and use that bundle throughout
+registry = ModelRegistry(MODEL_PATH, ENCODER_PATH, FEATURES_PATH, ORIG_PATH, engine=app.config['FOREST_ENGINE'],
+                         bundle_dir=BUNDLE_DIR, verify=app.config['MODEL_BUNDLE_VERIFY'])
+
+
+def load_model_files(force=False, wait=True):
+    """Load the artifacts on disk and swap them in atomically if they changed."""
+    return registry.reload(force=force, wait=wait)
+
+
+def _reload_on_signal(signum, frame):
+    log_event(logging.INFO, 'reload_signal', signum=signum)
+    registry.reload(wait=False)
+
+
+# Signals the gunicorn master or its workers act on; a handler for one of these would never fire in a worker
+GUNICORN_SIGNALS = ('SIGHUP', 'SIGQUIT', 'SIGINT', 'SIGTERM', 'SIGTTIN', 'SIGTTOU', 'SIGUSR1', 'SIGUSR2', 'SIGWINCH')
+
+
+def _signal_number(name):
+    """Signal number for 'SIGUSR2'-style names and 'SIGRTMIN+N'."""
+    base, _, offset = name.partition('+')
+    return getattr(signal, base) + int(offset or 0)
+
+
+def install_reload_signal():
+    """Install the MODEL_RELOAD_SIGNAL handler in this process (gunicorn.conf.py calls it again in each worker)."""
+    name = app.config['MODEL_RELOAD_SIGNAL']
+    if not name:
+        return
+    if name in GUNICORN_SIGNALS and 'gunicorn' in sys.modules:
+        log_event(logging.WARNING, 'reload_signal_unavailable', signal=name, error='reserved by gunicorn')
         return
-    # reload
     try:
-        if os.path.exists(MODEL_PATH):
-            with open(MODEL_PATH, 'rb') as f:
-                model = pickle.load(f)
-            print(f'Model loaded from {MODEL_PATH}')
-        else:
-            print(f'Warning: Model file not found at {MODEL_PATH}')
-            model = None
-            
-        if os.path.exists(ENCODER_PATH):
-            with open(ENCODER_PATH, 'rb') as f:
-                encoder = pickle.load(f)
-            print(f'Encoder loaded from {ENCODER_PATH}')
-        else:
-            print(f'Warning: Encoder file not found at {ENCODER_PATH}')
-            encoder = None
-            
-        if os.path.exists(FEATURES_PATH):
-            with open(FEATURES_PATH, 'r', encoding='utf-8') as f:
-                FEATURE_COLS = json.load(f)
-            print(f'Feature columns loaded from {FEATURES_PATH}')
-        else:
-            print(f'Warning: Feature columns file not found at {FEATURES_PATH}')
-            FEATURE_COLS = []
-            
-        if os.path.exists(ORIG_PATH):
-            with open(ORIG_PATH, 'r', encoding='utf-8') as f:
-                ORIGINAL_FEATURES = json.load(f)
-            print(f'Original features loaded from {ORIG_PATH}')
-        else:
-            print(f'Warning: Original features file not found at {ORIG_PATH}')
-            ORIGINAL_FEATURES = []
-            
-        if model and encoder and FEATURE_COLS and ORIGINAL_FEATURES:
-            print('All model artifacts loaded successfully')
-        else:
-            print('Warning: Some model artifacts are missing')
-    except Exception as e:
-        print(f'Error loading model artifacts: {e}')
-        import traceback
-        traceback.print_exc()
+        signal.signal(_signal_number(name), _reload_on_signal)
+    except (AttributeError, ValueError, OSError) as e:
+        log_event(logging.WARNING, 'reload_signal_unavailable', signal=name, error=str(e))
 
 with app.app_context():
     db.create_all()
@@ -102,12 +176,83 @@ with app.app_context():
 # Initial load
 load_model_files(force=True)
 
-# Try to import shap; if unavailable we'll fall back to importance proxy
-try:
-    import shap
-    SHAP_AVAILABLE = True
-except Exception:
-    SHAP_AVAILABLE = False
+# Optional reload triggers: a signal to this process and/or a background mtime watcher
+install_reload_signal()
+registry.watch(app.config['MODEL_WATCH_INTERVAL'])
+
+if app.config['WARM_EXPLAINER'] and registry.active.complete and SHAP_AVAILABLE:
+    try:
+        registry.active.explainer.tree_explainer
+    except Exception as e:
+        log_event(logging.WARNING, 'explainer_warmup_failed', error=str(e))
+
+history_compactor = history_archive.Compactor(app, app.config['HISTORY_COMPACT_INTERVAL'], app.config['HISTORY_HOT_DAYS'])
+history_compactor.start()
+
+# With gunicorn --preload everything above ran once in the master; threads do not survive fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.after_fork)
+    os.register_at_fork(after_in_child=history_compactor.after_fork)
+
+# Fingerprinted, precompressed static assets behind url_for('static', ...)
+static_assets.init_app(app)
+# Compile every template now instead of on each one's first request
+for _template in app.jinja_env.list_templates():
+    app.jinja_env.get_template(_template)
+page_cache = PageCache(app, max_entries=app.config['PAGE_CACHE_SIZE'])
+
+# Memoized scores keyed on (model version, encoded row); PREDICTION_CACHE_SIZE=0 disables it
+prediction_cache = None
+if app.config['PREDICTION_CACHE_SIZE'] > 0:
+    prediction_cache = PredictionCache(max_entries=app.config['PREDICTION_CACHE_SIZE'],
+                                       ttl=app.config['PREDICTION_CACHE_TTL'],
+                                       disk_path=app.config['PREDICTION_CACHE_PATH'] or None)
+
+inference_pool = None
+if app.config['INFERENCE_WORKERS'] > 0:
+    inference_pool = InferencePool(workers=app.config['INFERENCE_WORKERS'], max_queue=app.config['INFERENCE_QUEUE'],
+                                   kind=app.config['INFERENCE_POOL'], retry_after=app.config['RETRY_AFTER'],
+                                   bundle_dir=BUNDLE_DIR if os.path.exists(os.path.join(BUNDLE_DIR, 'manifest.json')) else None)
+
+predict_batcher = None
+if app.config['PREDICT_BATCH_WAIT_MS'] > 0:
+    predict_batcher = MicroBatcher(max_wait_ms=app.config['PREDICT_BATCH_WAIT_MS'],
+                                   max_batch=app.config['PREDICT_BATCH_MAX'], pool=inference_pool)
+
+# Background explanation pool, only started when EXPLAIN_MODE=async
+background_explanations = None
+if app.config['EXPLAIN_MODE'] == 'async':
+    background_explanations = BackgroundExplanations(workers=app.config['EXPLAIN_WORKERS'])
+
+
+def _stage(stage):
+    """Time one stage of the current request into the mhp_stage_seconds histogram."""
+    return metrics.STAGE_SECONDS.time(endpoint=request.endpoint, stage=stage)
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unknown',
+                                        status=response.status_code)
+    return response
+
+
+def _busy_response(retry_after):
+    """503 telling the client when to retry; sent when the inference pool is full."""
+    if request.accept_mimetypes.best == 'application/json' or request.path.startswith('/api/'):
+        resp = jsonify({'error': 'busy', 'retry_after': retry_after})
+    else:
+        resp = Response(f'The server is busy. Please try again in {retry_after} seconds.', mimetype='text/plain')
+    resp.status_code = 503
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp
 
 
 @app.route("/")
@@ -121,94 +266,66 @@ def home():
 @app.route("/history")
 @login_required
 def history():
+    page = max(request.args.get('page', 1, type=int), 1)
     rows = []
+    has_more = False
     try:
-        with open(os.path.join(BASE_DIR, 'data', 'history.csv'), 'r', encoding='utf-8') as f:
-            next(f)  # skip header
-            for line in f:
-                parts = line.strip().split(',', 4)
-                if len(parts) == 5 and parts[0] == str(current_user.id):
-                    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(parts[1]))) if parts[1].isdigit() else parts[1]
-                    prob = float(parts[2]) if parts[2] != '' else None
-                    rows.append((ts, prob, parts[3], parts[4]))
+        with _stage('history_read'):
+            # fetch one extra row to know whether an older page exists
+            entries = history_store.recent_history(current_user.id, limit=HISTORY_PAGE_SIZE + 1, offset=(page - 1) * HISTORY_PAGE_SIZE)
+        has_more = len(entries) > HISTORY_PAGE_SIZE
+        rows = [(history_store.format_timestamp(ts), prob, risk, summary) for ts, prob, risk, summary in entries[:HISTORY_PAGE_SIZE]]
     except Exception as e:
-        print('History read error:', e)
-    rows = list(reversed(rows))[:50]
-    return render_template('history.html', rows=rows)
+        log_event(logging.WARNING, 'history_read_failed', error=str(e))
+    with _stage('render'):
+        return render_template('history.html', rows=rows, page=page, has_more=has_more)
+
+
+def _parse_day(value):
+    """Unix time of 00:00 UTC on a YYYY-MM-DD date (None when absent)."""
+    if not value:
+        return None
+    return calendar.timegm(time.strptime(value, '%Y-%m-%d'))
+
+
+@app.route("/history/export")
+@login_required
+def history_export():
+    """Stream all of the current user's predictions, oldest first, as CSV (default) or JSON (?format=json).
+
+    Optional ?since= and ?until= (YYYY-MM-DD, UTC, until exclusive) limit the range.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'json'):
+        return jsonify({'error': "format must be 'csv' or 'json'"}), 400
+    try:
+        since, until = _parse_day(request.args.get('since')), _parse_day(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since and until must be dates (YYYY-MM-DD)'}), 400
+    rows = history_store.iter_user_history(current_user.id, since=since, until=until)
+    if fmt == 'json':
+        body, mimetype = history_store.iter_export_json(rows), 'application/json'
+    else:
+        body, mimetype = history_store.iter_export_csv(rows), 'text/csv'
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename=prediction-history.{fmt}'
+    resp.headers['Cache-Control'] = 'private, no-store'
+    return resp
 
 
 @app.route("/predict", methods=["POST"])
 @login_required
 def predict():
-    # Reload model files if they were updated on disk (auto-reload after retrain)
-    load_model_files()
-
-    # Build an input row using ORIGINAL_FEATURES (pre-one-hot) and then one-hot encode
-    orig_row = {c: 0 for c in ORIGINAL_FEATURES}
-
-    # Sensible defaults for removed inputs
-    defaults = {
-        "id": 1,
-        "City": "Unknown",
-        "Profession": "Other",
-        "Job Satisfaction": 3,
-        "Dietary Habits": "Moderate",
-        "Have you ever had suicidal thoughts ?": "No"
-    }
-    for k, v in defaults.items():
-        if k in orig_row:
-            orig_row[k] = v
-
-    for key, val in request.form.items():
-        if key in orig_row:
-            # try to parse numeric values, otherwise keep as string for categorical
-            try:
-                orig_row[key] = float(val)
-            except Exception:
-                orig_row[key] = val
-
-    df_orig = pd.DataFrame([orig_row])
-    
-    # Separate numeric and categorical columns
-    numeric_cols = []
-    categorical_cols = []
-    
-    for col in df_orig.columns:
-        if pd.api.types.is_numeric_dtype(df_orig[col]):
-            numeric_cols.append(col)
-        else:
-            categorical_cols.append(col)
-    
-    # Process categorical columns with get_dummies
-    df_dummied_list = []
-    
-    if numeric_cols:
-        df_dummied_list.append(df_orig[numeric_cols])
-    
-    if categorical_cols:
-        try:
-            df_categorical = pd.get_dummies(df_orig[categorical_cols], drop_first=True)
-            if not df_categorical.empty:
-                df_dummied_list.append(df_categorical)
-        except Exception as e:
-            print(f'Error in get_dummies: {e}')
-            # If get_dummies fails, try without drop_first
-            try:
-                df_categorical = pd.get_dummies(df_orig[categorical_cols], drop_first=False)
-                if not df_categorical.empty:
-                    df_dummied_list.append(df_categorical)
-            except Exception as e2:
-                print(f'Error in get_dummies (without drop_first): {e2}')
-    
-    # Combine all DataFrames
-    if df_dummied_list:
-        df_dummied = pd.concat(df_dummied_list, axis=1)
-    else:
-        # Fallback: create empty DataFrame with feature columns
-        df_dummied = pd.DataFrame(columns=FEATURE_COLS)
-    
-    # Reindex to the exact columns used during training
-    X_input = df_dummied.reindex(columns=FEATURE_COLS, fill_value=0)
+    # One bundle for the whole request, even if a reload swaps in a new one meanwhile
+    bundle = registry.active
+    model, encoder, FEATURE_COLS = bundle.model, bundle.encoder, bundle.feature_cols
+
+    # Parse the form into the pre-one-hot row, then map it straight onto FEATURE_COLS
+    feature_encoder = bundle.feature_encoder
+    with _stage('parse'):
+        orig_row = feature_encoder.parse_form(request.form)
+    with _stage('encode'):
+        X_input = feature_encoder.encode(orig_row)
 
     # Validate that model and encoder are loaded
     if model is None:
@@ -223,58 +340,43 @@ def predict():
         flash('Error: Feature columns not loaded. Please ensure feature_columns.json exists in the model directory.')
         return redirect(url_for('home'))
 
-    # Predict (get probabilities and predicted class)
-    try:
-        probs = model.predict_proba(X_input)[0]
-    except Exception as e:
-        print(f'Error in predict_proba: {e}')
-        probs = None
-
-    try:
-        pred = model.predict(X_input)
-        result = encoder.inverse_transform(pred)[0]
-    except Exception as e:
-        flash(f'Error making prediction: {str(e)}')
-        return redirect(url_for('home'))
-
-    # determine positive-class index (class representing 'at risk' = 1)
-    try:
-        pos_index = list(encoder.classes_).index(1)
-    except Exception:
-        pos_index = 1 if len(encoder.classes_) > 1 else 0
-    prob_pos = float(probs[pos_index]) if probs is not None else None
-
-    # Log the input vector and probability for debugging
-    print("Constructed input (nonzero):", [c for c, v in X_input.iloc[0].items() if v != 0][:60])
-    print("Predicted probs:", probs)
-
-    # Map model result to human-friendly risk levels
-    def map_to_risk(res):
-        # try numeric mapping first
-        try:
-            r = int(res)
-            mapping = {0: "Low Risk", 1: "Moderate Risk", 2: "High Risk"}
-            return mapping.get(r, f"Risk Level {r}")
-        except Exception:
-            s = str(res).lower()
-            if "low" in s:
-                return "Low Risk"
-            if "moder" in s:
-                return "Moderate Risk"
-            if "high" in s or "severe" in s:
-                return "High Risk"
-            return "Unknown Risk"
-
-    # Map risk by probability if available (better UX)
-    if prob_pos is not None:
-        if prob_pos < 0.33:
-            risk_label = "Low Risk"
-        elif prob_pos < 0.66:
-            risk_label = "Moderate Risk"
-        else:
-            risk_label = "High Risk"
+    # Identical feature vectors under the same model version reuse the earlier score (and explanation)
+    with _stage('cache_lookup'):
+        cached = prediction_cache.get(bundle.version, X_input) if prediction_cache is not None else None
+    if cached is not None:
+        score, top_contribs = cached
     else:
-        risk_label = map_to_risk(result)
+        # Predict: probabilities, class, decoded label and risk level from one forest pass
+        try:
+            with _stage('inference'):
+                # sync explanations ride along in the same batch or pool job
+                explain_now = background_explanations is None
+                if predict_batcher is not None:
+                    score, top_contribs = predict_batcher.score(bundle, X_input, explain=explain_now,
+                                                                timeout=app.config['INFERENCE_TIMEOUT'])
+                elif inference_pool is not None:
+                    _, score, top_contribs = inference_pool.score(bundle, X_input, explain=explain_now,
+                                                                  timeout=app.config['INFERENCE_TIMEOUT'])
+                else:
+                    score, top_contribs = bundle.scorer.score(X_input), None
+                if top_contribs is not None and prediction_cache is not None:
+                    prediction_cache.put(bundle.version, X_input, score, top_contribs)
+        except PoolSaturated as e:
+            return _busy_response(e.retry_after)
+        except concurrent.futures.TimeoutError:
+            log_event(logging.WARNING, 'inference_timeout', timeout=app.config['INFERENCE_TIMEOUT'])
+            return _busy_response(app.config['RETRY_AFTER'])
+        except Exception as e:
+            log_event(logging.ERROR, 'prediction_failed', error=str(e), version=bundle.version)
+            flash(f'Error making prediction: {str(e)}')
+            return redirect(url_for('home'))
+    result, prob_pos, risk_label = score.prediction, score.probability, score.risk_label
+    pos_index = bundle.scorer.pos_index
+
+    # Log the input vector and probability for debugging (only built when LOG_LEVEL=DEBUG)
+    if app_logging.debug_enabled():
+        log_event(logging.DEBUG, 'prediction', version=bundle.version, cached=cached is not None,
+                  nonzero=feature_encoder.nonzero_columns(X_input), probabilities=[float(p) for p in score.probabilities])
 
     awareness_msgs = {
         "Low Risk": "You appear to be at low risk. Keep maintaining healthy routines, sleep, and social support. If anything changes, check in with a trusted person.",
@@ -284,42 +386,199 @@ def predict():
 
     awareness = awareness_msgs.get(risk_label, "If you're unsure what this means, consider consulting a health professional.")
 
-    # Compute local explanations (top contributors)
-    top_contribs = []
+    # Compute local explanations (top contributors) with the explainer cached per model
+    explain_token = None
+    if top_contribs is None:
+        top_contribs = []
+        explainer = bundle.explainer
+        try:
+            with _stage('explain'):
+                if background_explanations is not None and SHAP_AVAILABLE:
+                    # render straight away with the cheap proxy; SHAP values are polled from /explain/<token>
+                    top_contribs = explainer.proxy_contributions(X_input)
+                    explain_token = background_explanations.submit(explainer, X_input, pos_index)
+                    if prediction_cache is not None and cached is None:
+                        prediction_cache.put(bundle.version, X_input, score, None)
+                else:
+                    top_contribs = explainer.contributions(X_input, pos_index)
+                    if prediction_cache is not None:
+                        prediction_cache.put(bundle.version, X_input, score, top_contribs)
+        except Exception as e:
+            log_event(logging.WARNING, 'explain_failed', error=str(e), version=bundle.version)
+
+    # Append anonymized entry to the prediction history
     try:
-        if SHAP_AVAILABLE:
-            explainer = shap.TreeExplainer(model)
-            sv = explainer.shap_values(X_input)
-            # shap returns a list for multiclass; for binary take index for positive class
-            if isinstance(sv, list) and len(sv) > 1:
-                local_shap = sv[1][0]
-            else:
-                local_shap = sv[0][0]
-            abs_idx = list(np.argsort(-np.abs(local_shap)))
-            for i in abs_idx[:6]:
-                top_contribs.append((FEATURE_COLS[i], float(local_shap[i])))
-        else:
-            # fallback: use model.feature_importances_ * feature value as proxy
-            fi = getattr(model, 'feature_importances_', None)
-            if fi is not None:
-                proxy = (X_input.values[0] * fi)
-                idx = list(np.argsort(-np.abs(proxy)))
-                for i in idx[:6]:
-                    if X_input.values[0][i] != 0:
-                        top_contribs.append((FEATURE_COLS[i], float(proxy[i])))
+        with _stage('history_write'):
+            history_store.append_prediction(current_user.id, prob_pos, risk_label, history_store.build_summary(orig_row))
     except Exception as e:
-        print('Explainability error:', e)
+        log_event(logging.WARNING, 'history_write_failed', error=str(e))
+
+    with _stage('render'):
+        return render_template("result.html", prediction=result, risk_label=risk_label, awareness=awareness, probability=prob_pos, contributions=top_contribs, explain_token=explain_token, inputs=orig_row)
 
-    # Append anonymized entry to history log
+
+@app.route('/explain/<token>')
+@login_required
+def explain_status(token):
+    result = background_explanations.get(token) if background_explanations is not None else None
+    if result is None:
+        return jsonify({'status': 'unknown', 'contributions': []}), 404
+    return jsonify(result)
+
+
+@app.route('/api/predict/batch', methods=['POST'])
+@login_required
+def predict_batch():
+    """Score many records at once.
+
+    Accepts a JSON list of records (or {"records": [...], "top_k": N}), a CSV
+    upload in the `file` field, or a text/csv body. Results are streamed back as
+    a JSON array (or CSV with ?format=csv) chunk by chunk.
+    """
+    # hold on to this request's bundle even if a reload happens mid-stream
+    bundle = registry.active
+    if not bundle.complete:
+        return jsonify({'error': 'Model artifacts are not loaded'}), 503
+
+    top_k = request.args.get('top_k', 0)
+    payload = request.get_json(silent=True) if request.is_json else None
+    if isinstance(payload, dict):
+        top_k = payload.get('top_k', top_k)
+        payload = payload.get('records')
     try:
-        os.makedirs(os.path.join(BASE_DIR, 'data'), exist_ok=True)
-        summary = ','.join([f"{k}={v}" for k, v in list(orig_row.items()) if k in ['Academic Pressure','Work Pressure','Study Satisfaction','Financial Stress']])
-        with open(os.path.join(BASE_DIR, 'data', 'history.csv'), 'a', encoding='utf-8') as hf:
-            hf.write(f"{current_user.id},{int(time.time())},{prob_pos if prob_pos is not None else ''},{risk_label},{summary}\n")
-    except Exception as e:
-        print('History log error:', e)
+        top_k = int(top_k or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_k must be an integer'}), 400
+    if request.is_json:
+        if not isinstance(payload, list) or not all(isinstance(r, dict) for r in payload):
+            return jsonify({'error': 'Expected a JSON list of records'}), 400
+        records = payload
+    elif 'file' in request.files:
+        records = batch_predict.iter_uploaded_csv_records(request.files['file'].stream)
+    elif request.mimetype == 'text/csv':
+        records = batch_predict.iter_csv_records(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''))
+    else:
+        return jsonify({'error': 'Send a JSON list of records or a CSV file'}), 400
 
-    return render_template("result.html", prediction=result, risk_label=risk_label, awareness=awareness, probability=prob_pos, contributions=top_contribs, inputs=orig_row)
+    results = batch_predict.score_records(records, bundle.scorer, bundle.feature_encoder,
+                                          explainer=bundle.explainer if top_k > 0 else None, top_k=top_k,
+                                          chunk_size=app.config['BATCH_CHUNK_SIZE'])
+    if request.args.get('format') == 'csv':
+        return Response(stream_with_context(batch_predict.iter_csv_output(results, with_contributors=top_k > 0)), mimetype='text/csv')
+    return Response(stream_with_context(batch_predict.iter_json_array(results)), mimetype='application/json')
+
+
+@app.route('/api/whatif', methods=['POST'])
+@login_required
+def whatif_sensitivity():
+    """How the risk of one input row changes when single fields (or pairs of fields) change.
+
+    Accepts {"inputs": {...}, "pairs": false, "fields": [...], "top_pairs": 10}, where
+    inputs is the row shown on the result page. The whole grid of perturbations is
+    scored in one batched model call.
+    """
+    bundle = registry.active
+    if not bundle.complete:
+        return jsonify({'error': 'Model artifacts are not loaded'}), 503
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('inputs'), dict):
+        return jsonify({'error': 'Expected {"inputs": {...}}'}), 400
+    fields = payload.get('fields')
+    if fields is not None and not (isinstance(fields, list) and all(isinstance(f, str) for f in fields)):
+        return jsonify({'error': 'fields must be a list of feature names'}), 400
+    try:
+        top_pairs = int(payload.get('top_pairs', whatif.TOP_PAIRS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_pairs must be an integer'}), 400
+
+    with _stage('encode'):
+        orig_row = bundle.feature_encoder.parse_form(payload['inputs'])
+        X, changes = whatif.build_grid(bundle.feature_encoder, orig_row, fields=fields, pairs=bool(payload.get('pairs')),
+                                       max_rows=app.config['WHATIF_MAX_ROWS'])
+    try:
+        with _stage('inference'):
+            if inference_pool is not None:
+                _, scores, _ = inference_pool.submit_batch(bundle, X, [], 0).result(timeout=app.config['INFERENCE_TIMEOUT'])
+                prob_pos = [s.probability for s in scores]
+            else:
+                _, _, prob_pos = bundle.scorer.score_many(X)
+    except PoolSaturated as e:
+        return _busy_response(e.retry_after)
+    except concurrent.futures.TimeoutError:
+        log_event(logging.WARNING, 'inference_timeout', timeout=app.config['INFERENCE_TIMEOUT'])
+        return _busy_response(app.config['RETRY_AFTER'])
+    result = whatif.sensitivity(orig_row, changes, prob_pos, top_pairs=max(0, top_pairs))
+    result['version'] = bundle.version
+    return jsonify(result)
+
+
+def _is_admin():
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        return False
+    sent = request.headers.get('X-Admin-Token', '')
+    if not sent and request.authorization is not None and request.authorization.type == 'bearer':
+        sent = request.authorization.token or ''
+    # bytes: compare_digest raises TypeError on non-ASCII str
+    return hmac.compare_digest(sent.encode('utf-8'), token.encode('utf-8'))
+
+
+@app.route('/status')
+def status():
+    """Model version for anyone; process, database and cache internals only with the admin token."""
+    model = registry.status()
+    if not _is_admin():
+        return jsonify({'version': model['version'], 'complete': model['complete']})
+    return jsonify({
+        'model': model,
+        'database': db_profile.describe(db.engine),
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else None,
+        'inference_pool': inference_pool.stats() if inference_pool is not None else None,
+        'predict_batcher': predict_batcher.stats() if predict_batcher is not None else None,
+        'user_cache': user_cache.stats() if user_cache is not None else None,
+        'page_cache': page_cache.stats(),
+        'history_archive': history_compactor.status(),
+    })
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's latency histograms and counters (admin token required)."""
+    if not _is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    extra = []
+    bundle = registry.active
+    extra += metrics.render_samples('mhp_model_info', 'Active model version in this worker.', 'gauge',
+                                    [({'version': bundle.version if bundle else '', 'engine': registry.engine}, 1)])
+    extra += metrics.render_samples('mhp_model_reloads_total', 'Successful model reloads in this worker.', 'counter',
+                                    [({}, registry.reloads)])
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        extra += metrics.render_samples('mhp_prediction_cache_lookups_total', 'Prediction cache lookups by result.', 'counter',
+                                        [({'result': 'hit'}, stats['hits']), ({'result': 'disk_hit'}, stats['disk_hits']),
+                                         ({'result': 'miss'}, stats['misses'])])
+        extra += metrics.render_samples('mhp_prediction_cache_entries', 'Entries in the in-process prediction cache.', 'gauge',
+                                        [({}, stats['entries'])])
+    if user_cache is not None:
+        stats = user_cache.stats()
+        extra += metrics.render_samples('mhp_user_cache_lookups_total', 'current_user lookups by result.', 'counter',
+                                        [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])])
+    if inference_pool is not None:
+        stats = inference_pool.stats()
+        extra += metrics.render_samples('mhp_inference_in_flight', 'Inference jobs running or queued in the pool.', 'gauge',
+                                        [({'kind': stats['kind']}, stats['in_flight'])])
+        extra += metrics.render_samples('mhp_inference_jobs_total', 'Inference pool jobs by outcome.', 'counter',
+                                        [({'outcome': 'completed'}, stats['completed']), ({'outcome': 'rejected'}, stats['rejected'])])
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Start a background reload in the worker that receives this request."""
+    if not _is_admin():
+        return jsonify({'error': 'forbidden'}), 403
+    started = registry.reload(force=request.args.get('force') == '1', wait=False)
+    return jsonify({'started': started, 'model': registry.status()}), 202
 
 
 @app.route('/signup', methods=['GET', 'POST'])
@@ -328,16 +587,26 @@ def signup():
         username = request.form.get('username')
         email = request.form.get('email')
         password = request.form.get('password')
-        if User.query.filter_by(username=username).first():
+        # one lookup over both unique indexes instead of a query per column
+        taken = db.session.execute(
+            db.select(User.username, User.email).where(or_(User.username == username, User.email == email))
+        ).all()
+        if any(row.username == username for row in taken):
             flash('Username already exists')
             return redirect(url_for('signup'))
-        if User.query.filter_by(email=email).first():
+        if taken:
             flash('Email already exists')
             return redirect(url_for('signup'))
         user = User(username=username, email=email)
         user.set_password(password)
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # another signup took the name or email between the check and the insert
+            db.session.rollback()
+            flash('Username or email already exists')
+            return redirect(url_for('signup'))
         flash('Account created successfully')
         return redirect(url_for('login'))
     return render_template('signup.html')
@@ -350,6 +619,8 @@ def login():
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            if user.rehash_if_needed(password):
+                db.session.commit()
             login_user(user)
             return redirect(url_for('dashboard'))
         flash('Invalid username or password')
@@ -365,41 +636,31 @@ def logout():
 
 @app.route('/resources')
 @login_required
+@page_cache.cached('username')
 def resources():
     return render_template('resources.html')
 
 @app.route('/settings')
 @login_required
+@page_cache.cached('id', 'username', 'email')
 def settings():
     return render_template('settings.html')
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Fetch recent predictions for the user
+    # Precomputed aggregates (count, probability stats, risk mix per window, trend) and the newest entries
+    stats = None
     recent_predictions = []
     try:
-        with open(os.path.join(BASE_DIR, 'data', 'history.csv'), 'r', encoding='utf-8') as f:
-            next(f)  # skip header
-            for line in f:
-                parts = line.strip().split(',', 4)
-                if len(parts) == 5 and parts[0] == str(current_user.id):
-                    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(parts[1]))) if parts[1].isdigit() else parts[1]
-                    prob = float(parts[2]) if parts[2] != '' else None
-                    risk = parts[3]
-                    summary = parts[4] if len(parts) > 4 else ''
-                    recent_predictions.append({
-                        'timestamp': ts,
-                        'probability': prob,
-                        'risk': risk,
-                        'summary': summary
-                    })
+        with _stage('history_read'):
+            stats = dashboard_stats.summary(current_user.id)
+        for e in stats['recent'][:DASHBOARD_RECENT]:
+            recent_predictions.append(dict(e, timestamp=history_store.format_timestamp(e['timestamp'])))
     except Exception as e:
-        print('Dashboard history error:', e)
-    # Reverse to get most recent first, then take last 5
-    recent_predictions.reverse()
-    recent_predictions = recent_predictions[-5:] if len(recent_predictions) > 5 else recent_predictions
-    return render_template('dashboard.html', recent_predictions=recent_predictions)
+        log_event(logging.WARNING, 'dashboard_history_failed', error=str(e))
+    with _stage('render'):
+        return render_template('dashboard.html', recent_predictions=recent_predictions, stats=stats)
 
 
 if __name__ == "__main__":
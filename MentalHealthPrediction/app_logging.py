@@ -0,0 +1,57 @@
+import json
+import logging
+import sys
+import time
+
+# Structured application logger. Every record is one line: JSON by default
+# (LOG_FORMAT=json) or "key=value" text. Per-request debug output (input vector,
+# probabilities) is logged at DEBUG, so with the default INFO level the hot path
+# skips both building the message and writing to stdout.
+
+LOGGER_NAME = 'mental_health'
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+        parts = [stamp, record.levelname, record.getMessage()]
+        parts.extend(f'{k}={v}' for k, v in (getattr(record, 'fields', None) or {}).items())
+        line = ' '.join(parts)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def configure(level='INFO', fmt='json', stream=None):
+    """Attach a single stream handler to the application logger."""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else KeyValueFormatter())
+    logger.handlers[:] = [handler]
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    logger.propagate = False
+    return logger
+
+
+def log_event(level, event, exc_info=False, **fields):
+    """Log `event` with structured fields, e.g. log_event(logging.WARNING, 'history_write_failed', error=str(e))."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+
+def debug_enabled():
+    return logger.isEnabledFor(logging.DEBUG)
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+# Memory-mapped model bundle: a directory of .npy arrays plus manifest.json.
+#
+#   manifest.json   format version, estimator params, classes, label encoder
+#                   classes, original/feature columns, per-file sha256 and an
+#                   overall checksum (used as the model version)
+#   compiled_*.npy  flattened forest used for serving (forest_engine.CompiledForest),
+#                   optionally quantized (float32 thresholds, smaller leaf values)
+#   tree_*.npy      raw sklearn node/value tables, to rebuild the estimator for SHAP
+#   importances.npy feature_importances_, so the proxy explanation needs no rebuild
+#
+# Arrays are opened with np.load(mmap_mode='r'): loading costs the same whatever
+# the forest size, and gunicorn workers share the file's page cache instead of
+# each holding a private copy of an unpickled forest.
+#
+# Each version lives in its own directory (bundle-<checksum>) and `bundle` is a
+# symlink to the current one, replaced atomically on publish: a reader always
+# finds a complete manifest, and one opened bundle keeps using its own version's
+# files. The previous version is kept so readers in the middle of opening it finish.
+
+BUNDLE_DIRNAME = 'bundle'
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+COMPILED_ARRAYS = ['feature', 'threshold', 'left', 'right', 'values', 'roots', 'is_leaf', 'missing_left']
+TREE_ARRAYS = ['nodes', 'node_values', 'node_counts', 'max_depths']
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _json_safe_params(model):
+    params = {}
+    for k, v in model.get_params(deep=False).items():
+        if v is None or isinstance(v, (bool, int, float, str)):
+            params[k] = v
+    return params
+
+
+def _plain(values):
+    return [v.item() if hasattr(v, 'item') else v for v in values]
+
+
+def write_bundle(out_dir, model, label_encoder, original_features, feature_cols, training=None, quantize=None):
+    """Write a fitted RandomForestClassifier and its metadata as a bundle directory.
+
+    The bundle is assembled in a sibling temp directory, renamed to its versioned
+    directory and published by swapping the out_dir symlink, so readers never see a
+    half-written or missing bundle. Processes that still map the old files keep
+    working from them until they reload. `training` is an optional
+    JSON-able dict recorded in the manifest (how this version was produced).
+    `quantize` ('float32' or 'float16') stores the serving arrays with that leaf
+    value dtype (CompiledForest.quantized); the tree tables SHAP uses stay exact.
+    """
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = f"{os.path.abspath(out_dir)}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    compiled = CompiledForest.from_sklearn(model, fallback=False)
+    if quantize:
+        compiled = compiled.quantized(quantize)
+    trees = [est.tree_ for est in model.estimators_]
+    states = [t.__getstate__() for t in trees]
+    arrays = {
+        'compiled_feature': compiled.feature,
+        'compiled_threshold': compiled.threshold,
+        'compiled_left': compiled.left,
+        'compiled_right': compiled.right,
+        'compiled_values': compiled.values,
+        'compiled_roots': compiled.roots,
+        'compiled_is_leaf': compiled.is_leaf,
+        'compiled_missing_left': compiled.missing_left if compiled.missing_left is not None else np.zeros(0, dtype=bool),
+        'tree_nodes': np.concatenate([s['nodes'] for s in states]),
+        'tree_node_values': np.concatenate([s['values'] for s in states]),
+        'tree_node_counts': np.array([s['node_count'] for s in states], dtype=np.intp),
+        'tree_max_depths': np.array([s['max_depth'] for s in states], dtype=np.intp),
+        'importances': np.asarray(model.feature_importances_, dtype=np.float64),
+    }
+    files = {}
+    for name, arr in arrays.items():
+        fname = f'{name}.npy'
+        np.save(os.path.join(tmp_dir, fname), np.ascontiguousarray(arr))
+        files[fname] = _sha256(os.path.join(tmp_dir, fname))
+
+    import sklearn
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': int(time.time()),
+        'sklearn_version': sklearn.__version__,
+        'estimator': type(model).__name__,
+        'params': _json_safe_params(model),
+        'n_features_in': int(model.n_features_in_),
+        'n_outputs': int(model.n_outputs_),
+        'classes': _plain(model.classes_),
+        'max_depth': int(compiled.max_depth),
+        'encoder_classes': _plain(label_encoder.classes_),
+        'original_features': list(original_features),
+        'feature_columns': list(feature_cols),
+        # fitted on a DataFrame (names checked by sklearn) or on a plain array
+        'fitted_with_names': hasattr(model, 'feature_names_in_'),
+        'quantize': quantize,
+        'files': files,
+    }
+    if training:
+        manifest['training'] = training
+    h = hashlib.sha256()
+    for fname in sorted(files):
+        h.update(f'{fname}:{files[fname]}\n'.encode('utf-8'))
+    h.update(json.dumps({k: manifest[k] for k in ('classes', 'encoder_classes', 'original_features', 'feature_columns')},
+                        sort_keys=True).encode('utf-8'))
+    manifest['checksum'] = h.hexdigest()
+    with open(os.path.join(tmp_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    _publish(out_dir, tmp_dir, manifest['checksum'][:12])
+    return manifest
+
+
+def _publish(out_dir, tmp_dir, version):
+    """Move tmp_dir to out_dir-<version> and point the out_dir symlink at it."""
+    out_dir = os.path.abspath(out_dir)
+    version_dir = f'{out_dir}-{version}'
+    if os.path.exists(version_dir):
+        # same checksum: identical content already published
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, version_dir)
+    previous = os.path.realpath(out_dir) if os.path.islink(out_dir) else None
+    link = f'{out_dir}.link-{os.getpid()}'
+    try:
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(version_dir), link)
+    except (OSError, NotImplementedError):
+        # no symlinks (e.g. unprivileged Windows): plain directory swap
+        _swap_directory(out_dir, version_dir)
+        return
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # a directory bundle from before versioned publishing: one last swap
+        os.replace(out_dir, f'{out_dir}.old-{os.getpid()}')
+    os.replace(link, out_dir)
+    keep = {version_dir, previous}
+    prefix = os.path.basename(out_dir)
+    parent = os.path.dirname(out_dir)
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if (name.startswith(f'{prefix}-') or name.startswith(f'{prefix}.old-')) and path not in keep \
+                and os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _swap_directory(out_dir, new_dir):
+    old_dir = None
+    if os.path.exists(out_dir):
+        old_dir = f'{out_dir}.old-{os.getpid()}'
+        os.replace(out_dir, old_dir)
+    os.replace(new_dir, out_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _write_pickle(path, obj):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def save_artifacts(model_dir, model, label_encoder, original_features, feature_cols, training=None, quantize=None):
+    """The one artifact writer for training: the pickles and both feature-column JSONs, then the bundle.
+
+    The pickles stay in step with the JSON column lists, so the legacy loaders
+    (load_artifacts without a bundle, the benchmarks) never pair a stale model
+    with new columns.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    _write_pickle(os.path.join(model_dir, "rf_model.pkl"), model)
+    _write_pickle(os.path.join(model_dir, "label_encoder.pkl"), label_encoder)
+    with open(os.path.join(model_dir, "original_features.json"), "w", encoding="utf-8") as f:
+        json.dump(list(original_features), f)
+    with open(os.path.join(model_dir, "feature_columns.json"), "w", encoding="utf-8") as f:
+        json.dump(list(feature_cols), f)
+    return write_bundle(os.path.join(model_dir, BUNDLE_DIRNAME), model, label_encoder, original_features, feature_cols,
+                        training=training, quantize=quantize)
+
+
+def read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, MANIFEST), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verify_bundle(bundle_dir, manifest=None):
+    """Raise ValueError if any bundle file does not match its recorded sha256."""
+    manifest = manifest or read_manifest(bundle_dir)
+    for fname, digest in manifest['files'].items():
+        if _sha256(os.path.join(bundle_dir, fname)) != digest:
+            raise ValueError(f'bundle file {fname} does not match its checksum')
+
+
+class MappedForest(CompiledForest):
+    """CompiledForest over a bundle's memory-mapped arrays.
+
+    Serves predict_proba straight from the shared mapping. The sklearn
+    estimator (only needed by SHAP) is rebuilt from the raw node tables on first
+    use via to_sklearn(), so workers that never explain never pay for it. The
+    node tables are mapped here, when the bundle is opened, so the rebuild uses
+    this version's trees even if a newer bundle has been published since.
+    """
+
+    def __init__(self, bundle_dir, manifest):
+        a = {name: np.load(os.path.join(bundle_dir, f'compiled_{name}.npy'), mmap_mode='r') for name in COMPILED_ARRAYS}
+        missing_left = a['missing_left'] if a['missing_left'].shape[0] else None
+        super().__init__(a['feature'], a['threshold'], a['left'], a['right'], a['values'], a['roots'],
+                         manifest['max_depth'], np.asarray(manifest['classes']), manifest['n_features_in'],
+                         missing_left=missing_left, fallback=None, is_leaf=a['is_leaf'])
+        self.feature_importances_ = np.load(os.path.join(bundle_dir, 'importances.npy'), mmap_mode='r')
+        self.tree_arrays = {name: np.load(os.path.join(bundle_dir, f'tree_{name}.npy'), mmap_mode='r')
+                            for name in TREE_ARRAYS}
+        self.bundle_dir = bundle_dir
+        self.manifest = manifest
+        self._sklearn = None
+        self._lock = threading.Lock()
+
+    def to_sklearn(self):
+        if self._sklearn is None:
+            with self._lock:
+                if self._sklearn is None:
+                    self._sklearn = _rebuild_sklearn(self.tree_arrays, self.manifest)
+        return self._sklearn
+
+
+def _rebuild_sklearn(t, manifest):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.tree._tree import Tree
+
+    classes = np.asarray(manifest['classes'])
+    n_features = manifest['n_features_in']
+    n_outputs = manifest['n_outputs']
+    n_classes = np.array([len(classes)], dtype=np.intp)
+    params = manifest['params']
+    tree_params = {k: params[k] for k in ('criterion', 'max_depth', 'min_samples_split', 'min_samples_leaf',
+                                          'min_weight_fraction_leaf', 'max_features', 'max_leaf_nodes',
+                                          'min_impurity_decrease', 'ccp_alpha') if k in params}
+
+    rf = RandomForestClassifier(**params)
+    rf.estimator_ = DecisionTreeClassifier(**tree_params)
+    rf.estimators_ = []
+    offset = 0
+    for count, depth in zip(t['node_counts'], t['max_depths']):
+        tree = Tree(n_features, n_classes, n_outputs)
+        tree.__setstate__({'max_depth': int(depth), 'node_count': int(count),
+                           'nodes': t['nodes'][offset:offset + count],
+                           'values': t['node_values'][offset:offset + count]})
+        est = DecisionTreeClassifier(**tree_params)
+        est.tree_ = tree
+        est.n_features_in_ = n_features
+        est.n_outputs_ = n_outputs
+        est.classes_ = classes.astype(np.float64)
+        est.n_classes_ = len(classes)
+        est.max_features_ = max(1, int(np.sqrt(n_features))) if tree_params.get('max_features') == 'sqrt' else n_features
+        rf.estimators_.append(est)
+        offset += count
+    rf.n_features_in_ = n_features
+    rf.n_outputs_ = n_outputs
+    rf.classes_ = classes
+    rf.n_classes_ = len(classes)
+    if manifest.get('fitted_with_names', True):
+        rf.feature_names_in_ = np.asarray(manifest['feature_columns'], dtype=object)
+    return rf
+
+
+class _Classes:
+    """Minimal LabelEncoder stand-in rebuilt from the manifest."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def inverse_transform(self, y):
+        return self.classes_.take(np.asarray(y, dtype=np.intp))
+
+    def transform(self, y):
+        return np.searchsorted(self.classes_, y)
+
+
+def load_bundle(bundle_dir, verify=False):
+    """Open a bundle: returns (model, label_encoder, feature_cols, original_features, checksum).
+
+    write_bundle hashes every file as it publishes; verify=True re-checks them on load.
+    """
+    # resolve the symlink once so the manifest and every array come from the same version
+    bundle_dir = os.path.realpath(bundle_dir)
+    manifest = read_manifest(bundle_dir)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"unsupported bundle format {manifest.get('format_version')}")
+    if verify:
+        verify_bundle(bundle_dir, manifest)
+    model = MappedForest(bundle_dir, manifest)
+    encoder = _Classes(manifest['encoder_classes'])
+    return model, encoder, manifest['feature_columns'], manifest['original_features'], manifest['checksum']
+
+
+def load_artifacts(model_dir, verify=False):
+    """(model, encoder, feature_cols, original_features) from the bundle, or the legacy pickles/JSON."""
+    bundle_dir = os.path.join(model_dir, BUNDLE_DIRNAME)
+    if os.path.exists(os.path.join(bundle_dir, MANIFEST)):
+        return load_bundle(bundle_dir, verify=verify)[:4]
+    with open(os.path.join(model_dir, "feature_columns.json"), "r", encoding="utf-8") as f:
+        feature_cols = json.load(f)
+    with open(os.path.join(model_dir, "original_features.json"), "r", encoding="utf-8") as f:
+        original_features = json.load(f)
+    with open(os.path.join(model_dir, "rf_model.pkl"), "rb") as f:
+        model = pickle.load(f)
+    with open(os.path.join(model_dir, "label_encoder.pkl"), "rb") as f:
+        encoder = pickle.load(f)
+    return model, encoder, feature_cols, original_features
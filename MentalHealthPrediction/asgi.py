@@ -0,0 +1,50 @@
+import os
+
+# ASGI entry point serving the same Flask routes and templates as app:app.
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 8000
+#   gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:application
+#
+# The event loop accepts connections and hands each request to a small thread pool
+# running the WSGI app (ASGI_THREADS). The CPU-bound forest + SHAP work of /predict
+# goes to the bounded inference pool (INFERENCE_WORKERS, INFERENCE_QUEUE,
+# INFERENCE_POOL=thread|process), which bounds how many run at once. The request
+# thread still waits for its result (up to INFERENCE_TIMEOUT), so ASGI_THREADS caps
+# the predictions in flight. When that pool is full, POST /predict is answered with
+# 503 + Retry-After straight from the event loop, without taking a request thread.
+
+# the pool is what this entry point is for; app:app keeps running inference inline unless configured
+os.environ.setdefault('INFERENCE_WORKERS', '2')
+
+from a2wsgi import WSGIMiddleware
+
+from app import app, inference_pool
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '16'))
+
+
+class BackpressureMiddleware:
+    """Reject POST /predict with 503 + Retry-After before it reaches the WSGI thread pool when inference is saturated."""
+
+    def __init__(self, inner, pool):
+        self.inner = inner
+        self.pool = pool
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] == 'http' and self.pool is not None and scope['method'] == 'POST'
+                and scope['path'] == '/predict' and self.pool.saturated()):
+            retry_after = self.pool.reject().retry_after
+            body = f'The server is busy. Please try again in {retry_after} seconds.'.encode()
+            await send({
+                'type': 'http.response.start',
+                'status': 503,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                            (b'content-length', str(len(body)).encode()),
+                            (b'retry-after', str(retry_after).encode())],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        await self.inner(scope, receive, send)
+
+
+application = BackpressureMiddleware(WSGIMiddleware(app, workers=ASGI_THREADS), inference_pool)
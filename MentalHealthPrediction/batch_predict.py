@@ -0,0 +1,157 @@
+import argparse
+import csv
+import io
+import json
+import shutil
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+from artifact_bundle import load_artifacts
+from feature_encoder import FeatureEncoder
+from scoring import Scorer, risk_label_for_probability
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def iter_csv_records(fileobj):
+    """Yield one dict per CSV row without reading the whole file."""
+    for record in csv.DictReader(fileobj):
+        yield record
+
+
+def iter_uploaded_csv_records(stream):
+    """Yield CSV rows from an uploaded file.
+
+    Werkzeug closes uploads when the view returns, before a streamed response is
+    consumed, so the upload is first copied to a private temporary file (on disk,
+    not in memory) that is read lazily and removed once exhausted.
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        shutil.copyfileobj(stream, tmp)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+
+    def records():
+        try:
+            yield from iter_csv_records(io.TextIOWrapper(tmp, encoding='utf-8', newline=''))
+        finally:
+            tmp.close()
+    return records()
+
+
+def iter_chunks(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def score_records(records, scorer, feature_encoder, explainer=None, top_k=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Score an iterable of survey records chunk by chunk.
+
+    Each chunk is encoded into one reused buffer and scored with a single
+    predict_proba call (plus one batched explanation call when top_k > 0), and
+    results are yielded as they are produced, so memory stays bounded by
+    chunk_size whatever the input size.
+    """
+    buf = np.zeros((chunk_size, feature_encoder.n_features), dtype=np.float64)
+    row = 0
+    for chunk in iter_chunks(records, chunk_size):
+        X = feature_encoder.encode_many([feature_encoder.parse_form(r) for r in chunk], out=buf)
+        _, labels, probs = scorer.score_many(X)
+        contribs = explainer.contributions_many(X, scorer.pos_index, top_k) if explainer is not None and top_k > 0 else None
+        for i, record in enumerate(chunk):
+            prob = float(probs[i])
+            result = {'row': row, 'prediction': labels[i].item(), 'probability': prob,
+                      'risk_label': risk_label_for_probability(prob)}
+            if 'id' in record:
+                result['id'] = record['id']
+            if contribs is not None:
+                result['top_contributors'] = contribs[i]
+            yield result
+            row += 1
+
+
+def iter_json_array(results):
+    """Serialize results as a JSON array, one element at a time."""
+    yield '['
+    first = True
+    for r in results:
+        yield ('' if first else ',') + '\n' + json.dumps(r)
+        first = False
+    yield '\n]\n'
+
+
+def _csv_line(values):
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+
+def iter_csv_output(results, with_contributors=False):
+    header = ['row', 'id', 'prediction', 'probability', 'risk_label'] + (['top_contributors'] if with_contributors else [])
+    yield _csv_line(header)
+    for r in results:
+        values = [r['row'], r.get('id', ''), r['prediction'], r['probability'], r['risk_label']]
+        if with_contributors:
+            values.append(';'.join(f"{name}={value:.4f}" for name, value in r.get('top_contributors', [])))
+        yield _csv_line(values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV or JSON list of survey records.")
+    parser.add_argument("input", help="CSV file or JSON file holding a list of records ('-' reads CSV from stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output path; .json/.jsonl write JSON, anything else CSV (default: stdout CSV)")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--top-k", type=int, default=0, help="include the top K contributors per row")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    model, encoder, feature_cols, original_features = load_artifacts(args.model_dir)
+    fe = FeatureEncoder(original_features, feature_cols)
+    explainer = None
+    if args.top_k > 0:
+        from explain import ModelExplainer
+        explainer = ModelExplainer(model, feature_cols)
+
+    if args.input == '-':
+        src = sys.stdin
+    else:
+        src = open(args.input, 'r', encoding='utf-8', newline='')
+    dst = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        if args.input.lower().endswith('.json'):
+            # a JSON document has to be parsed whole; use CSV for very large inputs
+            records = json.load(src)
+        else:
+            records = iter_csv_records(src)
+        results = score_records(records, Scorer(model, encoder), fe, explainer, args.top_k, args.chunk_size)
+        if args.output.lower().endswith('.jsonl'):
+            for r in results:
+                dst.write(json.dumps(r) + '\n')
+        elif args.output.lower().endswith('.json'):
+            for piece in iter_json_array(results):
+                dst.write(piece)
+        else:
+            for line in iter_csv_output(results, with_contributors=args.top_k > 0):
+                dst.write(line)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+
+if __name__ == "__main__":
+    main()
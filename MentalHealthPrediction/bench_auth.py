@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import uuid
+
+# Login and page-view throughput through the Flask test client:
+#   login       POST /login per hash policy (PASSWORD_HASH_METHOD values to compare)
+#   rehash      first login of a user whose stored hash uses another policy
+#   page views  GET /settings (an authenticated page that touches no model or history)
+#               with the per-process user cache on and off
+# Users created here are deleted at the end.
+# Usage: python bench_auth.py [page views] [logins per policy]
+
+PAGE_VIEWS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+LOGINS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+POLICIES = ['pbkdf2:sha256:1000000', 'scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:100000']
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import app as app_module  # noqa: E402
+import models  # noqa: E402
+from models import db, User  # noqa: E402
+from user_cache import UserCache  # noqa: E402
+
+app = app_module.app
+client = app.test_client()
+prefix = 'bench' + uuid.uuid4().hex[:6]
+created = []
+
+
+def make_user(name, method):
+    models.set_password_policy(method)
+    with app.app_context():
+        user = User(username=name, email=f'{name}@example.com')
+        user.set_password(name)
+        db.session.add(user)
+        db.session.commit()
+    created.append(name)
+
+
+def login(name):
+    resp = client.post('/login', data={'username': name, 'password': name})
+    assert resp.status_code == 302, resp.status_code
+
+
+def rate(n, fn):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - t0
+    return n / elapsed, elapsed / n * 1000.0
+
+
+try:
+    print(f"{'login':<32} {'logins/s':>9} {'ms/login':>9}")
+    for method in POLICIES:
+        name = f'{prefix}_{len(created)}'
+        make_user(name, method)
+        models.set_password_policy(method)
+        per_s, ms = rate(LOGINS, lambda i: login(name))
+        print(f"{method:<32} {per_s:9.1f} {ms:9.1f}")
+
+    # stored under the slowest policy, served under a cheaper one: the first login pays both and re-hashes
+    name = f'{prefix}_{len(created)}'
+    make_user(name, POLICIES[0])
+    models.set_password_policy(POLICIES[-1])
+    t0 = time.perf_counter()
+    login(name)
+    first = (time.perf_counter() - t0) * 1000.0
+    _, after = rate(LOGINS, lambda i: login(name))
+    print(f"rehash {POLICIES[0]} -> {POLICIES[-1]}: first login {first:.1f} ms, then {after:.1f} ms")
+
+    print(f"\n{'GET /settings':<32} {'views/s':>9} {'ms/view':>9}")
+    saved = app_module.user_cache
+    for label, cache in [('user cache off', None), ('user cache on', UserCache())]:
+        app_module.user_cache = cache
+        client.get('/settings')
+        per_s, ms = rate(PAGE_VIEWS, lambda i: client.get('/settings'))
+        print(f"{label:<32} {per_s:9.1f} {ms:9.2f}")
+    app_module.user_cache = saved
+finally:
+    with app.app_context():
+        User.query.filter(User.username.in_(created)).delete(synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from inference_pool import score_and_explain
+from micro_batch import MicroBatcher
+from model_registry import load_bundle, load_mapped_bundle
+
+# Throughput of concurrent single-row predictions scored one by one (as /predict
+# does without PREDICT_BATCH_WAIT_MS) vs coalesced by MicroBatcher, with and
+# without SHAP explanations.
+# Usage: python bench_batching.py [threads] [requests per thread] [max wait ms] [max batch]
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+PER_THREAD = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+MAX_WAIT_MS = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+MAX_BATCH = int(sys.argv[4]) if len(sys.argv) > 4 else 32
+
+mdir = os.path.join("model")
+if os.path.exists(os.path.join(mdir, "bundle", "manifest.json")):
+    bundle = load_mapped_bundle(os.path.join(mdir, "bundle"))
+else:
+    bundle = load_bundle(os.path.join(mdir, "rf_model.pkl"), os.path.join(mdir, "label_encoder.pkl"),
+                         os.path.join(mdir, "feature_columns.json"), os.path.join(mdir, "original_features.json"))
+
+# encoded rows shaped like form inputs: small numeric scales + sparse one-hot columns
+rng = np.random.default_rng(0)
+n_features = len(bundle.feature_cols)
+rows = []
+for _ in range(THREADS * PER_THREAD):
+    X = np.zeros((1, n_features), dtype=np.float32)
+    for j, c in enumerate(bundle.feature_cols):
+        X[0, j] = (rng.random() < 0.1) if '_' in c else rng.integers(0, 6)
+    rows.append(X)
+
+
+def run(score_one):
+    latencies = [None] * len(rows)
+
+    def client(t):
+        for i in range(t * PER_THREAD, (t + 1) * PER_THREAD):
+            t0 = time.perf_counter()
+            score_one(rows[i])
+            latencies[i] = time.perf_counter() - t0
+
+    threads = [threading.Thread(target=client, args=(t,)) for t in range(THREADS)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(rows) / (time.perf_counter() - started), np.asarray(latencies) * 1000.0
+
+
+def report(name, result, extra=''):
+    rate, ms = result
+    print(f"{name:<26} {rate:8.1f} rows/s  p50={np.percentile(ms, 50):8.2f} ms  p99={np.percentile(ms, 99):8.2f} ms{extra}")
+
+
+print(f"{THREADS} threads x {PER_THREAD} requests, batch window {MAX_WAIT_MS:g} ms / {MAX_BATCH} rows")
+for explain in (False, True):
+    label = 'score+SHAP' if explain else 'score'
+    # one warm-up call builds the SHAP explainer outside the timed runs
+    score_and_explain(bundle, rows[0], explain, 6)
+    report(f"{label} one-by-one", run(lambda X: score_and_explain(bundle, X, explain, 6)))
+    batcher = MicroBatcher(max_wait_ms=MAX_WAIT_MS, max_batch=MAX_BATCH)
+    result = run(lambda X: batcher.score(bundle, X, explain))
+    stats = batcher.stats()
+    report(f"{label} micro-batched", result, f"  ({stats['batches']} batches, {stats['rows'] / stats['batches']:.1f} rows each)")
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from artifact_bundle import load_artifacts
+from explain import BackgroundExplanations, ModelExplainer, load_shap
+from feature_encoder import FeatureEncoder
+
+# Compares per-request explanation latency of:
+#   uncached - a new shap.TreeExplainer per request (the original predict() path)
+#   cached   - one ModelExplainer reused across requests
+#   async    - time until the page can render (proxy + submit to the worker pool)
+# Usage: python bench_explain.py [requests]
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+shap = load_shap()
+if shap is None:
+    print("shap is not installed; nothing to benchmark.")
+    sys.exit(1)
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+mdir = os.path.join("model")
+model, _, FEATURE_COLS, ORIGINAL_FEATURES = load_artifacts(mdir)
+# a memory-mapped bundle only rebuilds the sklearn estimator on demand
+sk_model = model.to_sklearn() if hasattr(model, 'to_sklearn') else model
+
+fe = FeatureEncoder(ORIGINAL_FEATURES, FEATURE_COLS)
+rng = np.random.default_rng(0)
+degrees = list(fe.categorical.get("Degree", {})) or ["B.Tech"]
+sleeps = list(fe.categorical.get("Sleep Duration", {})) or ["7-8 hours"]
+rows = []
+for _ in range(N):
+    rows.append(fe.parse_form({
+        "Gender": str(rng.choice(["Male", "Female"])),
+        "Age": str(rng.integers(18, 35)),
+        "Academic Pressure": str(rng.integers(1, 6)),
+        "Work Pressure": str(rng.integers(0, 6)),
+        "CGPA": f"{rng.uniform(5, 10):.2f}",
+        "Study Satisfaction": str(rng.integers(1, 6)),
+        "Sleep Duration": str(rng.choice(sleeps)),
+        "Degree": str(rng.choice(degrees)),
+        "Work/Study Hours": str(rng.integers(0, 12)),
+        "Financial Stress": str(rng.integers(1, 6)),
+    }))
+inputs = [fe.encode(r) for r in rows]
+
+
+def report(name, samples):
+    ms = np.asarray(samples) * 1000.0
+    print(f"{name:<10} n={len(ms):<5} p50={np.percentile(ms, 50):8.2f} ms  p99={np.percentile(ms, 99):8.2f} ms")
+
+
+def run_uncached():
+    out = []
+    for X in inputs:
+        t0 = time.perf_counter()
+        shap.TreeExplainer(sk_model).shap_values(X)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def run_cached():
+    explainer = ModelExplainer(model, FEATURE_COLS)
+    explainer.contributions(inputs[0])  # build outside the timed loop, as after the first request
+    out = []
+    for X in inputs:
+        t0 = time.perf_counter()
+        explainer.contributions(X)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def run_async():
+    explainer = ModelExplainer(model, FEATURE_COLS)
+    explainer.contributions(inputs[0])
+    pool = BackgroundExplanations(workers=2)
+    out = []
+    tokens = []
+    for X in inputs:
+        t0 = time.perf_counter()
+        explainer.proxy_contributions(X)
+        tokens.append(pool.submit(explainer, X))
+        out.append(time.perf_counter() - t0)
+    # wait for the pool so completion time is visible too
+    t0 = time.perf_counter()
+    while any(pool.get(t)['status'] == 'pending' for t in tokens):
+        time.sleep(0.01)
+    print(f"async pool drained {len(tokens)} explanations in {time.perf_counter() - t0:.2f} s after submit")
+    return out
+
+
+print(f"Model: {getattr(sk_model, 'n_estimators', '?')} trees, {len(FEATURE_COLS)} features, {N} requests")
+report("uncached", run_uncached())
+report("cached", run_cached())
+report("async", run_async())
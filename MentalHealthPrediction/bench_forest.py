@@ -0,0 +1,60 @@
+import json
+import os
+import pickle
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from forest_engine import DEFAULT_MAX_ROWS, CompiledForest
+
+# Latency of sklearn predict_proba vs the compiled forest (forest_engine.py)
+# at batch sizes 1, 32 and 1024, plus a parity check on every batch.
+# Usage: python bench_forest.py [repeats]
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+BATCH_SIZES = [1, 32, 1024]
+
+mdir = os.path.join("model")
+with open(os.path.join(mdir, "feature_columns.json"), "r", encoding="utf-8") as f:
+    FEATURE_COLS = json.load(f)
+model = pickle.load(open(os.path.join(mdir, "rf_model.pkl"), "rb"))
+
+t0 = time.perf_counter()
+# fallback=False so large batches measure the compiled path itself
+compiled = CompiledForest.from_sklearn(model, fallback=False)
+print(f"Compiled {compiled.n_trees} trees ({len(compiled.feature)} nodes, depth {compiled.max_depth}) "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+# synthetic rows shaped like encoded form inputs: small numeric scales + sparse one-hot columns
+rng = np.random.default_rng(0)
+n_max = max(BATCH_SIZES)
+X_all = np.zeros((n_max, len(FEATURE_COLS)))
+for j, c in enumerate(FEATURE_COLS):
+    if '_' in c:
+        X_all[:, j] = rng.random(n_max) < 0.1
+    else:
+        X_all[:, j] = rng.integers(0, 6, n_max)
+
+
+def timeit(fn, X):
+    fn(X)
+    samples = []
+    for _ in range(REPEATS):
+        t = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - t)
+    return np.median(samples) * 1000.0
+
+
+print(f"{'batch':>6} {'sklearn ms':>11} {'compiled ms':>12} {'speedup':>8} {'max |diff|':>11}")
+for n in BATCH_SIZES:
+    X = X_all[:n]
+    diff = np.abs(model.predict_proba(X) - compiled.predict_proba(X)).max()
+    sk = timeit(model.predict_proba, X)
+    cf = timeit(compiled.predict_proba, X)
+    print(f"{n:>6} {sk:>11.3f} {cf:>12.3f} {sk / cf:>7.1f}x {diff:>11.2e}")
+print(f"Serving hands batches above {DEFAULT_MAX_ROWS} rows back to sklearn.")
@@ -0,0 +1,119 @@
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from loadtest import logged_in_opener, random_form
+
+# Startup cost of the app:
+#   import     wall time of `import app` in a fresh interpreter, and which heavy
+#              modules it pulled in (shap is lazy, WARM_EXPLAINER=1 imports it eagerly)
+#   gunicorn   for --workers workers with and without preload (gunicorn.conf.py):
+#              seconds from launch to the first successful /predict, and RSS / PSS
+#              (the process's share of pages shared with other processes) per worker
+# Usage: python bench_startup.py [--workers 2] [--port 8790]
+
+HEAVY = ('shap', 'numba', 'llvmlite', 'pandas', 'scipy', 'sklearn')
+IMPORT_SNIPPET = (
+    "import sys, time; t = time.perf_counter(); import app; t = time.perf_counter() - t; "
+    "print(repr((t, [m for m in %r if m in sys.modules])))" % (HEAVY,)
+)
+
+
+def time_import(env):
+    out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], env=dict(os.environ, **env),
+                         capture_output=True, text=True, check=True).stdout
+    return eval(out.strip().splitlines()[-1])
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB from /proc (Linux)."""
+    rss = pss = 0
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                rss = int(line.split()[1])
+            elif line.startswith('Pss:'):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def first_predict(url, proc, timeout=120):
+    """Seconds until a logged-in POST /predict returns 200."""
+    started = time.perf_counter()
+    opener = None
+    body = urllib.parse.urlencode(random_form(random.Random(0))).encode()
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {proc.returncode}')
+        try:
+            opener = opener or logged_in_opener(url)
+            with opener.open(url + '/predict', body, timeout=30) as resp:
+                if resp.status == 200 and b'Risk probability' in resp.read():
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f'no successful /predict within {timeout}s')
+
+
+def run_gunicorn(preload, workers, port):
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0', LOG_LEVEL='WARNING',
+               SECRET_KEY=os.environ.get('SECRET_KEY', uuid.uuid4().hex))
+    cmd = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'app:app']
+    launched = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        ttfp = first_predict(url, proc)
+        # let every worker finish booting and serve a few predictions so each has touched the model
+        deadline = time.time() + 60
+        while len(children(proc.pid)) < workers and time.time() < deadline:
+            time.sleep(0.2)
+        opener = logged_in_opener(url)
+        for i in range(4 * workers):
+            opener.open(url + '/predict', urllib.parse.urlencode(random_form(random.Random(i))).encode(), timeout=60).read()
+        master = memory_kb(proc.pid)
+        worker_mem = [memory_kb(pid) for pid in children(proc.pid)]
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    return ttfp, time.perf_counter() - launched, master, worker_mem
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import time, time to first /predict and per-worker memory.')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8790)
+    args = parser.parse_args(argv)
+
+    for label, env in [('lazy (default)', {}), ('eager (WARM_EXPLAINER=1)', {'WARM_EXPLAINER': '1'})]:
+        seconds, heavy = time_import(dict(env, LOG_LEVEL='WARNING'))
+        print(f"import app, {label:<26} {seconds:6.2f}s  loaded: {', '.join(heavy) or '-'}")
+
+    print(f"\ngunicorn -w {args.workers}")
+    for i, preload in enumerate((False, True)):
+        ttfp, _, master, workers = run_gunicorn(preload, args.workers, args.port + i)
+        label = 'preload' if preload else 'no preload'
+        print(f"{label:<11} first /predict after {ttfp:5.2f}s  master RSS {master[0] / 1024:6.1f} MB")
+        for n, (rss, pss) in enumerate(workers):
+            print(f"{'':<11} worker {n}: RSS {rss / 1024:6.1f} MB, PSS {pss / 1024:6.1f} MB")
+        total_pss = sum(p for _, p in workers) + master[1]
+        print(f"{'':<11} total PSS (master + workers) {total_pss / 1024:6.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import uuid
+
+# Bytes on the wire and server time to first byte for the pages and stylesheets a
+# logged-in visit loads, before and after the render cache (page_cache.py) and the
+# fingerprinted, precompressed assets (static_assets.py):
+#   before    every page rendered from scratch, /static/*.css sent uncompressed
+#   after     first visit: cached render + gzip; assets fingerprinted and precompressed
+#   revisit   browser revalidates pages with If-None-Match (304) and reuses the
+#             immutable assets without asking at all
+# Usage: python bench_static.py [requests per page]
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+PAGES = ['/resources', '/settings']
+ASSETS = ['style.css', 'dashboard.css']
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import app as app_module  # noqa: E402
+from flask import url_for  # noqa: E402
+from flask_login import login_required  # noqa: E402
+from models import db, User  # noqa: E402
+
+app = app_module.app
+client = app.test_client()
+name = 'static' + uuid.uuid4().hex[:8]
+with app.app_context():
+    user = User(username=name, email=f'{name}@example.com')
+    user.set_password(name)
+    db.session.add(user)
+    db.session.commit()
+client.post('/login', data={'username': name, 'password': name})
+
+with app.test_request_context():
+    fingerprinted = {a: url_for('static', filename=a) for a in ASSETS}
+
+
+def measure(path, headers=None):
+    t0 = time.perf_counter()
+    samples = []
+    for _ in range(N):
+        t = time.perf_counter()
+        resp = client.get(path, headers=headers or {})
+        samples.append(time.perf_counter() - t)
+        body = resp.get_data()
+    return resp.status_code, len(body), sorted(samples)[len(samples) // 2] * 1000.0, (time.perf_counter() - t0) / N
+
+
+def report(label, path, result):
+    status, size, ttfb, _ = result
+    print(f"{label:<8} {path:<48} {status:>4} {size:>8} B {ttfb:8.3f} ms")
+    return size
+
+
+try:
+    print(f"{'':<8} {'request':<48} {'code':>4} {'bytes':>10} {'p50 ttfb':>11}")
+    totals = {}
+    # before: the undecorated views (login check only) and the plain static files
+    cached_views = {}
+    for path in PAGES:
+        endpoint = path.strip('/')
+        cached_views[endpoint] = app.view_functions[endpoint]
+        app.view_functions[endpoint] = login_required(cached_views[endpoint].__wrapped__.__wrapped__)
+    totals['before'] = sum(report('before', p, measure(p)) for p in PAGES)
+    totals['before'] += sum(report('before', f'/static/{a}', measure(f'/static/{a}')) for a in ASSETS)
+    app.view_functions.update(cached_views)
+
+    gzip_headers = {'Accept-Encoding': 'gzip, br'}
+    totals['after'] = 0
+    etags = {}
+    for path in PAGES:
+        totals['after'] += report('after', path, measure(path, gzip_headers))
+        etags[path] = client.get(path, headers=gzip_headers).headers['ETag']
+    for a in ASSETS:
+        resp = client.get(fingerprinted[a], headers=gzip_headers)
+        totals['after'] += report('after', fingerprinted[a], measure(fingerprinted[a], gzip_headers))
+        print(f"{'':<8} Cache-Control: {resp.headers.get('Cache-Control')}, Content-Encoding: {resp.headers.get('Content-Encoding')}")
+
+    totals['revisit'] = 0
+    for path in PAGES:
+        totals['revisit'] += report('revisit', path, measure(path, dict(gzip_headers, **{'If-None-Match': etags[path]})))
+    print(f"{'revisit':<8} static assets: served from the browser cache (immutable), 0 requests")
+
+    print()
+    for label, total in totals.items():
+        print(f"{label:<8} {total:>8} bytes per visit")
+finally:
+    with app.app_context():
+        User.query.filter(User.username == name).delete(synchronize_session=False)
+        db.session.commit()
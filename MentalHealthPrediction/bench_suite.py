@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import warnings
+
+import numpy as np
+
+from loadtest import logged_in_opener, wait_ready
+from model_registry import load_bundle, load_mapped_bundle
+import whatif
+
+# Benchmark suite with stored baselines.
+#
+#   micro  form encoding, predict_proba (1 and 256 rows), SHAP (1 row), the what-if
+#          grid with pairs, and on a seeded SQLite database the history page query
+#          and the dashboard summary
+#   e2e    synthetic users log in and drive POST /predict, GET /history and
+#          GET /dashboard, through the Flask test client (--e2e client) or a local
+#          gunicorn (--e2e gunicorn)
+#
+# Inputs are synthetic forms drawn from the schema in model/original_features.json
+# (categories from feature_columns.json). Every benchmark reports p50/p95 latency
+# and ops/s. --save-baseline writes the run to JSON. --baseline compares against a
+# saved run and exits with status 1 when any p50 is more than --threshold slower.
+#
+# Usage:
+#   python bench_suite.py --save-baseline bench_baseline.json
+#   python bench_suite.py --baseline bench_baseline.json [--threshold 0.25] [--only micro|e2e] [--e2e gunicorn]
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
+# Plausible ranges for the numeric form fields; anything else is a 0-5 Likert scale
+NUMERIC_RANGES = {'Age': (18, 34), 'CGPA': (5.0, 10.0), 'Work/Study Hours': (0, 12)}
+# Sub-millisecond benchmarks jitter by more than any sensible percentage; smaller slowdowns are noise
+MIN_REGRESSION_MS = 0.25
+# the suite measures serving, not password hashing
+BENCH_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+def load_serving_bundle(model_dir=MODEL_DIR):
+    if os.path.exists(os.path.join(model_dir, 'bundle', 'manifest.json')):
+        return load_mapped_bundle(os.path.join(model_dir, 'bundle'))
+    return load_bundle(os.path.join(model_dir, 'rf_model.pkl'), os.path.join(model_dir, 'label_encoder.pkl'),
+                       os.path.join(model_dir, 'feature_columns.json'), os.path.join(model_dir, 'original_features.json'))
+
+
+def synthetic_forms(encoder, n, seed=0):
+    """n form submissions (field -> string) covering every original feature."""
+    rng = random.Random(seed)
+    forms = []
+    for _ in range(n):
+        form = {}
+        for name in encoder.original_features:
+            if name in encoder.categorical:
+                # known categories plus, now and then, the one dropped at training time
+                choices = list(encoder.categorical[name]) or ['Other']
+                form[name] = rng.choice(choices) if rng.random() > 0.1 else 'Other'
+            else:
+                lo, hi = NUMERIC_RANGES.get(name, (0, 5))
+                value = rng.uniform(lo, hi) if isinstance(lo, float) else rng.randint(lo, hi)
+                form[name] = f'{value:.2f}' if isinstance(value, float) else str(value)
+        forms.append(form)
+    return forms
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000.0
+    return {
+        'n': int(len(ms)),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'ops_per_s': round(float(len(ms) / (ms.sum() / 1000.0)), 2) if ms.sum() else None,
+    }
+
+
+def measure(fn, args_list, warmup=3):
+    for a in args_list[:warmup]:
+        fn(a)
+    samples = []
+    for a in args_list:
+        t = time.perf_counter()
+        fn(a)
+        samples.append(time.perf_counter() - t)
+    return summarize(samples)
+
+
+def run_micro(bundle, forms, history_rows):
+    enc = bundle.feature_encoder
+    results = {}
+    results['encode'] = measure(lambda f: enc.encode(enc.parse_form(f)), forms)
+    rows = [enc.encode(enc.parse_form(f)) for f in forms]
+    results['predict_proba_1'] = measure(bundle.scorer.score, rows)
+    batch = np.vstack(rows[:256])
+    results['predict_proba_256'] = measure(lambda _: bundle.scorer.score_many(batch), list(range(max(10, len(rows) // 20))))
+    pos = bundle.scorer.pos_index
+    results['shap_1'] = measure(lambda X: bundle.explainer.contributions(X, pos), rows[:max(10, len(rows) // 10)])
+    # /api/whatif: single and pairwise perturbation grid, built and scored in one call
+    results['whatif_pairs'] = measure(
+        lambda f: bundle.scorer.score_many(whatif.build_grid(enc, enc.parse_form(f), pairs=True)[0]),
+        forms[:max(10, len(forms) // 10)])
+    results.update(run_history_micro(history_rows))
+    return results
+
+
+def run_history_micro(history_rows):
+    import dashboard_stats
+    import history_store
+    from models import db, Prediction, User
+    from stress_db import make_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', password_hash='-')
+            db.session.add(user)
+            db.session.commit()
+            now = int(time.time())
+            rng = random.Random(1)
+            db.session.add_all(Prediction(user_id=user.id, timestamp=now - i * 3600, probability=rng.random(),
+                                          risk_label=rng.choice(['Low Risk', 'Moderate Risk', 'High Risk']),
+                                          summary='Academic Pressure=3') for i in range(history_rows))
+            db.session.commit()
+            dashboard_stats.rebuild(user.id)
+            pages = list(range(50))
+            results = {
+                'history_page': measure(lambda p: history_store.recent_history(user.id, limit=50, offset=(p % 5) * 50), pages),
+                'dashboard_summary': measure(lambda _: dashboard_stats.summary(user.id), pages),
+            }
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+class _ClientSession:
+    def __init__(self, app, name):
+        self.client = app.test_client()
+        self.client.post('/signup', data={'username': name, 'email': f'{name}@example.com', 'password': name})
+        self.client.post('/login', data={'username': name, 'password': name})
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, form):
+        return self.client.post(path, data=form).status_code
+
+
+class _HttpSession:
+    def __init__(self, url):
+        self.url = url
+        self.opener = logged_in_opener(url)
+
+    def get(self, path):
+        with self.opener.open(self.url + path, timeout=60) as resp:
+            resp.read()
+            return resp.status
+
+    def post(self, path, form):
+        with self.opener.open(self.url + path, urllib.parse.urlencode(form).encode(), timeout=60) as resp:
+            resp.read()
+            return resp.status
+
+
+def drive(sessions, forms, rounds):
+    """Each session runs `rounds` x (POST /predict, GET /history, GET /dashboard), one thread per session."""
+    samples = {'e2e_predict': [], 'e2e_history': [], 'e2e_dashboard': []}
+    failures = []
+    lock = threading.Lock()
+
+    def user_loop(i, session):
+        local = {k: [] for k in samples}
+        for r in range(rounds):
+            for key, call in (('e2e_predict', lambda: session.post('/predict', forms[(i * rounds + r) % len(forms)])),
+                              ('e2e_history', lambda: session.get('/history')),
+                              ('e2e_dashboard', lambda: session.get('/dashboard'))):
+                t = time.perf_counter()
+                status = call()
+                local[key].append(time.perf_counter() - t)
+                if status != 200:
+                    failures.append((key, status))
+        with lock:
+            for k, v in local.items():
+                samples[k].extend(v)
+
+    threads = [threading.Thread(target=user_loop, args=(i, s)) for i, s in enumerate(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise RuntimeError(f'{len(failures)} e2e requests failed, first: {failures[0]}')
+    results = {k: summarize(v) for k, v in samples.items()}
+    results['e2e_requests_per_s'] = {'n': sum(len(v) for v in samples.values()),
+                                     'ops_per_s': round(sum(len(v) for v in samples.values()) / elapsed, 2)}
+    return results
+
+
+def run_e2e(mode, forms, users, rounds, port):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'e2e.db')}", 'PASSWORD_HASH_METHOD': BENCH_HASH_METHOD,
+               'LOG_LEVEL': 'WARNING', 'SECRET_KEY': os.environ.get('SECRET_KEY', 'bench-suite')}
+        if mode == 'client':
+            os.environ.update(env)
+            import app as app_module
+            # the test client runs requests in this thread; one session at a time keeps timings comparable
+            sessions = [_ClientSession(app_module.app, f'bench{i}') for i in range(users)]
+            results = {}
+            for s in sessions:
+                part = drive([s], forms, rounds)
+                for k, v in part.items():
+                    results.setdefault(k, []).append(v)
+            return {k: _merge(v) for k, v in results.items()}
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', '2', '-k', 'gthread', '--threads', '4', '-b', f'127.0.0.1:{port}', 'app:app']
+        proc = subprocess.Popen(cmd, env=dict(os.environ, **env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            url = f'http://127.0.0.1:{port}'
+            wait_ready(url, proc)
+            sessions = [_HttpSession(url) for _ in range(users)]
+            return drive(sessions, forms, rounds)
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=30)
+
+
+def _merge(parts):
+    """Combine per-session summaries (weighted by n; percentiles approximated by the weighted mean)."""
+    n = sum(p['n'] for p in parts)
+    out = {'n': n}
+    for key in ('p50_ms', 'p95_ms', 'ops_per_s'):
+        if all(key in p and p[key] is not None for p in parts):
+            out[key] = round(sum(p[key] * p['n'] for p in parts) / n, 4)
+    return out
+
+
+def compare(results, baseline, threshold, min_delta_ms=MIN_REGRESSION_MS):
+    """Print current vs baseline p50 for every benchmark; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':<22} {'baseline p50':>13} {'current p50':>12} {'change':>8}")
+    for name, base in sorted(baseline['results'].items()):
+        cur = results.get(name)
+        if cur is None or 'p50_ms' not in base or 'p50_ms' not in cur:
+            continue
+        change = cur['p50_ms'] / base['p50_ms'] - 1.0 if base['p50_ms'] else 0.0
+        regressed = change > threshold and cur['p50_ms'] - base['p50_ms'] > min_delta_ms
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<22} {base['p50_ms']:>10.3f} ms {cur['p50_ms']:>9.3f} ms {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro and end-to-end benchmarks with JSON baselines.')
+    parser.add_argument('--only', choices=['micro', 'e2e'], default=None)
+    parser.add_argument('--e2e', choices=['client', 'gunicorn'], default='client', help='how to drive the app end to end')
+    parser.add_argument('--samples', type=int, default=500, help='synthetic forms per micro benchmark')
+    parser.add_argument('--history-rows', type=int, default=5000, help='predictions seeded for the history benchmarks')
+    parser.add_argument('--users', type=int, default=4, help='synthetic users in the e2e run')
+    parser.add_argument('--rounds', type=int, default=25, help='predict/history/dashboard rounds per e2e user')
+    parser.add_argument('--port', type=int, default=8810)
+    parser.add_argument('--save-baseline', default=None, help='write this run to a baseline JSON file')
+    parser.add_argument('--baseline', default=None, help='compare against a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p50 slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_REGRESSION_MS,
+                        help='ignore p50 slowdowns smaller than this many milliseconds')
+    parser.add_argument('--output', default=None, help='write this run to a JSON file')
+    args = parser.parse_args(argv)
+
+    bundle = load_serving_bundle()
+    forms = synthetic_forms(bundle.feature_encoder, args.samples)
+    results = {}
+    if args.only in (None, 'micro'):
+        results.update(run_micro(bundle, forms, args.history_rows))
+    if args.only in (None, 'e2e'):
+        results.update(run_e2e(args.e2e, forms, args.users, args.rounds, args.port))
+
+    print(f"{'benchmark':<22} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10}")
+    for name, r in results.items():
+        p50 = f"{r['p50_ms']:10.3f}" if 'p50_ms' in r else f"{'':>10}"
+        p95 = f"{r['p95_ms']:10.3f}" if 'p95_ms' in r else f"{'':>10}"
+        print(f"{name:<22} {r['n']:>6} {p50} {p95} {r.get('ops_per_s') or 0:>10.1f}")
+
+    run = {
+        'created_at': int(time.time()),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'model_version': bundle.version,
+        'e2e_mode': args.e2e if args.only in (None, 'e2e') else None,
+        'results': results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+        print(f"Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('model_version') != run['model_version']:
+            print(f"Note: baseline was recorded with model {baseline.get('model_version')}, this run uses {run['model_version']}")
+        if run['e2e_mode'] and baseline.get('e2e_mode') not in (None, run['e2e_mode']):
+            print(f"Note: baseline e2e numbers come from --e2e {baseline['e2e_mode']}, this run uses --e2e {run['e2e_mode']}")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
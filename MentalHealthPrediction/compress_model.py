@@ -0,0 +1,263 @@
+import argparse
+import copy
+import itertools
+import json
+import pickle
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from sklearn.metrics import roc_auc_score
+
+from artifact_bundle import load_artifacts, save_artifacts
+from forest_engine import TREE_LEAF, CompiledForest
+from retrain_incremental import sklearn_forest
+from scoring import positive_index
+from training_data import DEFAULT_CSV, FORM_FEATURES, load_dataset
+
+# Post-training compression of the served forest, with an accuracy-versus-latency report.
+#
+# Every variant combines three steps:
+#   trees     keep the N trees that best fit a held-out selection set, in the order
+#             a greedy search adds them (each step picks the tree that most lowers
+#             the Brier score of the running average)
+#   depth     cap every tree at D levels; nodes at depth D become leaves holding the
+#             class distribution of the samples that reached them
+#   quantize  store the serving arrays with float32 thresholds (exact: see
+#             forest_engine.float32_thresholds) and float32 or float16 leaf values
+#
+# The held-out split from training_data.load_dataset() is cut in two: the first
+# half ranks the trees, the second half scores every variant (accuracy, ROC AUC),
+# so the report never grades a variant on the rows used to build it. Size is the
+# pickled estimator (rf_model.pkl) and the compiled serving arrays (the bundle's
+# compiled_*.npy). Latency is the p50 of single-row predict_proba.
+#
+# Usage:
+#   python compress_model.py [--csv dataset/student_depression.csv] [--trees all,100,50,25]
+#                            [--depths none,16,10] [--quantize none,float16] [--report report.json]
+#   python compress_model.py ... --publish t50-d16-float16       # one variant from the report
+#   python compress_model.py ... --publish auto [--max-drop 0.005] # fastest within the drop
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+LATENCY_ROWS = 200
+SKLEARN_LATENCY_ROWS = 30
+EVAL_CHUNK = 2048
+# --publish auto: relative latency difference treated as noise
+LATENCY_TIE = 0.1
+
+
+def cap_depth(forest, max_depth):
+    """Copy of forest with every tree cut off at max_depth."""
+    from sklearn.tree._tree import Tree
+
+    capped = copy.deepcopy(forest)
+    for est in capped.estimators_:
+        tree = est.tree_
+        state = tree.__getstate__()
+        nodes, values = state['nodes'], state['values']
+        depth = np.zeros(len(nodes), dtype=np.intp)
+        # nodes are stored parent before child, so one pass sets every depth
+        for i in range(len(nodes)):
+            if nodes['left_child'][i] != TREE_LEAF:
+                depth[nodes['left_child'][i]] = depth[nodes['right_child'][i]] = depth[i] + 1
+        keep = np.flatnonzero(depth <= max_depth)
+        if len(keep) == len(nodes):
+            continue
+        renumber = np.full(len(nodes), TREE_LEAF, dtype=np.intp)
+        renumber[keep] = np.arange(len(keep))
+        new_nodes = nodes[keep].copy()
+        cut = depth[keep] == max_depth
+        inner = new_nodes['left_child'] != TREE_LEAF
+        new_nodes['left_child'] = np.where(inner & ~cut, renumber[new_nodes['left_child']], TREE_LEAF)
+        new_nodes['right_child'] = np.where(inner & ~cut, renumber[new_nodes['right_child']], TREE_LEAF)
+        leaf = new_nodes['left_child'] == TREE_LEAF
+        new_nodes['feature'][leaf] = -2
+        new_nodes['threshold'][leaf] = -2.0
+        if 'missing_go_to_left' in new_nodes.dtype.names:
+            new_nodes['missing_go_to_left'][leaf] = 0
+        new_tree = Tree(tree.n_features, np.asarray(tree.n_classes, dtype=np.intp), tree.n_outputs)
+        new_tree.__setstate__({'max_depth': int(min(max_depth, state['max_depth'])), 'node_count': len(keep),
+                               'nodes': np.ascontiguousarray(new_nodes),
+                               'values': np.ascontiguousarray(values[keep])})
+        est.tree_ = new_tree
+        est.max_depth = max_depth
+    capped.max_depth = max_depth
+    return capped
+
+
+def select_trees(forest, order, n_trees):
+    """Copy of forest holding the first n_trees of `order` (estimators are shared, not copied)."""
+    selected = copy.copy(forest)
+    selected.estimators_ = [forest.estimators_[i] for i in order[:n_trees]]
+    selected.n_estimators = len(selected.estimators_)
+    return selected
+
+
+def tree_order(forest, X, y_pos, pos):
+    """Greedy forward selection: tree indices in the order that minimizes the Brier score of their average."""
+    compiled = CompiledForest.from_sklearn(forest, fallback=False)
+    per_tree = compiled.values[compiled.apply(X), pos]  # (n_trees, n_rows) positive-class probability
+    remaining = list(range(len(per_tree)))
+    order = []
+    total = np.zeros(per_tree.shape[1])
+    while remaining:
+        candidates = (total + per_tree[remaining]) / (len(order) + 1)
+        best = remaining[int(np.argmin(((candidates - y_pos) ** 2).mean(axis=1)))]
+        order.append(best)
+        remaining.remove(best)
+        total += per_tree[best]
+    return order
+
+
+def _p50_ms(fn, X, n_rows):
+    for i in range(min(10, len(X))):
+        fn(X[i:i + 1])
+    samples = []
+    for i in range(min(n_rows, len(X))):
+        row = X[i:i + 1]
+        t = time.perf_counter()
+        fn(row)
+        samples.append(time.perf_counter() - t)
+    return round(float(np.median(samples)) * 1000.0, 4)
+
+
+def evaluate(name, forest, quantize, X, y, pos, latency_X):
+    compiled = CompiledForest.from_sklearn(forest, fallback=False)
+    if quantize:
+        compiled = compiled.quantized(quantize)
+    probs = np.vstack([compiled.predict_proba(X[i:i + EVAL_CHUNK]) for i in range(0, len(X), EVAL_CHUNK)])
+    predicted = np.asarray(forest.classes_).take(np.argmax(probs, axis=1))
+    y_pos = y == forest.classes_[pos]
+    return {
+        'name': name,
+        'trees': len(forest.estimators_),
+        'max_depth': max(est.tree_.max_depth for est in forest.estimators_),
+        'quantize': quantize,
+        'nodes': int(sum(est.tree_.node_count for est in forest.estimators_)),
+        'accuracy': round(float(np.mean(predicted == y)), 5),
+        'auc': round(float(roc_auc_score(y_pos, probs[:, pos])), 5) if 0 < y_pos.sum() < len(y_pos) else None,
+        'pickle_kb': round(len(pickle.dumps(forest, protocol=pickle.HIGHEST_PROTOCOL)) / 1024, 1),
+        'compiled_kb': round(compiled.nbytes / 1024, 1),
+        'latency_ms': _p50_ms(compiled.predict_proba, latency_X, LATENCY_ROWS),
+        'sklearn_latency_ms': _p50_ms(forest.predict_proba, latency_X, SKLEARN_LATENCY_ROWS) if not quantize else None,
+    }
+
+
+def _levels(text, cast):
+    return [None if v in ('all', 'none') else cast(v) for v in text.split(',')]
+
+
+def variant_name(trees, depth, quantize):
+    return f"t{trees or 'all'}-d{depth or 'none'}-{quantize or 'float64'}"
+
+
+def choose(records, max_drop):
+    """Fastest variant whose accuracy and AUC are within max_drop of the uncompressed forest.
+
+    Latencies within LATENCY_TIE of the fastest count as a tie, won by the smallest serving arrays.
+    """
+    base = records[0]
+    ok = [r for r in records if r['accuracy'] >= base['accuracy'] - max_drop
+          and (base['auc'] is None or (r['auc'] or 0) >= base['auc'] - max_drop)]
+    fastest = min(r['latency_ms'] for r in ok)
+    return min((r for r in ok if r['latency_ms'] <= fastest * (1 + LATENCY_TIE)), key=lambda r: r['compiled_kb'])
+
+
+def format_records(records):
+    lines = [f"{'variant':<24} {'trees':>5} {'depth':>5} {'nodes':>8} {'accuracy':>8} {'auc':>7} "
+             f"{'pickle kB':>10} {'compiled kB':>11} {'ms/row':>7} {'sklearn':>8}"]
+    for r in records:
+        auc = f"{r['auc']:.4f}" if r['auc'] is not None else '-'
+        sk = f"{r['sklearn_latency_ms']:.3f}" if r['sklearn_latency_ms'] is not None else '-'
+        lines.append(f"{r['name']:<24} {r['trees']:>5} {r['max_depth']:>5} {r['nodes']:>8} {r['accuracy']:>8.4f} {auc:>7} "
+                     f"{r['pickle_kb']:>10.1f} {r['compiled_kb']:>11.1f} {r['latency_ms']:>7.3f} {sk:>8}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compress the served forest and report accuracy versus latency.')
+    parser.add_argument('--csv', default=DEFAULT_CSV, help='dataset CSV (or a one-line file holding its path)')
+    parser.add_argument('--no-cache', action='store_true', help='re-parse the CSV even if an encoded copy is cached')
+    parser.add_argument('--model-dir', default='model')
+    parser.add_argument('--trees', default='all,100,50,25', help="tree counts to keep ('all' = every tree)")
+    parser.add_argument('--depths', default='none,16,10', help="depth caps ('none' = uncapped)")
+    parser.add_argument('--quantize', default='none,float16', help="leaf value dtypes ('none', 'float32', 'float16')")
+    parser.add_argument('--max-eval-rows', type=int, default=20000, help='held-out rows used (half select, half score)')
+    parser.add_argument('--report', default=None, help='write the report as JSON')
+    parser.add_argument('--publish', default=None, help="variant name from the report, or 'auto'")
+    parser.add_argument('--max-drop', type=float, default=0.005, help="--publish auto: allowed accuracy/AUC loss")
+    args = parser.parse_args(argv)
+
+    model, label_encoder, feature_cols, original_features = load_artifacts(args.model_dir)
+    forest = sklearn_forest(model)
+    base_checksum = getattr(model, 'manifest', {}).get('checksum')
+    features = 'form' if list(original_features) == FORM_FEATURES else 'all'
+    try:
+        data = load_dataset(args.csv, features=features, use_cache=not args.no_cache)
+    except ValueError as e:
+        print('ERROR:', e)
+        return 1
+    # the dataset's one-hot columns may be ordered (or named) differently from the model's
+    columns = {c: i for i, c in enumerate(data.feature_encoder.feature_cols)}
+    X_held = np.zeros((len(data.X_test), len(feature_cols)), dtype=np.float32)
+    for j, c in enumerate(feature_cols):
+        if c in columns:
+            X_held[:, j] = data.X_test[:, columns[c]]
+    X_held, y_held = X_held[:args.max_eval_rows], np.asarray(data.y_test)[:args.max_eval_rows]
+    half = len(X_held) // 2
+    X_sel, y_sel, X_eval, y_eval = X_held[:half], y_held[:half], X_held[half:], y_held[half:]
+    pos = positive_index(label_encoder)
+    print(f"Served forest: {len(forest.estimators_)} trees; {half} rows select trees, {len(X_eval)} rows score variants")
+
+    t0 = time.perf_counter()
+    order = tree_order(forest, X_sel, (y_sel == forest.classes_[pos]).astype(np.float64), pos)
+    print(f"Ranked trees in {time.perf_counter() - t0:.1f}s")
+
+    n_all = len(forest.estimators_)
+    tree_levels = sorted({n_all if t is None else min(t, n_all) for t in _levels(args.trees, int)}, reverse=True)
+    depth_levels = _levels(args.depths, int)
+    quant_levels = _levels(args.quantize, str)
+    records, variants = [], {}
+    base = evaluate('original', forest, None, X_eval, y_eval, pos, X_eval)
+    records.append(base)
+    variants['original'] = (forest, None)
+    for depth in depth_levels:
+        capped = cap_depth(forest, depth) if depth else forest
+        for trees, quantize in itertools.product(tree_levels, quant_levels):
+            if trees == n_all and not depth and not quantize:
+                continue  # the original forest, already in the report
+            name = variant_name(trees if trees < n_all else None, depth, quantize)
+            variant = select_trees(capped, order, trees)
+            records.append(evaluate(name, variant, quantize, X_eval, y_eval, pos, X_eval))
+            variants[name] = (variant, quantize)
+    print(format_records(records))
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'base_checksum': base_checksum, 'eval_rows': len(X_eval), 'selection_rows': half,
+                       'tree_order': [int(i) for i in order], 'variants': records}, f, indent=2)
+        print(f"Wrote {args.report}")
+
+    if args.publish:
+        chosen = choose(records, args.max_drop) if args.publish == 'auto' else next(
+            (r for r in records if r['name'] == args.publish), None)
+        if chosen is None:
+            print(f"ERROR: no variant named {args.publish}; pick one from the report")
+            return 1
+        variant, quantize = variants[chosen['name']]
+        manifest = save_artifacts(args.model_dir, variant, label_encoder, original_features, feature_cols, quantize=quantize,
+                                  training={'kind': 'compressed', 'base_checksum': base_checksum, 'variant': chosen['name'],
+                                            'trees': chosen['trees'], 'max_depth': chosen['max_depth'],
+                                            'accuracy': chosen['accuracy'], 'auc': chosen['auc'],
+                                            'baseline_accuracy': base['accuracy'], 'baseline_auc': base['auc']})
+        print(f"Published {chosen['name']} (accuracy {chosen['accuracy']:.4f} vs {base['accuracy']:.4f}, "
+              f"{chosen['latency_ms']:.3f} vs {base['latency_ms']:.3f} ms/row) as model version {manifest['checksum'][:12]}")
+        print("Reload the app, or let MODEL_WATCH_INTERVAL pick it up")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
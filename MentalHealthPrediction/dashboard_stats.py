@@ -0,0 +1,210 @@
+import heapq
+import itertools
+import json
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+import history_archive
+from models import db, Prediction, UserDailyStats, UserStats
+
+# Per-user dashboard aggregates, kept up to date as predictions are written.
+#
+# history_store.append_prediction() calls record() in the same transaction as the
+# new Prediction row, so the totals never disagree with the history. record()
+# increments the counters in SQL (SET count = count + 1), so concurrent predictions
+# for one user cannot overwrite each other's totals; a row that does not exist yet
+# is created in a savepoint, and a concurrent request that created it first just
+# turns the insert into another increment. Rendering the
+# dashboard then reads one UserStats row and at most WINDOW_DAYS[-1] UserDailyStats
+# rows, however long the user's history is. Users whose history predates these
+# tables (or was bulk-imported) are rebuilt from the prediction table the first
+# time their aggregates are read.
+
+RECENT_ENTRIES = 10
+# Rolling windows reported by summary(), in days; the longest also bounds the trend series
+WINDOW_DAYS = (7, 30)
+RISK_COLUMNS = {'Low Risk': 'low', 'Moderate Risk': 'moderate', 'High Risk': 'high'}
+
+
+def day_of(timestamp):
+    return int(timestamp) // 86400
+
+
+def _add(row, probability, risk_label):
+    row.count = (row.count or 0) + 1
+    column = RISK_COLUMNS.get(risk_label)
+    if column:
+        setattr(row, column, (getattr(row, column) or 0) + 1)
+    if probability is not None:
+        row.prob_count = (row.prob_count or 0) + 1
+        row.prob_sum = (row.prob_sum or 0.0) + probability
+        row.prob_min = probability if row.prob_min is None else min(row.prob_min, probability)
+        row.prob_max = probability if row.prob_max is None else max(row.prob_max, probability)
+
+
+def _least(column, value):
+    return db.case((column.is_(None), value), (column > value, value), else_=column)
+
+
+def _greatest(column, value):
+    return db.case((column.is_(None), value), (column < value, value), else_=column)
+
+
+def _increments(model, probability, risk_label):
+    """SQL SET expressions doing what _add() does, evaluated by the database against the current row."""
+    values = {'count': model.count + 1}
+    column = RISK_COLUMNS.get(risk_label)
+    if column:
+        values[column] = getattr(model, column) + 1
+    if probability is not None:
+        values.update(prob_count=model.prob_count + 1, prob_sum=model.prob_sum + probability,
+                      prob_min=_least(model.prob_min, probability), prob_max=_greatest(model.prob_max, probability))
+    return values
+
+
+def _update(model, values, *where):
+    """Apply values to the matching row; False if there is none."""
+    result = db.session.execute(db.update(model).where(*where).values(**values)
+                                .execution_options(synchronize_session=False))
+    return result.rowcount > 0
+
+
+def _create(build):
+    """Run build() in a savepoint; if another transaction inserted the same row first, undo it and carry on."""
+    try:
+        with db.session.begin_nested():
+            build()
+    except IntegrityError:
+        pass
+
+
+def _entry(timestamp, probability, risk_label, summary):
+    return {'timestamp': int(timestamp), 'probability': probability, 'risk': risk_label, 'summary': summary or ''}
+
+
+def record(user_id, timestamp, probability, risk_label, summary):
+    """Fold one new prediction into the user's aggregates; the caller commits."""
+    timestamp = int(timestamp)
+    values = _increments(UserStats, probability, risk_label)
+    values.update(first_timestamp=_least(UserStats.first_timestamp, timestamp),
+                  last_timestamp=_greatest(UserStats.last_timestamp, timestamp))
+    # checked before any write, so a rebuild waiting for a running compaction does not hold the database
+    if db.session.execute(db.select(UserStats.user_id).where(UserStats.user_id == user_id)).first() is None:
+        # first write for this user since the aggregates existed: start from the stored history
+        # (which does not include this row yet) so earlier predictions are not lost
+        _create(lambda: rebuild(user_id, commit=False))
+    _update(UserStats, values, UserStats.user_id == user_id)
+    # the UPDATE holds the row until the caller commits, so this read-modify-write cannot interleave
+    recent = json.loads(db.session.execute(db.select(UserStats.recent).where(UserStats.user_id == user_id)).scalar()
+                        or '[]')
+    recent.insert(0, _entry(timestamp, probability, risk_label, summary))
+    recent.sort(key=lambda e: -e['timestamp'])
+    _update(UserStats, {'recent': json.dumps(recent[:RECENT_ENTRIES])}, UserStats.user_id == user_id)
+
+    day = day_of(timestamp)
+    where = (UserDailyStats.user_id == user_id, UserDailyStats.day == day)
+    values = _increments(UserDailyStats, probability, risk_label)
+    if not _update(UserDailyStats, values, *where):
+        _create(lambda: db.session.add(UserDailyStats(user_id=user_id, day=day, count=0, prob_count=0, prob_sum=0.0,
+                                                      low=0, moderate=0, high=0)))
+        _update(UserDailyStats, values, *where)
+
+
+def rebuild(user_id, commit=True):
+    """Recompute a user's aggregates from the prediction table and the archive (one pass over their history).
+
+    Holds the archive's read lock throughout, so a compaction cannot move rows
+    from the table to the archive mid-pass and have them counted twice or not at all.
+    """
+    with history_archive.read_lock():
+        stats = _rebuild(user_id)
+    if commit:
+        db.session.commit()
+    return stats
+
+
+def _rebuild(user_id):
+    UserDailyStats.query.filter(UserDailyStats.user_id == user_id).delete(synchronize_session=False)
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id)
+        db.session.add(stats)
+    for column in ('count', 'prob_count', 'low', 'moderate', 'high'):
+        setattr(stats, column, 0)
+    stats.prob_sum = 0.0
+    stats.prob_min = stats.prob_max = stats.first_timestamp = stats.last_timestamp = None
+    days = {}
+    # min-heap of the newest RECENT_ENTRIES rows; -n keeps the newer of two equal timestamps
+    recent = []
+    rows = (db.session.query(Prediction.timestamp, Prediction.probability, Prediction.risk_label, Prediction.summary)
+            .filter(Prediction.user_id == user_id)
+            .order_by(Prediction.timestamp.desc(), Prediction.id.desc()))
+    # rows moved to the archive still count (see history_archive.py)
+    for n, (ts, prob, risk, summary) in enumerate(itertools.chain(rows, history_archive.iter_user_rows(user_id))):
+        _add(stats, prob, risk)
+        if stats.last_timestamp is None or ts > stats.last_timestamp:
+            stats.last_timestamp = ts
+        if stats.first_timestamp is None or ts < stats.first_timestamp:
+            stats.first_timestamp = ts
+        item = (ts, -n, (ts, prob, risk, summary))
+        if len(recent) < RECENT_ENTRIES:
+            heapq.heappush(recent, item)
+        elif item > recent[0]:
+            heapq.heapreplace(recent, item)
+        day = day_of(ts)
+        daily = days.get(day)
+        if daily is None:
+            daily = days[day] = UserDailyStats(user_id=user_id, day=day)
+        _add(daily, prob, risk)
+    stats.recent = json.dumps([_entry(*row) for _, _, row in sorted(recent, reverse=True)])
+    db.session.add_all(days.values())
+    db.session.flush()
+    return stats
+
+
+def _totals(row_count, prob_count, prob_sum, prob_min, prob_max, low, moderate, high):
+    return {
+        'count': row_count,
+        'mean_probability': prob_sum / prob_count if prob_count else None,
+        'min_probability': prob_min,
+        'max_probability': prob_max,
+        'risk': {'Low Risk': low, 'Moderate Risk': moderate, 'High Risk': high},
+    }
+
+
+def summary(user_id, now=None):
+    """Everything the dashboard shows, from one UserStats row and the last WINDOW_DAYS[-1] daily rows."""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        _create(lambda: rebuild(user_id, commit=False))
+        db.session.commit()
+        stats = db.session.get(UserStats, user_id)
+    today = day_of(time.time() if now is None else now)
+    longest = max(WINDOW_DAYS)
+    daily = (UserDailyStats.query
+             .filter(UserDailyStats.user_id == user_id, UserDailyStats.day > today - longest)
+             .order_by(UserDailyStats.day)
+             .all())
+    windows = {}
+    for days in WINDOW_DAYS:
+        rows = [d for d in daily if d.day > today - days]
+        probs = [d for d in rows if d.prob_count]
+        windows[f'{days}d'] = _totals(
+            sum(d.count for d in rows), sum(d.prob_count for d in rows), sum(d.prob_sum for d in rows),
+            min((d.prob_min for d in probs), default=None), max((d.prob_max for d in probs), default=None),
+            sum(d.low for d in rows), sum(d.moderate for d in rows), sum(d.high for d in rows))
+    out = _totals(stats.count, stats.prob_count, stats.prob_sum, stats.prob_min, stats.prob_max,
+                  stats.low, stats.moderate, stats.high)
+    out.update({
+        'first_timestamp': stats.first_timestamp,
+        'last_timestamp': stats.last_timestamp,
+        'recent': json.loads(stats.recent or '[]'),
+        'windows': windows,
+        # one point per day with predictions, oldest first
+        'trend': [{'day': time.strftime('%Y-%m-%d', time.gmtime(d.day * 86400)), 'count': d.count,
+                   'mean_probability': d.prob_sum / d.prob_count if d.prob_count else None,
+                   'risk': {'Low Risk': d.low, 'Moderate Risk': d.moderate, 'High Risk': d.high}}
+                  for d in daily],
+    })
+    return out
@@ -1,17 +1,18 @@
-import json
-import pickle
-import pandas as pd
 import numpy as np
 import os
+import warnings
+
+from artifact_bundle import load_artifacts
+from feature_encoder import FeatureEncoder
+from scoring import Scorer
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
 mdir = os.path.join("model")
-with open(os.path.join(mdir, "feature_columns.json"), "r", encoding="utf-8") as f:
-    FEATURE_COLS = json.load(f)
-with open(os.path.join(mdir, "original_features.json"), "r", encoding="utf-8") as f:
-    ORIGINAL_FEATURES = json.load(f)
+model, encoder, FEATURE_COLS, ORIGINAL_FEATURES = load_artifacts(mdir)
 
-model = pickle.load(open(os.path.join(mdir, "rf_model.pkl"), "rb"))
-encoder = pickle.load(open(os.path.join(mdir, "label_encoder.pkl"), "rb"))
+fe = FeatureEncoder(ORIGINAL_FEATURES, FEATURE_COLS)
+scorer = Scorer(model, encoder)
 
 print("Label encoder classes:", list(encoder.classes_))
 print("Num feature columns expected:", len(FEATURE_COLS))
@@ -38,19 +39,16 @@ c3.update({"Academic Pressure": 5, "Work Pressure": 5, "Study Satisfaction": 1,
 cases.append(("high_stress", c3))
 
 for name, case in cases:
-    df_orig = pd.DataFrame([case])
-    df_d = pd.get_dummies(df_orig, drop_first=True)
-    X_in = df_d.reindex(columns=FEATURE_COLS, fill_value=0)
+    X_in = fe.encode(case)
     print("\nCase:", name)
-    print("Input nonzero columns:", [c for c, v in X_in.iloc[0].items() if v != 0][:30])
+    print("Input nonzero columns:", fe.nonzero_columns(X_in, limit=30))
     try:
-        probs = model.predict_proba(X_in)
-        pred = model.predict(X_in)
-        print("Probs:", probs)
-        print("Pred:", pred, "Decoded:", encoder.inverse_transform(pred))
+        score = scorer.score(X_in)
+        print("Probs:", score.probabilities)
+        print("Decoded:", score.prediction, "Positive prob:", score.probability, "->", score.risk_label)
     except Exception as e:
         print("Model error:", e)
         print("X_in shape:", X_in.shape)
-        print(X_in.head(1).to_string())
+        print(dict(zip(FEATURE_COLS, X_in[0])))
 
 print("Done.")
@@ -0,0 +1,149 @@
+import importlib.util
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app_logging import log_event
+
+# shap pulls in pandas, numba and llvmlite (seconds of import time), so it is only
+# imported when the first explanation needs it; without it we fall back to the importance proxy
+SHAP_AVAILABLE = importlib.util.find_spec('shap') is not None
+_shap = None
+_shap_lock = threading.Lock()
+
+
+def load_shap():
+    """The shap module, imported on first call; None if it cannot be imported."""
+    global _shap, SHAP_AVAILABLE
+    if _shap is None and SHAP_AVAILABLE:
+        with _shap_lock:
+            if _shap is None and SHAP_AVAILABLE:
+                try:
+                    import shap
+                    _shap = shap
+                except Exception as e:
+                    log_event(logging.WARNING, 'shap_unavailable', error=str(e))
+                    SHAP_AVAILABLE = False
+    return _shap
+
+TOP_K = 6
+
+
+def top_contributions(values, feature_cols, top_k=TOP_K, row=None):
+    """(feature, value) for the top_k entries of values by magnitude, largest first.
+
+    With `row` (the proxy), features whose input value is 0 are left out; SHAP values are kept as they are.
+    Both the single-row and the batched paths go through here, so a row gets the same list either way.
+    """
+    return [(feature_cols[i], float(values[i])) for i in np.argsort(-np.abs(values))[:top_k]
+            if row is None or row[i] != 0]
+
+
+def proxy_contributions(importances, X, feature_cols, top_k=TOP_K):
+    """Cheap fallback: model.feature_importances_ * feature value."""
+    if importances is None:
+        return []
+    return top_contributions(X[0] * importances, feature_cols, top_k, row=X[0])
+
+
+def _positive_class_values(sv, pos_index, row=0):
+    # shap returns a list per class (old releases) or an (n, features, classes) array
+    if isinstance(sv, list):
+        return np.asarray(sv[pos_index if len(sv) > 1 else 0])[row]
+    sv = np.asarray(sv)
+    if sv.ndim == 3:
+        return sv[row, :, pos_index]
+    return sv[row]
+
+
+class ModelExplainer:
+    """SHAP TreeExplainer bound to one loaded model.
+
+    The TreeExplainer is built lazily on first use and then reused for every
+    request; load_model_files() replaces the whole object when the model changes,
+    so a stale explainer can never outlive its model.
+    """
+
+    def __init__(self, model, feature_cols):
+        self.model = model
+        self.feature_cols = list(feature_cols)
+        # sklearn recomputes feature_importances_ over every tree on each access
+        self.importances = getattr(model, 'feature_importances_', None)
+        self._tree_explainer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tree_explainer(self):
+        if self._tree_explainer is None:
+            with self._lock:
+                if self._tree_explainer is None:
+                    # memory-mapped bundles rebuild the sklearn estimator only when SHAP needs it
+                    to_sklearn = getattr(self.model, 'to_sklearn', None)
+                    self._tree_explainer = load_shap().TreeExplainer(to_sklearn() if to_sklearn else self.model)
+        return self._tree_explainer
+
+    def shap_contributions(self, X, pos_index=1, top_k=TOP_K):
+        sv = self.tree_explainer.shap_values(X, check_additivity=False)
+        return top_contributions(_positive_class_values(sv, pos_index), self.feature_cols, top_k)
+
+    def contributions(self, X, pos_index=1, top_k=TOP_K):
+        if self.model is not None and load_shap() is not None:
+            return self.shap_contributions(X, pos_index, top_k)
+        return self.proxy_contributions(X, top_k)
+
+    def proxy_contributions(self, X, top_k=TOP_K):
+        return proxy_contributions(self.importances, X, self.feature_cols, top_k)
+
+    def contributions_many(self, X, pos_index=1, top_k=TOP_K):
+        """Top contributors for every row of X, from a single batched SHAP call."""
+        if self.model is not None and load_shap() is not None:
+            sv = self.tree_explainer.shap_values(X, check_additivity=False)
+            return [top_contributions(_positive_class_values(sv, pos_index, row=i), self.feature_cols, top_k)
+                    for i in range(X.shape[0])]
+        if self.importances is not None:
+            return [top_contributions(row * self.importances, self.feature_cols, top_k, row=row) for row in X]
+        return [[] for _ in range(X.shape[0])]
+
+
+class BackgroundExplanations:
+    """Runs SHAP explanations in a worker pool and keeps results for polling.
+
+    Results live in this process only and are evicted oldest-first once
+    `max_results` is reached; a poll that misses simply keeps the fallback
+    contributions the page was rendered with.
+    """
+
+    def __init__(self, workers=2, max_results=1000):
+        self.max_results = max_results
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='explain')
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, explainer, X, pos_index=1):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._results[token] = None
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        self._pool.submit(self._run, token, explainer, X.copy(), pos_index)
+        return token
+
+    def _run(self, token, explainer, X, pos_index):
+        try:
+            result = {'status': 'done', 'contributions': explainer.contributions(X, pos_index)}
+        except Exception as e:
+            log_event(logging.WARNING, 'explain_failed', error=str(e), token=token)
+            result = {'status': 'error', 'contributions': []}
+        with self._lock:
+            if token in self._results:
+                self._results[token] = result
+
+    def get(self, token):
+        with self._lock:
+            if token not in self._results:
+                return None
+            return self._results[token] or {'status': 'pending', 'contributions': []}
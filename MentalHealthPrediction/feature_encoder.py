@@ -0,0 +1,141 @@
+import numbers
+
+import numpy as np
+
+
+# Sensible defaults for inputs that are no longer on the form
+FORM_DEFAULTS = {
+    "id": 1,
+    "City": "Unknown",
+    "Profession": "Other",
+    "Job Satisfaction": 3,
+    "Dietary Habits": "Moderate",
+    "Have you ever had suicidal thoughts ?": "No"
+}
+
+
+class FeatureEncoder:
+    """Maps raw form/survey values straight onto the one-hot training columns.
+
+    Built once from original_features.json and feature_columns.json. Numeric
+    features map to a single column index; categorical features map each known
+    category to the index of its `<feature>_<category>` dummy column. Categories
+    without a column (the one dropped by get_dummies(drop_first=True) during
+    training, or values never seen) encode as all zeros, exactly like
+    get_dummies + reindex(fill_value=0) does.
+    """
+
+    def __init__(self, original_features, feature_cols):
+        self.original_features = list(original_features)
+        self.feature_cols = list(feature_cols)
+        self.n_features = len(self.feature_cols)
+        col_index = {c: i for i, c in enumerate(self.feature_cols)}
+
+        self.numeric = {}
+        self.categorical = {}
+        for name in self.original_features:
+            if name in col_index:
+                self.numeric[name] = col_index[name]
+                continue
+            prefix = f"{name}_"
+            self.categorical[name] = {
+                c[len(prefix):]: i for c, i in col_index.items() if c.startswith(prefix)
+            }
+
+        self._template = np.zeros((1, self.n_features), dtype=np.float64)
+
+    @classmethod
+    def from_vocabulary(cls, original_features, numeric, categorical):
+        """Build the encoder training fits: numeric column names plus {feature: sorted categories}.
+
+        Columns come out in pd.get_dummies(drop_first=True) order (numeric
+        features first, then each categorical's dummies without its first
+        category), so the encoder doubles as the source of feature_columns.json.
+        """
+        feature_cols = list(numeric)
+        for name, categories in categorical.items():
+            feature_cols.extend(f"{name}_{v}" for v in list(categories)[1:])
+        return cls(original_features, feature_cols)
+
+    def blank_row(self):
+        row = {c: 0 for c in self.original_features}
+        for k, v in FORM_DEFAULTS.items():
+            if k in row:
+                row[k] = v
+        return row
+
+    def parse_form(self, form):
+        """Build the pre-one-hot input row from a form / record mapping."""
+        row = self.blank_row()
+        for key, val in form.items():
+            if key in row:
+                # try to parse numeric values, otherwise keep as string for categorical
+                try:
+                    row[key] = float(val)
+                except Exception:
+                    row[key] = val
+        return row
+
+    def encode_into(self, orig_row, out):
+        """Write one encoded row into `out` (a 1-D view of length n_features)."""
+        for name, idx in self.numeric.items():
+            val = orig_row.get(name, 0)
+            # non-numeric strings would be dummied into columns that don't exist
+            if isinstance(val, numbers.Real) and not isinstance(val, bool):
+                out[idx] = val
+        for name, categories in self.categorical.items():
+            val = orig_row.get(name)
+            if isinstance(val, str):
+                idx = categories.get(val)
+                if idx is not None:
+                    out[idx] = 1.0
+        return out
+
+    def encode(self, orig_row):
+        """Encode a single row into a (1, n_features) float array."""
+        X = self._template.copy()
+        self.encode_into(orig_row, X[0])
+        return X
+
+    def encode_many(self, rows, out=None):
+        """Encode a sequence of rows into an (n, n_features) float array.
+
+        `out` may be a preallocated buffer with at least len(rows) rows; it is
+        zeroed and filled in place so chunked callers can reuse one allocation.
+        """
+        rows = list(rows)
+        if out is None:
+            X = np.zeros((len(rows), self.n_features), dtype=np.float64)
+        else:
+            X = out[:len(rows)]
+            X.fill(0.0)
+        for i, r in enumerate(rows):
+            self.encode_into(r, X[i])
+        return X
+
+    def encode_frame(self, frame, out):
+        """Encode a DataFrame chunk (training data) into the zeroed (len(frame), n_features) array `out`.
+
+        Missing numeric values encode as 0 and missing or unknown categories as
+        all zeros, as get_dummies + fillna(0) does.
+        """
+        names = [n for n in self.numeric if n in frame]
+        if names:
+            idx = [self.numeric[n] for n in names]
+            out[:, idx] = frame[names].fillna(0).to_numpy(dtype=out.dtype)
+        for name, categories in self.categorical.items():
+            if name not in frame:
+                continue
+            s = frame[name]
+            if hasattr(s, 'cat'):
+                # categorical dtype: map category codes to columns through a lookup table
+                lookup = np.array([categories.get(str(c), -1) for c in s.cat.categories] + [-1], dtype=np.intp)
+                cols = lookup[s.cat.codes.to_numpy()]
+            else:
+                cols = s.map(categories).fillna(-1).to_numpy(dtype=np.intp)
+            hit = cols >= 0
+            out[np.flatnonzero(hit), cols[hit]] = 1.0
+        return out
+
+    def nonzero_columns(self, X, limit=60):
+        return [self.feature_cols[i] for i in np.flatnonzero(X[0])][:limit]
@@ -0,0 +1,149 @@
+import numpy as np
+
+TREE_LEAF = -1
+# Above this many rows predict_proba hands off to the original sklearn model
+DEFAULT_MAX_ROWS = 256
+# Leaf probability dtypes quantized() accepts
+VALUE_DTYPES = ('float64', 'float32', 'float16')
+
+
+def float32_thresholds(threshold):
+    """Round split thresholds down to float32.
+
+    Inputs are compared as float32, and no float32 lies between the rounded-down
+    value and the original, so `x <= threshold` is unchanged for every input.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def _index_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.intp
+
+
+class CompiledForest:
+    """A fitted RandomForestClassifier flattened into contiguous NumPy arrays.
+
+    All trees share one node table (feature, threshold, children, leaf class
+    probabilities) with per-tree root offsets. Scoring walks every (tree, row)
+    pair down its tree together, one vectorized step per level, with none of
+    sklearn's per-call validation or per-tree Python dispatch. Exposes the
+    predict_proba / predict / classes_ subset the app uses, so it can stand in
+    for the sklearn model when serving.
+    """
+
+    def __init__(self, feature, threshold, left, right, values, roots, max_depth, classes, n_features_in,
+                 missing_left=None, fallback=None, max_rows=DEFAULT_MAX_ROWS, is_leaf=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.values = values
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features_in_ = n_features_in
+        self.missing_left = missing_left
+        self.n_trees = len(roots)
+        self.is_leaf = left == np.arange(len(left)) if is_leaf is None else is_leaf
+        self.fallback = fallback
+        self.max_rows = max_rows
+
+    @classmethod
+    def from_sklearn(cls, model, max_rows=DEFAULT_MAX_ROWS, fallback=True):
+        trees = [est.tree_ for est in model.estimators_]
+        sizes = [t.node_count for t in trees]
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+        n_nodes = int(sum(sizes))
+        n_classes = trees[0].value.shape[2]
+
+        feature = np.zeros(n_nodes, dtype=np.intp)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        left = np.empty(n_nodes, dtype=np.intp)
+        right = np.empty(n_nodes, dtype=np.intp)
+        values = np.empty((n_nodes, n_classes), dtype=np.float64)
+        has_missing = hasattr(trees[0], 'missing_go_to_left')
+        missing_left = np.zeros(n_nodes, dtype=bool) if has_missing else None
+
+        for t, off in zip(trees, roots):
+            sl = slice(off, off + t.node_count)
+            own = np.arange(off, off + t.node_count)
+            is_leaf = t.children_left == TREE_LEAF
+            # leaves point back at themselves, which is also how is_leaf is derived
+            left[sl] = np.where(is_leaf, own, t.children_left + off)
+            right[sl] = np.where(is_leaf, own, t.children_right + off)
+            feature[sl] = np.where(is_leaf, 0, t.feature)
+            threshold[sl] = t.threshold
+            # per-tree class probabilities, normalized the way DecisionTreeClassifier.predict_proba does
+            v = t.value[:, 0, :]
+            totals = v.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values[sl] = v / totals
+            if has_missing:
+                missing_left[sl] = np.asarray(t.missing_go_to_left, dtype=bool)
+
+        max_depth = max(t.max_depth for t in trees)
+        return cls(feature, threshold, left, right, values, roots, max_depth,
+                   np.asarray(model.classes_), int(model.n_features_in_), missing_left,
+                   fallback=model if fallback else None, max_rows=max_rows)
+
+    def quantized(self, value_dtype='float32'):
+        """Copy with float32 thresholds, 32-bit node indices and leaf probabilities stored as value_dtype.
+
+        Thresholds and indices are exact (see float32_thresholds); only value_dtype
+        below float64 rounds the leaf probabilities.
+        """
+        if value_dtype not in VALUE_DTYPES:
+            raise ValueError(f'value_dtype must be one of {VALUE_DTYPES}')
+        idx = _index_dtype(len(self.left))
+        return CompiledForest(self.feature.astype(_index_dtype(self.n_features_in_)), float32_thresholds(self.threshold),
+                              self.left.astype(idx), self.right.astype(idx), self.values.astype(value_dtype),
+                              self.roots.astype(idx), self.max_depth, self.classes_, self.n_features_in_,
+                              missing_left=self.missing_left, fallback=self.fallback, max_rows=self.max_rows,
+                              is_leaf=self.is_leaf)
+
+    @property
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.left, self.right, self.values, self.roots, self.is_leaf]
+        if self.missing_left is not None:
+            arrays.append(self.missing_left)
+        return int(sum(a.nbytes for a in arrays))
+
+    def apply(self, X):
+        """Leaf node index for every (tree, row): shape (n_trees, n_rows)."""
+        # sklearn evaluates trees on float32 inputs; do the same so splits agree exactly
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, n_cols = X.shape
+        Xf = X.ravel()
+        leaves = np.repeat(self.roots, n)
+        # flat offset of each (tree, row) pair's input row in Xf
+        row_base = np.tile(np.arange(n) * n_cols, self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[leaves])
+        node = leaves[active]
+        check_missing = self.missing_left is not None and np.isnan(Xf).any()
+        # advance only the pairs still inside a tree, dropping them as they reach a leaf
+        while active.size:
+            x = Xf[row_base[active] + self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if check_missing:
+                go_left |= np.isnan(x) & self.missing_left[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            leaves[active] = node
+            inner = ~self.is_leaf[node]
+            active = active[inner]
+            node = node[inner]
+        return leaves.reshape(self.n_trees, n)
+
+    def predict_proba(self, X):
+        if self.fallback is not None and len(X) > self.max_rows:
+            # sklearn's threaded Cython traversal wins on large batches
+            return self.fallback.predict_proba(X)
+        leaves = self.apply(X)
+        # accumulate in float64 whatever precision the leaf values are stored in
+        return self.values[leaves].sum(axis=0, dtype=np.float64) / self.n_trees
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,28 @@
+import gc
+import os
+
+# Picked up automatically by `gunicorn app:app` (Procfile) when run from this directory.
+#
+# Preload: the master imports app.py once, which loads the model artifacts and (with
+# WARM_EXPLAINER) builds the SHAP explainer. Workers then fork from it and share
+# those pages copy-on-write instead of each importing and loading their own copy.
+# The app restarts its per-process threads after fork (see app.py and db_profile.py),
+# and post_worker_init re-installs the model reload signal handler in every worker.
+# GUNICORN_PRELOAD=0 goes back to every worker importing the app itself.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app:
+    os.environ.setdefault('WARM_EXPLAINER', '1')
+
+
+def when_ready(server):
+    if preload_app:
+        # move everything loaded so far out of the collector's reach, so gc passes in the
+        # workers do not write to (and so un-share) the inherited objects
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # runs after the worker has set up its own signal handlers
+    import app
+    app.install_reload_signal()
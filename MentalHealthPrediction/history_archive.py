@@ -0,0 +1,331 @@
+import argparse
+import calendar
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from app_logging import log_event
+from models import db, Prediction
+
+# Optional: without fcntl (Windows) concurrent compaction runs are not serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Cold storage for prediction history.
+#
+# The prediction table is the active log. compact() moves whole UTC months that
+# lie entirely more than `hot_days` in the past out of it into immutable
+# compressed NumPy files, one per month and user bucket (user_id % BUCKETS); a
+# later run only adds another file for a month if rows were backdated into it:
+#
+#   <archive_dir>/<YYYY-MM>/bucket-<NN>-<run>.npz
+#       id, user_id, timestamp, probability (NaN = none), risk (index into the
+#       file's risk_labels), summary_offsets + summary_blob (UTF-8); sorted by user, time
+#   <archive_dir>/manifest.json
+#       every file with its month, bucket, row count and timestamp range
+#
+# iter_user_rows() opens only the files of one user's bucket (and of the months
+# asked for) and yields that user's rows, one file in memory at a time. A reader
+# that combines the archive with the live table reads the manifest and starts its
+# database query under read_lock(), so no compaction moves rows in between.
+#
+# Each file is written (atomic rename), then its rows are deleted from the
+# database in one transaction, then it is added to the manifest. A file missing
+# from the manifest after a crash is adopted by the next run if its rows are gone
+# from the database and removed if they are not. A lock file keeps concurrent
+# runs (several gunicorn workers, cron) from overlapping.
+
+ARCHIVE_DIR = os.environ.get('HISTORY_ARCHIVE_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'archive')
+MANIFEST = 'manifest.json'
+LOCK_FILE = '.compact.lock'
+FORMAT_VERSION = 1
+BUCKETS = 16
+# ids per DELETE/IN statement (SQLite caps bound parameters)
+ID_CHUNK = 500
+
+
+def month_of(timestamp):
+    return time.strftime('%Y-%m', time.gmtime(int(timestamp)))
+
+
+def _month_start(month):
+    year, mon = (int(p) for p in month.split('-'))
+    return calendar.timegm((year, mon, 1, 0, 0, 0))
+
+
+def _next_month(month):
+    year, mon = (int(p) for p in month.split('-'))
+    return f'{year + mon // 12:04d}-{mon % 12 + 1:02d}'
+
+
+def read_manifest(archive_dir=None):
+    path = os.path.join(archive_dir or ARCHIVE_DIR, MANIFEST)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'format_version': FORMAT_VERSION, 'buckets': BUCKETS, 'files': []}
+
+
+def _write_manifest(archive_dir, manifest):
+    path = os.path.join(archive_dir, MANIFEST)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _encode_rows(rows):
+    """Column arrays for (id, user_id, timestamp, probability, risk_label, summary) rows."""
+    summaries = [(r[5] or '').encode('utf-8') for r in rows]
+    labels = sorted({r[4] for r in rows})
+    risk_index = {label: i for i, label in enumerate(labels)}
+    return {
+        'id': np.array([r[0] for r in rows], dtype=np.int64),
+        'user_id': np.array([r[1] for r in rows], dtype=np.int64),
+        'timestamp': np.array([r[2] for r in rows], dtype=np.int64),
+        'probability': np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=np.float64),
+        'risk': np.array([risk_index[r[4]] for r in rows], dtype=np.uint16),
+        'risk_labels': np.array(labels, dtype=str),
+        'summary_offsets': np.cumsum([0] + [len(s) for s in summaries], dtype=np.int64),
+        'summary_blob': np.frombuffer(b''.join(summaries), dtype=np.uint8),
+    }
+
+
+def _write_file(path, columns):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp, path)
+
+
+def _entry(archive_dir, path, columns, month, bucket):
+    return {'path': os.path.relpath(path, archive_dir).replace(os.sep, '/'), 'month': month, 'bucket': bucket,
+            'rows': int(len(columns['id'])), 'min_timestamp': int(columns['timestamp'].min()),
+            'max_timestamp': int(columns['timestamp'].max())}
+
+
+def _ids_in_db(ids):
+    found = 0
+    for i in range(0, len(ids), ID_CHUNK):
+        chunk = [int(v) for v in ids[i:i + ID_CHUNK]]
+        found += db.session.query(Prediction.id).filter(Prediction.id.in_(chunk)).count()
+    return found
+
+
+def _recover(archive_dir, manifest):
+    """Adopt or remove archive files left out of the manifest by an interrupted run."""
+    listed = {f['path'] for f in manifest['files']}
+    changed = False
+    for root, _, files in os.walk(archive_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, archive_dir).replace(os.sep, '/')
+            if not name.endswith('.npz') or rel in listed:
+                continue
+            with np.load(path) as z:
+                columns = {k: z[k] for k in ('id', 'timestamp')}
+            if _ids_in_db(columns['id']):
+                # the delete never committed: the rows are still live, this copy is redundant
+                os.remove(path)
+                log_event(logging.INFO, 'history_archive_removed', path=rel)
+            else:
+                month, bucket = rel.split('/')[0], int(name.split('-')[1])
+                manifest['files'].append(_entry(archive_dir, path, columns, month, bucket))
+                changed = True
+                log_event(logging.INFO, 'history_archive_adopted', path=rel)
+    return changed
+
+
+def compact(hot_days=90, archive_dir=None, now=None):
+    """Move the months that ended more than hot_days ago into the archive; returns the number of rows moved.
+
+    Returns None without doing anything when another run holds the lock.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    lock = open(os.path.join(archive_dir, LOCK_FILE), 'a')
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+        manifest = read_manifest(archive_dir)
+        buckets = manifest.get('buckets', BUCKETS)
+        if _recover(archive_dir, manifest):
+            _write_manifest(archive_dir, manifest)
+        # whole months only, so a run every few minutes still writes one file per month and bucket
+        cutoff = _month_start(month_of((time.time() if now is None else now) - hot_days * 86400))
+        oldest = db.session.query(db.func.min(Prediction.timestamp)).filter(Prediction.timestamp < cutoff).scalar()
+        if oldest is None:
+            return 0
+        run = f'{int(time.time())}-{os.getpid()}'
+        moved = 0
+        month = month_of(oldest)
+        while _month_start(month) < cutoff:
+            start, end = _month_start(month), min(_month_start(_next_month(month)), cutoff)
+            for bucket in range(buckets):
+                rows = (db.session.query(Prediction.id, Prediction.user_id, Prediction.timestamp, Prediction.probability,
+                                         Prediction.risk_label, Prediction.summary)
+                        .filter(Prediction.timestamp >= start, Prediction.timestamp < end,
+                                Prediction.user_id % buckets == bucket)
+                        .order_by(Prediction.user_id, Prediction.timestamp, Prediction.id)
+                        .all())
+                if not rows:
+                    continue
+                columns = _encode_rows(rows)
+                path = os.path.join(archive_dir, month, f'bucket-{bucket:02d}-{run}.npz')
+                _write_file(path, columns)
+                try:
+                    ids = [int(v) for v in columns['id']]
+                    for i in range(0, len(ids), ID_CHUNK):
+                        Prediction.query.filter(Prediction.id.in_(ids[i:i + ID_CHUNK])).delete(synchronize_session=False)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    os.remove(path)
+                    raise
+                manifest['files'].append(_entry(archive_dir, path, columns, month, bucket))
+                _write_manifest(archive_dir, manifest)
+                moved += len(rows)
+            month = _next_month(month)
+        return moved
+    finally:
+        lock.close()
+
+
+@contextlib.contextmanager
+def read_lock(archive_dir=None):
+    """Shared lock on the archive: compaction runs are skipped while it is held."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, LOCK_FILE), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+        yield
+
+
+def iter_user_rows(user_id, since=None, until=None, archive_dir=None, manifest=None, reverse=False):
+    """Yield (timestamp, probability, risk_label, summary) for a user's archived rows, oldest first (newest with reverse).
+
+    Only files in the user's bucket whose time range overlaps [since, until) are opened.
+    `manifest` is a snapshot from read_manifest(); read now when omitted.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    manifest = manifest or read_manifest(archive_dir)
+    bucket = int(user_id) % manifest.get('buckets', BUCKETS)
+    files = [f for f in manifest['files'] if f['bucket'] == bucket
+             and (since is None or f['max_timestamp'] >= since) and (until is None or f['min_timestamp'] < until)]
+    for entry in sorted(files, key=lambda f: (f['month'], f['min_timestamp']), reverse=reverse):
+        with np.load(os.path.join(archive_dir, entry['path'])) as z:
+            users = z['user_id']
+            lo, hi = np.searchsorted(users, user_id, 'left'), np.searchsorted(users, user_id, 'right')
+            if lo == hi:
+                continue
+            timestamps = z['timestamp'][lo:hi]
+            probabilities = z['probability'][lo:hi]
+            risks = z['risk'][lo:hi]
+            labels = [str(label) for label in z['risk_labels']]
+            offsets = z['summary_offsets'][lo:hi + 1]
+            blob = z['summary_blob'][offsets[0]:offsets[-1]].tobytes()
+        base = offsets[0]
+        for i in (range(hi - lo - 1, -1, -1) if reverse else range(hi - lo)):
+            ts = int(timestamps[i])
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+            prob = float(probabilities[i])
+            yield (ts, None if np.isnan(prob) else prob, labels[risks[i]],
+                   blob[offsets[i] - base:offsets[i + 1] - base].decode('utf-8'))
+
+
+def describe(archive_dir=None):
+    manifest = read_manifest(archive_dir)
+    return {'files': len(manifest['files']), 'rows': sum(f['rows'] for f in manifest['files']),
+            'buckets': manifest.get('buckets', BUCKETS)}
+
+
+class Compactor:
+    """Runs compact() every `interval` seconds in a background thread of each process."""
+
+    def __init__(self, app, interval, hot_days, archive_dir=None):
+        self.app = app
+        self.interval = interval
+        self.hot_days = hot_days
+        self.archive_dir = archive_dir
+        self.runs = 0
+        self.moved = 0
+        self.last_run = None
+        self.last_error = None
+        self._thread = None
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                moved = compact(self.hot_days, self.archive_dir)
+            except Exception as e:
+                self.last_error = str(e)
+                log_event(logging.WARNING, 'history_compaction_failed', error=str(e))
+                return None
+            finally:
+                db.session.remove()
+        self.last_run = time.time()
+        if moved is not None:
+            self.runs += 1
+            self.moved += moved
+            self.last_error = None
+        return moved
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                self.run_once()
+        self._thread = threading.Thread(target=run, name='history-compact', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """In a freshly forked worker the parent's thread is gone; start this process's own."""
+        self._thread = None
+        self.start()
+
+    def status(self):
+        return dict(describe(self.archive_dir), interval=self.interval, hot_days=self.hot_days, runs=self.runs,
+                    moved=self.moved, last_run=self.last_run, last_error=self.last_error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move old predictions from the database into the history archive.')
+    parser.add_argument('--hot-days', type=int, default=int(os.environ.get('HISTORY_HOT_DAYS', '90')),
+                        help='keep this many days of predictions in the database')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+
+    from app import app
+    with app.app_context():
+        t = time.perf_counter()
+        moved = compact(args.hot_days, args.archive_dir)
+        if moved is None:
+            print('Another compaction is running; nothing done')
+            return 0
+        info = describe(args.archive_dir)
+        print(f"Archived {moved} rows in {time.perf_counter() - t:.2f}s; "
+              f"archive holds {info['rows']} rows in {info['files']} files under {args.archive_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
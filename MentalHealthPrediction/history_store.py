@@ -0,0 +1,207 @@
+import csv
+import io
+import itertools
+import json
+import os
+import time
+
+import dashboard_stats
+import history_archive
+from models import db, Prediction, UserStats
+
+# Summary fields logged with each prediction
+SUMMARY_FIELDS = ['Academic Pressure', 'Work Pressure', 'Study Satisfaction', 'Financial Stress']
+
+
+def format_timestamp(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(ts)))
+
+
+def build_summary(orig_row):
+    return ','.join([f"{k}={v}" for k, v in orig_row.items() if k in SUMMARY_FIELDS])
+
+
+def append_prediction(user_id, probability, risk_label, summary, timestamp=None):
+    """Append one prediction for a user.
+
+    Each append is its own short transaction, so concurrent gunicorn workers are
+    serialized by the database instead of interleaving writes to a shared file.
+    The user's dashboard aggregates are updated in the same transaction.
+    """
+    entry = Prediction(
+        user_id=user_id,
+        timestamp=int(time.time()) if timestamp is None else int(timestamp),
+        probability=probability,
+        risk_label=risk_label,
+        summary=summary or '',
+    )
+    # before adding the row: a first-time rebuild of the aggregates must not count it twice
+    dashboard_stats.record(user_id, entry.timestamp, probability, risk_label, entry.summary)
+    db.session.add(entry)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return entry
+
+
+def recent_predictions(user_id, limit=50, offset=0):
+    """Newest-first page of a user's predictions, served from the (user_id, timestamp) index."""
+    return (Prediction.query
+            .filter(Prediction.user_id == user_id)
+            .order_by(Prediction.timestamp.desc(), Prediction.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all())
+
+
+def recent_history(user_id, limit=50, offset=0):
+    """Newest-first page of (timestamp, probability, risk_label, summary) over live and archived rows.
+
+    Live rows come from recent_predictions(); a page that reaches past them
+    continues into the user's archived rows (history_archive.py).
+    """
+    # as in iter_user_history(): no compaction may move rows between the manifest and the queries
+    with history_archive.read_lock():
+        rows = [(e.timestamp, e.probability, e.risk_label, e.summary) for e in recent_predictions(user_id, limit, offset)]
+        if len(rows) >= limit:
+            return rows
+        skip = 0 if rows else max(offset - count_predictions(user_id), 0)
+        manifest = history_archive.read_manifest()
+    rows.extend(itertools.islice(history_archive.iter_user_rows(user_id, reverse=True, manifest=manifest), skip,
+                                 skip + limit - len(rows)))
+    return rows
+
+
+def iter_user_history(user_id, since=None, until=None, chunk_size=1000):
+    """Yield (timestamp, probability, risk_label, summary) for all of a user's predictions, oldest first.
+
+    Archived rows come first (see history_archive.py), then the live rows, fetched
+    chunk_size at a time, so memory use does not grow with the length of the history.
+    """
+    query = (db.select(Prediction.timestamp, Prediction.probability, Prediction.risk_label, Prediction.summary)
+             .where(Prediction.user_id == user_id))
+    if since is not None:
+        query = query.where(Prediction.timestamp >= since)
+    if until is not None:
+        query = query.where(Prediction.timestamp < until)
+    query = query.order_by(Prediction.timestamp, Prediction.id).execution_options(yield_per=chunk_size)
+    # the manifest and the query's snapshot are taken together, so a compaction cannot move rows between them
+    with history_archive.read_lock():
+        manifest = history_archive.read_manifest()
+        live = db.session.execute(query)
+    yield from history_archive.iter_user_rows(user_id, since=since, until=until, manifest=manifest)
+    for row in live:
+        yield tuple(row)
+
+
+EXPORT_FIELDS = ['timestamp', 'time', 'probability', 'risk_label', 'summary']
+
+
+def _export_record(row):
+    ts, prob, risk, summary = row
+    return {'timestamp': ts, 'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts)), 'probability': prob,
+            'risk_label': risk, 'summary': summary}
+
+
+def iter_export_csv(rows):
+    """CSV text for history rows, one line at a time."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_export_record(row))
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+
+def iter_export_json(rows):
+    """A JSON array of history records, one element at a time."""
+    yield '['
+    first = True
+    for row in rows:
+        yield ('' if first else ',') + '\n' + json.dumps(_export_record(row))
+        first = False
+    yield '\n]\n'
+
+
+def count_predictions(user_id):
+    return Prediction.query.filter(Prediction.user_id == user_id).count()
+
+
+def _parse_probability(value):
+    return float(value) if value != '' else None
+
+
+def parse_csv_line(line):
+    """Parse one data/history.csv line into (user_id, timestamp, probability, risk, summary).
+
+    The file mixes two layouts under a single 4-column header
+    (timestamp,probability,risk_label,summary): early rows follow the header,
+    later rows have user_id written first. The summary itself contains commas,
+    so both are split positionally. Legacy rows come back with user_id None.
+    Returns None for the header and for blank or malformed lines.
+    """
+    line = line.rstrip('\r\n')
+    parts = line.split(',', 4)
+    try:
+        if len(parts) >= 4 and parts[0].isdigit() and parts[1].isdigit():
+            summary = parts[4] if len(parts) > 4 else ''
+            return int(parts[0]), int(parts[1]), _parse_probability(parts[2]), parts[3], summary
+        parts = line.split(',', 3)
+        if len(parts) >= 3 and parts[0].isdigit():
+            summary = parts[3] if len(parts) > 3 else ''
+            return None, int(parts[0]), _parse_probability(parts[1]), parts[2], summary
+    except ValueError:
+        pass
+    return None
+
+
+def migrate_csv(path, legacy_user_id=None, batch_size=1000):
+    """One-shot import of a legacy history CSV. Safe to re-run: rows already present are skipped.
+
+    Rows written before user ids were logged are skipped unless `legacy_user_id`
+    is given, in which case they are attributed to that user.
+    """
+    if not os.path.exists(path):
+        return 0, 0
+    existing = {tuple(r) for r in db.session.query(Prediction.user_id, Prediction.timestamp, Prediction.risk_label, Prediction.summary)}
+    imported = skipped = 0
+    pending = []
+    users = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parsed = parse_csv_line(line)
+            if parsed is None:
+                skipped += 1
+                continue
+            user_id, ts, prob, risk, summary = parsed
+            if user_id is None:
+                user_id = legacy_user_id
+            if user_id is None:
+                skipped += 1
+                continue
+            key = (user_id, ts, risk, summary)
+            if key in existing:
+                skipped += 1
+                continue
+            existing.add(key)
+            users.add(user_id)
+            pending.append(Prediction(user_id=user_id, timestamp=ts, probability=prob, risk_label=risk, summary=summary))
+            if len(pending) >= batch_size:
+                db.session.add_all(pending)
+                db.session.commit()
+                imported += len(pending)
+                pending = []
+    if pending:
+        db.session.add_all(pending)
+        db.session.commit()
+        imported += len(pending)
+    if users:
+        # bulk inserts skip the per-row aggregate updates; rebuilt lazily on the next dashboard view
+        UserStats.query.filter(UserStats.user_id.in_(users)).delete(synchronize_session=False)
+        db.session.commit()
+    return imported, skipped
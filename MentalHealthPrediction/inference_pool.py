@@ -0,0 +1,180 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the pool already holds max_queue waiting jobs."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'inference pool is saturated; retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+# Per-process bundle used by kind='process' workers, reloaded when the version on disk changes
+_worker_bundle = None
+
+
+def _explain(bundle, X, explain, top_k):
+    if not explain:
+        return None
+    try:
+        return bundle.explainer.contributions(X, bundle.scorer.pos_index, top_k)
+    except Exception:
+        # a failed explanation must not fail the prediction; the caller retries and logs it
+        return None
+
+
+def _disk_version(bundle_dir):
+    import artifact_bundle
+    return artifact_bundle.read_manifest(bundle_dir)['checksum'][:12]
+
+
+def _worker_bundle_for(bundle_dir, version):
+    """The mapped bundle on disk; its version may differ from `version` if the parent is behind or ahead of it."""
+    global _worker_bundle
+    if _worker_bundle is None or (_worker_bundle.version != version
+                                  and _disk_version(bundle_dir) != _worker_bundle.version):
+        from model_registry import load_mapped_bundle
+        _worker_bundle = load_mapped_bundle(bundle_dir)
+    return _worker_bundle
+
+
+def _score_in_process(bundle_dir, version, X, explain, top_k):
+    """Runs in a pool process: score (and explain) X with the mapped bundle; returns the version it used."""
+    b = _worker_bundle_for(bundle_dir, version)
+    score = b.scorer.score(X)
+    return b.version, score, _explain(b, X, explain, top_k)
+
+
+def score_and_explain(bundle, X, explain, top_k):
+    """The CPU-bound part of /predict: one forest pass plus, optionally, SHAP contributions."""
+    score = bundle.scorer.score(X)
+    return bundle.version, score, _explain(bundle, X, explain, top_k)
+
+
+def score_batch(bundle, X, explain_rows, top_k):
+    """Score every row of X in one forest pass and explain the rows in explain_rows with one SHAP call.
+
+    Returns (version, [Score per row], [contributions or None per row]).
+    """
+    scores = bundle.scorer.score_rows(X)
+    contributions = [None] * len(scores)
+    if explain_rows:
+        try:
+            explained = bundle.explainer.contributions_many(X[explain_rows], bundle.scorer.pos_index, top_k)
+        except Exception:
+            explained = [None] * len(explain_rows)
+        for i, c in zip(explain_rows, explained):
+            contributions[i] = c
+    return bundle.version, scores, contributions
+
+
+def _score_batch_in_process(bundle_dir, version, X, explain_rows, top_k):
+    return score_batch(_worker_bundle_for(bundle_dir, version), X, explain_rows, top_k)
+
+
+class InferencePool:
+    """Bounded pool for CPU-bound scoring and explanation.
+
+    At most `workers` jobs run and `max_queue` wait; beyond that submit() raises
+    PoolSaturated straight away so the caller can answer 503 + Retry-After
+    instead of letting requests pile up behind a busy model.
+
+    kind='thread' runs jobs on threads of this process (the forest releases the
+    GIL while walking trees). kind='process' runs them in separate processes
+    that map the same model bundle, so SHAP, which holds the GIL, also runs in
+    parallel; it needs a bundle directory and falls back to threads without one.
+    """
+
+    def __init__(self, workers=2, max_queue=8, kind='thread', retry_after=1, bundle_dir=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.kind = kind if kind == 'thread' or bundle_dir else 'thread'
+        self.bundle_dir = bundle_dir
+        if self.kind == 'process':
+            # spawn: the server process has threads (reload watcher, explain pool) that fork would not carry over safely
+            self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix='inference')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def saturated(self):
+        return self.in_flight >= self.workers + self.max_queue
+
+    def reject(self):
+        """Count a request turned away because the pool is full; returns the exception to raise."""
+        with self._lock:
+            self.rejected += 1
+        return PoolSaturated(self.retry_after)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise self.reject()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _in_process(self, bundle):
+        # process workers can only load the bundle directory they were pointed at
+        return self.kind == 'process' and bundle.paths and bundle.paths[0].startswith(self.bundle_dir or '\0')
+
+    def score(self, bundle, X, explain=False, top_k=6, timeout=None):
+        """(version, Score, contributions or None) for X, computed on the pool with bundle's version."""
+        if self._in_process(bundle):
+            result = self.submit(_score_in_process, self.bundle_dir, bundle.version, X, explain, top_k).result(timeout)
+            if result[0] == bundle.version:
+                return result
+            # the pool process has a different version on disk than this bundle: score here instead
+            return score_and_explain(bundle, X, explain, top_k)
+        return self.submit(score_and_explain, bundle, X, explain, top_k).result(timeout=timeout)
+
+    def submit_batch(self, bundle, X, explain_rows, top_k=6):
+        """Future of score_batch(bundle, X, explain_rows, top_k) run on the pool; one slot for the whole batch."""
+        if not self._in_process(bundle):
+            return self.submit(score_batch, bundle, X, explain_rows, top_k)
+        inner = self.submit(_score_batch_in_process, self.bundle_dir, bundle.version, X, explain_rows, top_k)
+        outer = Future()
+
+        def settle(f):
+            try:
+                result = f.result()
+                if result[0] != bundle.version:
+                    # as in score(): never return another version's scores for this bundle's rows
+                    result = score_batch(bundle, X, explain_rows, top_k)
+                outer.set_result(result)
+            except Exception as e:
+                outer.set_exception(e)
+        inner.add_done_callback(settle)
+        return outer
+
+    def stats(self):
+        with self._lock:
+            return {
+                'kind': self.kind,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
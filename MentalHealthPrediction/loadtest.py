@@ -0,0 +1,162 @@
+import argparse
+import http.cookiejar
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+import numpy as np
+
+# Closed-loop load test of POST /predict: --concurrency clients each sign up/log in
+# once up front, then send randomized form submissions back to back for --duration seconds.
+# Reports requests/sec, latency percentiles and ok / 503 (backpressure) / error counts.
+#
+# Usage:
+#   python loadtest.py --url http://127.0.0.1:8000 [--concurrency 16] [--duration 20]
+#   python loadtest.py --compare      # starts `gunicorn app:app` and `uvicorn asgi:application` in turn
+
+SERVERS = {
+    'sync (gunicorn app:app)': [sys.executable, '-m', 'gunicorn', '-w', '{workers}', '-b', '127.0.0.1:{port}', 'app:app'],
+    'asgi (uvicorn asgi:application)': [sys.executable, '-m', 'uvicorn', '--workers', '{workers}', '--port', '{port}',
+                                        '--log-level', 'warning', 'asgi:application'],
+}
+
+
+def random_form(rng):
+    return {
+        'Gender': rng.choice(['Male', 'Female']),
+        'Age': str(rng.randint(18, 34)),
+        'Academic Pressure': str(rng.randint(0, 5)),
+        'Work Pressure': str(rng.randint(0, 5)),
+        'CGPA': f'{rng.uniform(5, 10):.2f}',
+        'Study Satisfaction': str(rng.randint(0, 5)),
+        'Sleep Duration': rng.choice(['Less than 5 hours', '5-6 hours', '7-8 hours', 'More than 8 hours']),
+        'Degree': rng.choice(['B.Tech', 'BSc', 'B.Com', 'MSc', 'Class 12']),
+        'Work/Study Hours': str(rng.randint(0, 12)),
+        'Financial Stress': str(rng.randint(1, 5)),
+    }
+
+
+def logged_in_opener(url):
+    """An opener holding the session cookie of a freshly created user."""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    name = 'load' + uuid.uuid4().hex[:10]
+    opener.open(url + '/signup', urllib.parse.urlencode({'username': name, 'email': name + '@example.com', 'password': name}).encode())
+    opener.open(url + '/login', urllib.parse.urlencode({'username': name, 'password': name}).encode())
+    return opener
+
+
+def client(url, opener, deadline, seed, results):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        body = urllib.parse.urlencode(random_form(rng)).encode()
+        t0 = time.perf_counter()
+        try:
+            with opener.open(url + '/predict', body, timeout=60) as resp:
+                resp.read()
+                outcome = 'ok' if resp.status == 200 else 'error'
+        except urllib.error.HTTPError as e:
+            e.read()
+            outcome = 'busy' if e.code == 503 else 'error'
+            if outcome == 'busy':
+                # honour Retry-After like a well-behaved client, but never past the end of the run
+                time.sleep(min(float(e.headers.get('Retry-After', '1')), max(0.0, deadline - time.perf_counter())))
+        except Exception as e:
+            results.append(('error', time.perf_counter() - t0, str(e)))
+            continue
+        results.append((outcome, time.perf_counter() - t0, None))
+
+
+def run(url, concurrency, duration, warmup=2.0):
+    # sign-ups hash passwords; keep them out of the measured window
+    openers = [logged_in_opener(url) for _ in range(concurrency)]
+    # warm-up: first requests pay for imports, explainer builds and DB connections
+    client(url, openers[0], time.perf_counter() + warmup, -1, [])
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, opener, deadline, i, results)) for i, opener in enumerate(openers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ok = np.array([lat for outcome, lat, _ in results if outcome == 'ok'])
+    errors = [msg for outcome, _, msg in results if outcome == 'error' and msg]
+    summary = {
+        'requests': len(results),
+        'ok': len(ok),
+        'busy_503': sum(1 for outcome, _, _ in results if outcome == 'busy'),
+        'errors': sum(1 for outcome, _, _ in results if outcome == 'error'),
+        'req_per_s': len(ok) / elapsed if elapsed else 0.0,
+    }
+    for p in (50, 95, 99):
+        summary[f'p{p}_ms'] = float(np.percentile(ok, p) * 1000) if len(ok) else float('nan')
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
+
+
+def print_summary(name, s):
+    print(f"{name}: {s['req_per_s']:.1f} req/s, p50 {s['p50_ms']:.0f} ms, p95 {s['p95_ms']:.0f} ms, p99 {s['p99_ms']:.0f} ms "
+          f"({s['ok']} ok, {s['busy_503']} busy 503, {s['errors']} errors)")
+    if 'first_error' in s:
+        print('  first error:', s['first_error'])
+
+
+def wait_ready(url, proc, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'server exited with code {proc.returncode}')
+        try:
+            urllib.request.urlopen(url + '/status', timeout=2).read()
+            return
+        except Exception:
+            time.sleep(0.3)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+
+def compare(args):
+    results = {}
+    for i, (name, cmd) in enumerate(SERVERS.items()):
+        port = args.port + i
+        cmd = [part.format(port=port, workers=args.workers) for part in cmd]
+        url = f'http://127.0.0.1:{port}'
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            wait_ready(url, proc)
+            results[name] = run(url, args.concurrency, args.duration)
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=30)
+        print_summary(name, results[name])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test POST /predict and compare the sync and ASGI deployments.')
+    parser.add_argument('--url', default=None, help='server to test (default: --compare)')
+    parser.add_argument('--compare', action='store_true', help='start the sync and ASGI servers locally and test both')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per run')
+    parser.add_argument('--workers', type=int, default=1, help='server processes for --compare')
+    parser.add_argument('--port', type=int, default=8750, help='first port used by --compare')
+    args = parser.parse_args(argv)
+
+    if args.url and not args.compare:
+        print_summary(args.url, run(args.url.rstrip('/'), args.concurrency, args.duration))
+    else:
+        compare(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
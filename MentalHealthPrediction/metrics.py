@@ -0,0 +1,109 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process latency histograms rendered in the Prometheus text exposition format.
+#
+# Each gunicorn worker keeps its own counts, so a scrape of /metrics reports the
+# worker that happened to answer; scrape every worker (or run one) for totals.
+
+# Seconds; covers a cached hit (~0.1 ms) up to a cold SHAP explanation
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket (non-cumulative) counts + overflow, sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: (list(counts), total) for k, (counts, total) in self._series.items()}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, (counts, total) in sorted(self.snapshot().items()):
+            labels = list(zip(self.labelnames, key))
+            running = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                running += c
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {running}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {total!r}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {running}')
+        return lines
+
+
+def render_samples(name, documentation, kind, samples):
+    """Lines for a counter/gauge given [(labels_dict, value), ...]."""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+    return lines
+
+
+# Whole request, by Flask endpoint and status code
+REQUEST_SECONDS = Histogram('mhp_request_seconds', 'Request latency by endpoint.', ('endpoint', 'status'))
+# Stages inside a request: parse, encode, inference, explain, history_write, history_read, render
+STAGE_SECONDS = Histogram('mhp_stage_seconds', 'Latency of each stage of a request.', ('endpoint', 'stage'))
+# Artifact loads, including the smoke test; outcome is ok, unchanged or error
+MODEL_RELOAD_SECONDS = Histogram('mhp_model_reload_seconds', 'Model artifact reload latency.', ('outcome',),
+                                 buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+# Micro-batched /predict (micro_batch.py): rows per model call and how long the first row waited for the batch
+BATCH_ROWS = Histogram('mhp_predict_batch_rows', 'Rows scored per coalesced model call.', (),
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BATCH_WAIT_SECONDS = Histogram('mhp_predict_batch_wait_seconds', 'Time a batch stayed open collecting rows.', (),
+                               buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1))
+
+HISTOGRAMS = [REQUEST_SECONDS, STAGE_SECONDS, MODEL_RELOAD_SECONDS, BATCH_ROWS, BATCH_WAIT_SECONDS]
+
+
+def render(extra_lines=()):
+    """Prometheus text format for every registered histogram plus any extra sample lines."""
+    lines = []
+    for h in HISTOGRAMS:
+        lines.extend(h.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
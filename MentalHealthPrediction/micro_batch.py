@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+
+import metrics
+from explain import TOP_K
+from inference_pool import PoolSaturated, score_batch
+
+# Request coalescing for /predict.
+#
+# Each request hands its encoded single-row X to the batcher and waits. A dispatcher
+# thread keeps a batch open for up to max_wait_ms after its first row (or until
+# max_batch rows have arrived), then scores all of them in one predict_proba call
+# and explains the rows that asked for it with one SHAP call. Each waiting request
+# then gets its own (Score, contributions) back.
+#
+# With an InferencePool the batch runs there, taking one pool slot. A full pool
+# fails every request in the batch with PoolSaturated. Without a pool the
+# dispatcher thread scores the batch itself.
+
+_Pending = namedtuple('_Pending', ['bundle', 'X', 'explain', 'future', 'enqueued'])
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into batched model calls."""
+
+    def __init__(self, max_wait_ms=5.0, max_batch=32, pool=None, top_k=TOP_K):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.pool = pool
+        self.top_k = top_k
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+
+    def _ensure_thread(self):
+        # started on first use so it lives in the (forked) worker that serves requests
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='predict-batcher', daemon=True)
+                    self._thread.start()
+
+    def submit(self, bundle, X, explain=False):
+        """Future of (Score, contributions or None) for the single-row X."""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put(_Pending(bundle, X, explain, future, time.perf_counter()))
+        return future
+
+    def score(self, bundle, X, explain=False, timeout=None):
+        return self.submit(bundle, X, explain).result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # drain whatever is already waiting, up to max_batch, without waiting any longer
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        metrics.BATCH_WAIT_SECONDS.observe(time.perf_counter() - first.enqueued)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # a reload can land mid-batch; rows are only ever scored by the bundle they were encoded for
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item.bundle), []).append(item)
+            for items in groups.values():
+                try:
+                    self._dispatch(items)
+                except Exception as e:
+                    for item in items:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+
+    def _dispatch(self, items):
+        bundle = items[0].bundle
+        X = np.vstack([item.X for item in items])
+        explain_rows = [i for i, item in enumerate(items) if item.explain]
+        metrics.BATCH_ROWS.observe(len(items))
+        with self._lock:
+            self.batches += 1
+            self.rows += len(items)
+        if self.pool is None:
+            self._deliver(items, score_batch(bundle, X, explain_rows, self.top_k))
+            return
+        try:
+            future = self.pool.submit_batch(bundle, X, explain_rows, self.top_k)
+        except PoolSaturated as e:
+            for item in items:
+                item.future.set_exception(e)
+            return
+        future.add_done_callback(lambda f: self._deliver_future(items, f))
+
+    def _deliver_future(self, items, future):
+        error = future.exception()
+        if error is not None:
+            for item in items:
+                item.future.set_exception(error)
+            return
+        self._deliver(items, future.result())
+
+    @staticmethod
+    def _deliver(items, result):
+        _, scores, contributions = result
+        for item, score, contribs in zip(items, scores, contributions):
+            item.future.set_result((score, contribs))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_wait_ms': self.max_wait * 1000.0,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'rows': self.rows,
+                'pending': self._queue.qsize(),
+            }
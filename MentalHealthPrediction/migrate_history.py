@@ -0,0 +1,21 @@
+import os
+import sys
+
+from app import app, BASE_DIR
+from models import db
+from history_store import migrate_csv
+
+# One-shot import of data/history.csv into the prediction table.
+# Usage: python migrate_history.py [path/to/history.csv] [--legacy-user-id N]
+args = sys.argv[1:]
+legacy_user_id = None
+if '--legacy-user-id' in args:
+    i = args.index('--legacy-user-id')
+    legacy_user_id = int(args[i + 1])
+    del args[i:i + 2]
+csv_path = args[0] if args else os.path.join(BASE_DIR, 'data', 'history.csv')
+
+with app.app_context():
+    db.create_all()
+    imported, skipped = migrate_csv(csv_path, legacy_user_id=legacy_user_id)
+    print(f"Imported {imported} rows from {csv_path} ({skipped} skipped: header, duplicates or rows without a user id)")
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+import artifact_bundle
+from app_logging import log_event
+from explain import ModelExplainer
+from feature_encoder import FeatureEncoder
+from forest_engine import CompiledForest
+from metrics import MODEL_RELOAD_SECONDS
+from scoring import Scorer
+
+
+class ModelBundle:
+    """One consistent set of serving artifacts.
+
+    A bundle is never mutated after it is built; the registry swaps whole
+    bundles, so a request that grabbed one sees a matching model, encoder,
+    feature columns and explainer even while a reload is in progress.
+    """
+
+    def __init__(self, model, encoder, feature_cols, original_features, version, paths, engine='sklearn'):
+        self.model = model
+        self.encoder = encoder
+        self.feature_cols = feature_cols
+        self.original_features = original_features
+        self.version = version
+        self.paths = paths
+        self.loaded_at = time.time()
+        # Precompile the form -> feature vector mapping for the loaded columns
+        self.feature_encoder = FeatureEncoder(original_features, feature_cols)
+        # The explainer is tied to this model; a reload always drops the old one
+        self.explainer = ModelExplainer(model, feature_cols)
+        # What serving calls predict_proba on: the sklearn model or its compiled copy
+        self.predictor = model
+        if engine == 'compiled' and model is not None and hasattr(model, 'estimators_'):
+            self.predictor = CompiledForest.from_sklearn(model)
+        # Single-pass scoring; class-index mapping resolved here, once per model
+        self.scorer = Scorer(self.predictor, encoder) if self.complete else None
+
+    @property
+    def complete(self):
+        return bool(self.model is not None and self.encoder is not None and self.feature_cols and self.original_features)
+
+
+def artifact_version(paths):
+    """Content hash of the artifact files, so identical files always give the same version."""
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(os.path.basename(p).encode('utf-8'))
+        if os.path.exists(p):
+            with open(p, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+    return h.hexdigest()[:12]
+
+
+def load_bundle(model_path, encoder_path, features_path, orig_path, engine='sklearn'):
+    paths = [model_path, encoder_path, features_path, orig_path]
+    version = artifact_version(paths)
+
+    model = encoder = None
+    feature_cols = original_features = []
+    if os.path.exists(model_path):
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        log_event(logging.INFO, 'artifact_loaded', artifact='model', path=model_path)
+    else:
+        log_event(logging.WARNING, 'artifact_missing', artifact='model', path=model_path)
+
+    if os.path.exists(encoder_path):
+        with open(encoder_path, 'rb') as f:
+            encoder = pickle.load(f)
+        log_event(logging.INFO, 'artifact_loaded', artifact='encoder', path=encoder_path)
+    else:
+        log_event(logging.WARNING, 'artifact_missing', artifact='encoder', path=encoder_path)
+
+    if os.path.exists(features_path):
+        with open(features_path, 'r', encoding='utf-8') as f:
+            feature_cols = json.load(f)
+        log_event(logging.INFO, 'artifact_loaded', artifact='feature_columns', path=features_path)
+    else:
+        log_event(logging.WARNING, 'artifact_missing', artifact='feature_columns', path=features_path)
+
+    if os.path.exists(orig_path):
+        with open(orig_path, 'r', encoding='utf-8') as f:
+            original_features = json.load(f)
+        log_event(logging.INFO, 'artifact_loaded', artifact='original_features', path=orig_path)
+    else:
+        log_event(logging.WARNING, 'artifact_missing', artifact='original_features', path=orig_path)
+
+    return ModelBundle(model, encoder, feature_cols, original_features, version, paths, engine=engine)
+
+
+def load_mapped_bundle(bundle_dir, engine='sklearn', verify=False):
+    """ModelBundle backed by a memory-mapped artifact bundle (artifact_bundle.py)."""
+    model, encoder, feature_cols, original_features, checksum = artifact_bundle.load_bundle(bundle_dir, verify=verify)
+    log_event(logging.INFO, 'bundle_mapped', path=bundle_dir, version=checksum[:12])
+    paths = [os.path.join(bundle_dir, artifact_bundle.MANIFEST)]
+    return ModelBundle(model, encoder, feature_cols, original_features, checksum[:12], paths, engine=engine)
+
+
+def smoke_test(bundle):
+    """Score one blank form row; raises if the bundle cannot serve predictions."""
+    if not bundle.complete:
+        raise ValueError('bundle is missing artifacts')
+    n_model_features = getattr(bundle.model, 'n_features_in_', len(bundle.feature_cols))
+    if n_model_features != len(bundle.feature_cols):
+        raise ValueError(f'model expects {n_model_features} features, feature_columns.json has {len(bundle.feature_cols)}')
+    X = bundle.feature_encoder.encode(bundle.feature_encoder.blank_row())
+    probs = bundle.model.predict_proba(X)
+    if probs.shape != (1, len(bundle.encoder.classes_)) or not np.all(np.isfinite(probs)):
+        raise ValueError(f'unexpected smoke prediction {probs!r}')
+    if bundle.predictor is not bundle.model:
+        fast = bundle.predictor.predict_proba(X)
+        if not np.allclose(fast, probs):
+            raise ValueError(f'compiled forest disagrees with the model: {fast!r} != {probs!r}')
+
+
+class ModelRegistry:
+    """Holds the active ModelBundle and swaps in new versions.
+
+    Reloads build and smoke-test the new bundle off to the side (optionally in a
+    background thread) and then publish it with a single reference assignment.
+    A bundle that fails to load or to score keeps the current one in service.
+    """
+
+    def __init__(self, model_path, encoder_path, features_path, orig_path, engine='sklearn', bundle_dir=None, verify=False):
+        self.paths = (model_path, encoder_path, features_path, orig_path)
+        self.engine = engine
+        # a memory-mapped bundle in bundle_dir takes precedence over the pickle/JSON files
+        self.bundle_dir = bundle_dir
+        self.manifest_path = os.path.join(bundle_dir, artifact_bundle.MANIFEST) if bundle_dir else None
+        self.verify = verify
+        self.active = None
+        self.last_error = None
+        self.last_attempt = None
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._watch_interval = 0
+
+    def reload(self, force=False, wait=True):
+        """Load the artifacts on disk and activate them if they changed (or force).
+
+        With wait=False the work happens in a background thread and this returns
+        immediately; returns False if another reload is already running.
+        """
+        if not wait:
+            if self._reload_lock.locked():
+                return False
+            threading.Thread(target=self.reload, kwargs={'force': force}, name='model-reload', daemon=True).start()
+            return True
+        with self._reload_lock:
+            self.last_attempt = time.time()
+            t0 = time.perf_counter()
+            outcome = 'error'
+            try:
+                current = self.active
+                if not force and current is not None and current.version == self.disk_version():
+                    outcome = 'unchanged'
+                    return True
+                if self.manifest_path and os.path.exists(self.manifest_path):
+                    bundle = load_mapped_bundle(self.bundle_dir, engine=self.engine, verify=self.verify)
+                else:
+                    bundle = load_bundle(*self.paths, engine=self.engine)
+                if bundle.complete:
+                    smoke_test(bundle)
+                    log_event(logging.INFO, 'model_artifacts_loaded', version=bundle.version)
+                elif current is not None:
+                    raise ValueError('Some model artifacts are missing; keeping the active model')
+                else:
+                    log_event(logging.WARNING, 'model_artifacts_missing', version=bundle.version)
+                self.active = bundle
+                self.reloads += 1
+                self.last_error = None
+                outcome = 'ok'
+                log_event(logging.INFO, 'model_active', version=bundle.version, reloads=self.reloads)
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                log_event(logging.ERROR, 'model_load_failed', exc_info=True, error=str(e))
+                if self.active is None:
+                    # keep serving pages (with a "model not loaded" message) rather than crash at import
+                    self.active = ModelBundle(None, None, [], [], None, list(self.paths))
+                return False
+            finally:
+                MODEL_RELOAD_SECONDS.observe(time.perf_counter() - t0, outcome=outcome)
+
+    def disk_version(self):
+        """Version of the artifacts currently on disk (manifest checksum, or a hash of the legacy files)."""
+        if self.manifest_path and os.path.exists(self.manifest_path):
+            return artifact_bundle.read_manifest(self.bundle_dir)['checksum'][:12]
+        return artifact_version(self.paths)
+
+    def watch(self, interval):
+        """Poll artifact mtimes every `interval` seconds in a background thread and reload on change."""
+        if self._watcher is not None or interval <= 0:
+            return
+        self._watch_interval = interval
+
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except FileNotFoundError:
+                return None
+
+        def run():
+            last = None
+            while True:
+                try:
+                    watched = self.paths + ((self.manifest_path,) if self.manifest_path else ())
+                    mtimes = tuple(mtime(p) for p in watched)
+                    if last is not None and mtimes != last:
+                        self.reload()
+                    last = mtimes
+                except Exception as e:
+                    # e.g. a publish swapping files mid-poll; the next poll looks again
+                    log_event(logging.WARNING, 'model_watch_failed', error=str(e))
+                time.sleep(interval)
+        self._watcher = threading.Thread(target=run, name='model-watch', daemon=True)
+        self._watcher.start()
+
+    def after_fork(self):
+        """In a freshly forked worker: the parent's threads are gone, so restart the watcher and reset the lock."""
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self.watch(self._watch_interval)
+
+    def status(self):
+        bundle = self.active
+        return {
+            'version': bundle.version if bundle else None,
+            'complete': bundle.complete if bundle else False,
+            'engine': type(bundle.predictor).__name__ if bundle and bundle.predictor is not None else None,
+            'loaded_at': bundle.loaded_at if bundle else None,
+            'reloads': self.reloads,
+            'reloading': self._reload_lock.locked(),
+            'last_attempt': self.last_attempt,
+            'last_error': self.last_error,
+            'pid': os.getpid(),
+        }
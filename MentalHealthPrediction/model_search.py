@@ -0,0 +1,267 @@
+import itertools
+import json
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold
+
+# Hyperparameter search for the random forest, shared by the training scripts.
+#
+#   grid     every combination (what GridSearchCV did; the default)
+#   random   sampled combinations, stopping after `patience` candidates without
+#            a better score
+#   halving  successive halving with the number of trees as the resource: every
+#            candidate starts on a small forest and only the best 1/factor move
+#            on to a forest `factor` times larger (opt-in: much cheaper, but it
+#            picks from scores on small forests, so it can choose differently)
+#
+# All strategies encode the CV folds once (FoldCache) and reuse them for every
+# candidate, can warm-start forests (growing n_estimators adds trees to the forest
+# already fitted on that fold instead of refitting it), record fit/score time
+# per candidate and stop at a wall-clock time budget.
+
+STRATEGIES = ['grid', 'halving', 'random', 'none']
+
+SearchResult = namedtuple('SearchResult', ['best_estimator', 'best_params', 'best_score', 'records', 'elapsed', 'stopped'])
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class FoldCache:
+    """Stratified CV folds sliced out of X once, as float32, and reused by every candidate."""
+
+    def __init__(self, X, y, cv=5, random_state=42):
+        if hasattr(X, 'to_numpy'):
+            X = X.to_numpy(dtype=np.float32)
+        elif not hasattr(X, 'tocsr'):
+            X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y)
+        self.X, self.y = X, y
+        self.folds = []
+        for train_idx, test_idx in StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state).split(np.zeros(len(y)), y):
+            self.folds.append((X[train_idx], y[train_idx], X[test_idx], y[test_idx]))
+
+
+def _key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class _Evaluator:
+    def __init__(self, folds, base_estimator, scoring, warm_start, deadline, verbose):
+        self.folds = folds
+        self.base_estimator = base_estimator
+        self.scorer = get_scorer(scoring)
+        self.warm_start = warm_start
+        self.deadline = deadline
+        self.verbose = verbose
+        self.records = []
+        # per-candidate fold forests kept for warm starts (params without n_estimators -> [estimator per fold])
+        self._forests = {}
+
+    def evaluate(self, params, n_estimators, rung=0):
+        fit_s = score_s = 0.0
+        scores = []
+        key = _key(params)
+        forests = self._forests.get(key) if self.warm_start else None
+        if forests is None:
+            forests = [None] * len(self.folds.folds)
+        for i, (X_tr, y_tr, X_va, y_va) in enumerate(self.folds.folds):
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise _BudgetExceeded()
+            est = forests[i]
+            if est is None or est.n_estimators > n_estimators:
+                est = clone(self.base_estimator).set_params(warm_start=self.warm_start, **params)
+            est.set_params(n_estimators=n_estimators)
+            t0 = time.perf_counter()
+            est.fit(X_tr, y_tr)
+            t1 = time.perf_counter()
+            scores.append(self.scorer(est, X_va, y_va))
+            score_s += time.perf_counter() - t1
+            fit_s += t1 - t0
+            forests[i] = est
+        if self.warm_start:
+            self._forests[key] = forests
+        record = {
+            'params': dict(params, n_estimators=n_estimators),
+            'rung': rung,
+            'mean_score': float(np.mean(scores)),
+            'std_score': float(np.std(scores)),
+            'fit_s': round(fit_s, 3),
+            'score_s': round(score_s, 3),
+        }
+        self.records.append(record)
+        if self.verbose:
+            print(f"  rung {rung} trees {n_estimators:>4} score {record['mean_score']:.4f} +/- {record['std_score']:.4f} "
+                  f"fit {fit_s:6.2f}s  {params}")
+        return record
+
+    def drop(self, params):
+        self._forests.pop(_key(params), None)
+
+
+def _split_trees(param_grid, default_trees):
+    """(grid without n_estimators, sorted n_estimators values)."""
+    grid = dict(param_grid)
+    trees = sorted(grid.pop('n_estimators', [default_trees]))
+    return grid, trees
+
+
+def _ordered_candidates(candidates):
+    """Same params apart from n_estimators next to each other, fewest trees first (so warm starts can grow them)."""
+    return sorted(candidates, key=lambda p: (_key({k: v for k, v in p.items() if k != 'n_estimators'}), p.get('n_estimators', 0)))
+
+
+def _search_list(evaluator, candidates, default_trees, patience=None, ordered=True):
+    """Evaluate candidates in turn; ordered=False keeps their order (random sampling, so patience sees an unbiased prefix)."""
+    best = None
+    since_best = 0
+    for params in (_ordered_candidates(candidates) if ordered else candidates):
+        params = dict(params)
+        n_estimators = params.pop('n_estimators', default_trees)
+        record = evaluator.evaluate(params, n_estimators)
+        if best is None or record['mean_score'] > best['mean_score']:
+            best, since_best = record, 0
+        else:
+            since_best += 1
+            if patience and since_best >= patience:
+                return 'patience'
+    return 'done'
+
+
+def _search_halving(evaluator, param_grid, default_trees, factor=3, min_trees=None):
+    grid, trees = _split_trees(param_grid, default_trees)
+    candidates = [dict(p) for p in ParameterGrid(grid)] if grid else [{}]
+    max_trees = trees[-1]
+    n_rungs = 1 + int(math.floor(math.log(len(candidates), factor))) if len(candidates) > 1 else 1
+    min_trees = min_trees or max(10, max_trees // factor ** (n_rungs - 1))
+    for rung in range(n_rungs):
+        n_estimators = max_trees if rung == n_rungs - 1 else max(min_trees, max_trees // factor ** (n_rungs - 1 - rung))
+        scored = [(evaluator.evaluate(p, n_estimators, rung)['mean_score'], i) for i, p in enumerate(candidates)]
+        if rung == n_rungs - 1:
+            break
+        keep = max(1, int(math.ceil(len(candidates) / factor)))
+        survivors = sorted(scored, key=lambda s: -s[0])[:keep]
+        survivor_idx = {i for _, i in survivors}
+        for i, p in enumerate(candidates):
+            if i not in survivor_idx:
+                evaluator.drop(p)
+        candidates = [candidates[i] for _, i in sorted(survivors, key=lambda s: s[1])]
+    return 'done'
+
+
+def _best_record(records):
+    # prefer the furthest rung reached (halving scores on bigger forests are the ones to trust)
+    top_rung = max(r['rung'] for r in records)
+    return max((r for r in records if r['rung'] == top_rung), key=lambda r: r['mean_score'])
+
+
+def search_forest(X, y, param_grid, strategy='grid', base_params=None, cv=5, scoring='accuracy',
+                  n_iter=10, factor=3, min_trees=None, patience=None, warm_start=False, time_budget=None,
+                  random_state=42, refit=True, verbose=True):
+    """Tune a RandomForestClassifier on (X, y); returns a SearchResult.
+
+    time_budget (seconds) caps the search itself: no new fold fit starts after it
+    runs out, and the best candidate evaluated so far wins. The final refit on all
+    of X runs afterwards.
+    """
+    base_params = dict(base_params or {})
+    base_params.setdefault('random_state', random_state)
+    base_estimator = RandomForestClassifier(**base_params)
+    default_trees = base_params.get('n_estimators', 100)
+    started = time.perf_counter()
+    deadline = started + time_budget if time_budget else None
+
+    stopped = 'done'
+    if strategy == 'none':
+        best_params = {k: v[0] for k, v in param_grid.items()} if param_grid else {}
+        records = []
+    else:
+        folds = FoldCache(X, y, cv=cv, random_state=random_state)
+        if verbose:
+            print(f"Search '{strategy}': {cv} folds cached in {time.perf_counter() - started:.1f}s"
+                  + (f", budget {time_budget:.0f}s" if time_budget else '') + (', warm start' if warm_start else ''))
+        evaluator = _Evaluator(folds, base_estimator, scoring, warm_start, deadline, verbose)
+        try:
+            if strategy == 'grid':
+                stopped = _search_list(evaluator, list(ParameterGrid(param_grid)), default_trees)
+            elif strategy == 'random':
+                total = len(ParameterGrid(param_grid))
+                sampled = list(ParameterSampler(param_grid, n_iter=min(n_iter, total), random_state=random_state))
+                stopped = _search_list(evaluator, sampled, default_trees, patience=patience, ordered=False)
+            elif strategy == 'halving':
+                stopped = _search_halving(evaluator, param_grid, default_trees, factor=factor, min_trees=min_trees)
+            else:
+                raise ValueError(f'unknown search strategy {strategy!r}')
+        except _BudgetExceeded:
+            stopped = 'budget'
+        records = evaluator.records
+        evaluator._forests.clear()
+        if not records:
+            raise RuntimeError('time budget ran out before any candidate was evaluated')
+        best = _best_record(records)
+        best_params = best['params']
+
+    search_elapsed = time.perf_counter() - started
+    best_score = _best_record(records)['mean_score'] if records else None
+    best_estimator = None
+    if refit:
+        best_estimator = clone(base_estimator).set_params(**best_params)
+        t0 = time.perf_counter()
+        best_estimator.fit(X, y)
+        if verbose:
+            print(f"Refit best params {best_params} in {time.perf_counter() - t0:.1f}s")
+    if verbose:
+        print(f"Search finished ({stopped}) in {search_elapsed:.1f}s over {len(records)} evaluations")
+    return SearchResult(best_estimator, best_params, best_score, records, search_elapsed, stopped)
+
+
+def format_records(records, limit=None):
+    lines = [f"{'rung':>4} {'trees':>5} {'score':>7} {'std':>7} {'fit s':>7} {'score s':>8}  params"]
+    ranked = sorted(records, key=lambda r: (-r['rung'], -r['mean_score']))
+    for r in itertools.islice(ranked, limit):
+        params = {k: v for k, v in r['params'].items() if k != 'n_estimators'}
+        lines.append(f"{r['rung']:>4} {r['params']['n_estimators']:>5} {r['mean_score']:>7.4f} {r['std_score']:>7.4f} "
+                     f"{r['fit_s']:>7.2f} {r['score_s']:>8.2f}  {params}")
+    return '\n'.join(lines)
+
+
+def write_report(path, result, strategy):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'strategy': strategy,
+            'stopped': result.stopped,
+            'elapsed_s': round(result.elapsed, 3),
+            'best_params': result.best_params,
+            'best_score': result.best_score,
+            'candidates': result.records,
+        }, f, indent=2, default=str)
+
+
+def add_search_arguments(parser, default='grid'):
+    parser.add_argument('--search', choices=STRATEGIES, default=default,
+                        help="hyperparameter search: full grid (default), successive halving on tree count, random, or none")
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds the search may run before taking the best so far')
+    parser.add_argument('--warm-start', action='store_true', help='grow forests fold by fold instead of refitting larger ones')
+    parser.add_argument('--n-iter', type=int, default=10, help='candidates sampled by --search random')
+    parser.add_argument('--patience', type=int, default=None, help='--search random stops after this many candidates without improvement')
+    parser.add_argument('--halving-factor', type=int, default=3, help='--search halving keeps 1/factor of candidates per rung')
+    parser.add_argument('--search-report', default=None, help='write per-candidate scores and timings to this JSON file')
+
+
+def search_from_args(args, X, y, param_grid, base_params=None, cv=5):
+    result = search_forest(X, y, param_grid, strategy=args.search, base_params=base_params, cv=cv,
+                           n_iter=args.n_iter, factor=args.halving_factor, patience=args.patience,
+                           warm_start=args.warm_start, time_budget=args.time_budget)
+    if result.records:
+        print(format_records(result.records, limit=15))
+    if args.search_report:
+        write_report(args.search_report, result, args.search)
+    return result
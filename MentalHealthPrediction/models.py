@@ -1,17 +1,117 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+
+class PasswordPolicy:
+    """werkzeug hash method for new password hashes, e.g. 'scrypt', 'scrypt:16384:8:1' or 'pbkdf2:sha256:600000'.
+
+    Stored hashes start with the method and cost they were made with, so a hash
+    made under an older policy is recognised at login and replaced (see
+    User.rehash_if_needed) without users having to reset their passwords.
+    """
+
+    def __init__(self, method='scrypt'):
+        self.method = method
+        # werkzeug expands defaults ('scrypt' -> 'scrypt:32768:8:1'); compare against what it actually writes
+        self.prefix = generate_password_hash('', method).split('$', 1)[0]
+
+    def hash(self, password):
+        return generate_password_hash(password, self.method)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+
+# Replaced by the app from its PASSWORD_HASH_METHOD config
+password_policy = PasswordPolicy()
+
+
+def set_password_policy(method):
+    global password_policy
+    password_policy = PasswordPolicy(method)
+    return password_policy
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    # scrypt hashes are 162 characters (SQLite does not enforce the length)
+    password_hash = db.Column(db.String(255), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_policy.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        return check_password_hash(self.password_hash, password)
+
+    def rehash_if_needed(self, password):
+        """After a successful check_password: re-hash under the current policy if the stored hash is older.
+
+        Returns True when password_hash changed (the caller commits).
+        """
+        if not password_policy.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
+
+
+# Called with the user id after a User row is updated or deleted in this process (e.g. to drop cached copies)
+user_change_listeners = []
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _notify_user_changed(mapper, connection, target):
+    for listener in user_change_listeners:
+        listener(target.id)
+
+
+class Prediction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    timestamp = db.Column(db.Integer, nullable=False)
+    probability = db.Column(db.Float, nullable=True)
+    risk_label = db.Column(db.String(32), nullable=False)
+    summary = db.Column(db.String(255), nullable=False, default='')
+
+    # history/dashboard only ever ask for one user's most recent rows
+    __table_args__ = (
+        db.Index('ix_prediction_user_timestamp', 'user_id', 'timestamp'),
+    )
+
+
+class UserStats(db.Model):
+    """Running totals over all of a user's predictions, updated with each new one (see dashboard_stats.py)."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    # probability aggregates only cover rows that have a probability
+    prob_count = db.Column(db.Integer, nullable=False, default=0)
+    prob_sum = db.Column(db.Float, nullable=False, default=0.0)
+    prob_min = db.Column(db.Float, nullable=True)
+    prob_max = db.Column(db.Float, nullable=True)
+    low = db.Column(db.Integer, nullable=False, default=0)
+    moderate = db.Column(db.Integer, nullable=False, default=0)
+    high = db.Column(db.Integer, nullable=False, default=0)
+    first_timestamp = db.Column(db.Integer, nullable=True)
+    last_timestamp = db.Column(db.Integer, nullable=True)
+    # JSON list of the newest entries, newest first
+    recent = db.Column(db.Text, nullable=False, default='[]')
+
+
+class UserDailyStats(db.Model):
+    """Per-user, per-day (UTC) totals; time windows and trends sum a bounded number of these rows."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Integer, primary_key=True)  # days since the epoch
+    count = db.Column(db.Integer, nullable=False, default=0)
+    prob_count = db.Column(db.Integer, nullable=False, default=0)
+    prob_sum = db.Column(db.Float, nullable=False, default=0.0)
+    prob_min = db.Column(db.Float, nullable=True)
+    prob_max = db.Column(db.Float, nullable=True)
+    low = db.Column(db.Integer, nullable=False, default=0)
+    moderate = db.Column(db.Integer, nullable=False, default=0)
+    high = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,99 @@
+import functools
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request, session
+from flask_login import current_user
+
+# Render cache for pages whose HTML depends only on the template and a few
+# current_user fields (resources, settings).
+#
+# The ETag is computed without rendering, from the endpoint, the user fields the
+# page shows, the template files' mtimes and the static asset manifest version. A
+# matching If-None-Match gets a 304 straight away. Otherwise the rendered body, and
+# a gzip copy of it, come from a small per-process LRU that is filled on first view.
+# Responses are private to the user and must be revalidated.
+
+
+class PageCache:
+    def __init__(self, app, max_entries=2048):
+        self.app = app
+        self.max_entries = max_entries
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._template_version = None
+
+    def template_version(self):
+        # templates only change on deploy; recheck mtimes per request when templates auto-reload
+        if self._template_version is None or self.app.jinja_env.auto_reload:
+            folder = os.path.join(self.app.root_path, self.app.template_folder)
+            stamp = ';'.join(f'{name}:{os.stat(os.path.join(folder, name)).st_mtime_ns}'
+                             for name in sorted(os.listdir(folder)))
+            manifest = self.app.extensions.get('static_assets') or {}
+            self._template_version = hashlib.sha256(f'{stamp}|{manifest.get("version")}'.encode()).hexdigest()[:16]
+        return self._template_version
+
+    def _store(self, key, etag, body):
+        entry = (etag, body, gzip.compress(body, compresslevel=6, mtime=0))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def cached(self, *user_fields):
+        """Decorator for a view returning render_template(...); user_fields are the current_user attributes it shows."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                # flashed messages are one-off; never cache or short-circuit a page that shows them
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+                parts = [request.endpoint, self.template_version()]
+                parts += [str(getattr(current_user, f, '')) for f in user_fields]
+                etag = hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()[:32]
+                key = tuple(parts)
+                if etag in request.if_none_match:
+                    with self._lock:
+                        self.not_modified += 1
+                    return self._response(b'', etag, status=304)
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                if entry is None:
+                    rendered = view(*args, **kwargs)
+                    if not isinstance(rendered, str):
+                        return rendered
+                    entry = self._store(key, etag, rendered.encode('utf-8'))
+                _, body, gz = entry
+                if request.accept_encodings['gzip'] > 0:
+                    resp = self._response(gz, etag)
+                    resp.headers['Content-Encoding'] = 'gzip'
+                    return resp
+                return self._response(body, etag)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _response(body, etag, status=200):
+        resp = Response(body, status=status, mimetype='text/html')
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'private, no-cache'
+        resp.headers['Vary'] = 'Accept-Encoding, Cookie'
+        return resp
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'not_modified': self.not_modified,
+                    'misses': self.misses}
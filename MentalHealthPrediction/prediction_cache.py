@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app_logging import log_event
+from scoring import Score
+
+
+class PredictionCache:
+    """Memoizes scores and contributions keyed on (model version, encoded row).
+
+    Form inputs are mostly small Likert scales and a few categoricals, so many
+    users submit identical feature vectors. Entries live in a bounded in-process
+    LRU with a TTL and, optionally, in a SQLite file shared by every gunicorn
+    worker on the host. Keys include the model version, so a swapped model never
+    sees old results, and the first lookup under a new version empties the
+    in-process LRU.
+    """
+
+    def __init__(self, max_entries=4096, ttl=3600, disk_path=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or '.', exist_ok=True)
+            self._connect().execute('CREATE TABLE IF NOT EXISTS prediction_cache ('
+                                    'key TEXT PRIMARY KEY, version TEXT, value TEXT, expires REAL)')
+
+    def _connect(self):
+        # one connection per thread, and never one inherited across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.disk_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def key(version, X):
+        h = hashlib.sha1(str(version).encode('utf-8'))
+        h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+    def _switch_version(self, version):
+        # artifacts were swapped: nothing cached for the previous model is valid any more
+        # (shared entries are keyed by version too; other workers may still be on the old
+        # model, so those are left to expire rather than deleted here)
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            self._entries.clear()
+
+    def get(self, version, X):
+        """Return (Score, contributions) or None; contributions is None if it was cached without them."""
+        if version != self._version:
+            self._switch_version(version)
+        k = self.key(version, X)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(k)
+                    self.hits += 1
+                    return value
+                del self._entries[k]
+        if self.disk_path:
+            try:
+                row = self._connect().execute(
+                    'SELECT value, expires FROM prediction_cache WHERE key = ? AND expires > ?', (k, now)).fetchone()
+            except sqlite3.Error as e:
+                log_event(logging.WARNING, 'prediction_cache_error', op='get', error=str(e))
+                row = None
+            if row is not None:
+                value = self._decode(row[0])
+                self._remember(k, value, row[1])
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, version, X, score, contributions):
+        if version != self._version:
+            self._switch_version(version)
+        k = self.key(version, X)
+        value = (score, contributions)
+        expires = time.time() + self.ttl
+        self._remember(k, value, expires)
+        if self.disk_path:
+            try:
+                conn = self._connect()
+                conn.execute('INSERT OR REPLACE INTO prediction_cache (key, version, value, expires) VALUES (?, ?, ?, ?)',
+                             (k, str(version), self._encode(value), expires))
+                self._puts += 1
+                if self._puts % 1000 == 0:
+                    self._trim_disk(conn)
+            except sqlite3.Error as e:
+                log_event(logging.WARNING, 'prediction_cache_error', op='put', error=str(e))
+
+    def _remember(self, k, value, expires):
+        with self._lock:
+            self._entries[k] = (expires, value)
+            self._entries.move_to_end(k)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _trim_disk(self, conn):
+        conn.execute('DELETE FROM prediction_cache WHERE expires <= ?', (time.time(),))
+        conn.execute('DELETE FROM prediction_cache WHERE key IN (SELECT key FROM prediction_cache '
+                     'ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_disk_entries,))
+
+    @staticmethod
+    def _encode(value):
+        score, contributions = value
+        prediction = score.prediction.item() if hasattr(score.prediction, 'item') else score.prediction
+        return json.dumps({
+            'probabilities': [float(p) for p in score.probabilities],
+            'prediction': prediction,
+            'probability': score.probability,
+            'risk_label': score.risk_label,
+            'contributions': contributions,
+        })
+
+    @staticmethod
+    def _decode(raw):
+        d = json.loads(raw)
+        score = Score(np.asarray(d['probabilities']), d['prediction'], d['probability'], d['risk_label'])
+        contributions = d['contributions']
+        return score, [tuple(c) for c in contributions] if contributions is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            self._connect().execute('DELETE FROM prediction_cache')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'shared': bool(self.disk_path),
+            }
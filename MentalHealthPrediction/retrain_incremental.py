@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from sklearn.base import clone
+
+from artifact_bundle import load_artifacts, save_artifacts
+from feature_encoder import FeatureEncoder
+from training_data import find_target
+
+# Incremental refresh of the served forest from newly labeled rows.
+#
+# The labeled rows live in a CSV with the dataset's columns that only ever gets
+# appended to (e.g. dataset/new_labeled.csv). A state file remembers the byte
+# offset already consumed, so each run reads and encodes only the rows appended
+# since the last one, trains a few trees on them and publishes a new bundle
+# version; the app picks it up via MODEL_WATCH_INTERVAL, MODEL_RELOAD_SIGNAL or /admin/reload.
+#
+#   --mode grow     add --trees new trees to the forest (capped by --max-trees,
+#                   beyond which the oldest trees are dropped)
+#   --mode replace  swap the --trees oldest trees for trees fitted on the new rows,
+#                   keeping the ensemble size fixed
+#
+# Fitting cost depends only on the number of new rows and --trees.
+#
+# Usage:
+#   python retrain_incremental.py dataset/new_labeled.csv [--mode grow|replace] [--trees N]
+#   python retrain_incremental.py dataset/new_labeled.csv --init   # start from the file's current end
+
+STATE_FILE = os.path.join("model", "incremental_state.json")
+# bytes before the watermark whose hash detects a rewritten (not just appended) source
+TAIL_BYTES = 4096
+
+
+def read_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_state(state, path=STATE_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _tail_sha256(f, offset):
+    start = max(0, offset - TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def read_delta(source, offset=None, tail_sha256=None):
+    """(header, bytes of complete new lines, new offset) for the rows appended after `offset`."""
+    with open(source, "rb") as f:
+        header_line = f.readline()
+        header = list(pd.read_csv(io.BytesIO(header_line), nrows=0).columns)
+        if offset is None:
+            offset = len(header_line)
+        elif tail_sha256 is not None and _tail_sha256(f, offset) != tail_sha256:
+            raise ValueError(f"{source} changed before the last consumed row; rerun with --init or --reset")
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    # a trailing line without its newline may still be being written; leave it for next time
+    return header, data[:end], offset + end
+
+
+def encode_delta(data, header, encoder, classes, target):
+    """Encode the new rows with the served model's encoder; rows with unknown labels are dropped."""
+    dtypes = {c: np.float32 for c in encoder.numeric}
+    dtypes.update({c: str for c in encoder.categorical})
+    dtypes[target] = str
+    usecols = [c for c in encoder.original_features if c in header] + [target]
+    df = pd.read_csv(io.BytesIO(data), header=None, names=header, usecols=usecols, dtype=dtypes)
+    label_index = {}
+    for i, c in enumerate(classes):
+        label_index[str(c)] = i
+        if isinstance(c, (int, np.integer)):
+            # integer labels may be written as 1.0
+            label_index[str(float(c))] = i
+    y = df[target].map(label_index)
+    known = y.notna().to_numpy()
+    df = df[known]
+    X = encoder.encode_frame(df, np.zeros((len(df), encoder.n_features), dtype=np.float32))
+    return X, y[known].to_numpy(dtype=np.int64), int((~known).sum())
+
+
+def sklearn_forest(model):
+    """The sklearn estimator behind a served model (memory-mapped bundles rebuild it)."""
+    to_sklearn = getattr(model, "to_sklearn", None)
+    return to_sklearn() if to_sklearn else model
+
+
+def refresh_forest(forest, X, y, n_trees, mode="grow", max_trees=None, random_state=None):
+    """Fit n_trees on (X, y) and merge them into `forest` in place; returns the number of trees dropped."""
+    n_classes = len(forest.classes_)
+    if len(np.unique(y)) < n_classes:
+        raise ValueError(f"new rows cover {len(np.unique(y))} of {n_classes} classes; every class needs at least one row")
+    seed = random_state if random_state is not None else int(time.time())
+    extra = clone(forest).set_params(n_estimators=n_trees, warm_start=False, random_state=seed, oob_score=False)
+    extra.fit(X, y)
+    # trees index classes by position; the delta must give the same class order as the forest
+    if not np.array_equal(np.asarray(extra.classes_), np.arange(n_classes)):
+        raise ValueError(f"new trees learned classes {list(extra.classes_)}, expected {list(range(n_classes))}")
+    for est in extra.estimators_:
+        est.classes_ = forest.estimators_[0].classes_
+    dropped = n_trees if mode == "replace" else 0
+    if max_trees and len(forest.estimators_) - dropped + n_trees > max_trees:
+        dropped = len(forest.estimators_) + n_trees - max_trees
+    forest.estimators_ = forest.estimators_[dropped:] + list(extra.estimators_)
+    forest.n_estimators = len(forest.estimators_)
+    return dropped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the served forest with rows appended to a labeled CSV.")
+    parser.add_argument("source", help="labeled CSV with the dataset's columns, appended to over time")
+    parser.add_argument("--mode", choices=["grow", "replace"], default="grow")
+    parser.add_argument("--trees", type=int, default=10, help="trees fitted on the new rows")
+    parser.add_argument("--max-trees", type=int, default=None, help="--mode grow drops the oldest trees beyond this")
+    parser.add_argument("--min-rows", type=int, default=50, help="skip the refresh until this many new rows exist")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--init", action="store_true", help="mark every current row as consumed without training")
+    parser.add_argument("--reset", action="store_true", help="ignore the saved watermark and consume the whole file")
+    args = parser.parse_args(argv)
+
+    state_path = os.path.join(args.model_dir, os.path.basename(STATE_FILE))
+    state = {} if args.reset else read_state(state_path)
+    source = os.path.abspath(args.source)
+    if state.get("source") not in (None, source):
+        print(f"Watermark belongs to {state['source']}; starting {source} from its first row")
+        state = {}
+
+    t0 = time.perf_counter()
+    header, data, new_offset = read_delta(source, state.get("offset"), state.get("tail_sha256"))
+    with open(source, "rb") as f:
+        tail = _tail_sha256(f, new_offset)
+    if args.init:
+        write_state({"source": source, "offset": new_offset, "tail_sha256": tail, "updated_at": int(time.time()),
+                     "model_checksum": state.get("model_checksum")}, state_path)
+        print(f"Watermark set to byte {new_offset} of {source}")
+        return 0
+
+    model, label_encoder, feature_cols, original_features = load_artifacts(args.model_dir)
+    target = find_target(header)
+    if target is None:
+        print("ERROR: Could not find a target column containing 'depress' in", header)
+        return 1
+    encoder = FeatureEncoder(original_features, feature_cols)
+    X, y, unknown = encode_delta(data, header, encoder, label_encoder.classes_, target) if data else (None, np.zeros(0), 0)
+    t_read = time.perf_counter() - t0
+    if unknown:
+        print(f"Skipped {unknown} rows with labels the model does not know")
+    if len(y) < args.min_rows:
+        print(f"{len(y)} new labeled rows (< --min-rows {args.min_rows}); nothing to do")
+        return 0
+
+    forest = sklearn_forest(model)
+    before = len(forest.estimators_)
+    t1 = time.perf_counter()
+    try:
+        dropped = refresh_forest(forest, X, y, args.trees, args.mode, args.max_trees)
+    except ValueError as e:
+        print("ERROR:", e)
+        return 1
+    t_fit = time.perf_counter() - t1
+
+    t2 = time.perf_counter()
+    base = getattr(model, "manifest", {}).get("checksum")
+    manifest = save_artifacts(args.model_dir, forest, label_encoder, original_features, feature_cols, training={
+        "kind": "incremental",
+        "mode": args.mode,
+        "base_checksum": base,
+        "source": source,
+        "rows": int(len(y)),
+        "trees_added": args.trees,
+        "trees_dropped": dropped,
+    })
+    t_publish = time.perf_counter() - t2
+    write_state({"source": source, "offset": new_offset, "tail_sha256": tail, "updated_at": int(time.time()),
+                 "model_checksum": manifest["checksum"]}, state_path)
+    print(f"{len(y)} new rows: trees {before} -> {forest.n_estimators} ({args.mode}, +{args.trees}/-{dropped})")
+    print(f"read+encode {t_read:.2f}s, fit {t_fit:.2f}s, publish {t_publish:.2f}s")
+    print("Published model version %s (reload the app, or let MODEL_WATCH_INTERVAL pick it up)" % manifest["checksum"][:12])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,96 +1,46 @@
-import os
+import argparse
 import sys
-import json
-import pickle
-import pandas as pd
-import numpy as np
 
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report
 
-# Load dataset (reuse pointer logic)
-csv_path = os.path.join("dataset", "student_depression.csv")
-df = pd.read_csv(csv_path)
-
-# follow pointer if needed
-if df.shape[1] == 1:
-    first = str(df.columns[0]).strip()
-    if os.path.exists(first):
-        df = pd.read_csv(first)
-
-# locate target
-target_col = None
-for c in df.columns:
-    if 'depress' in str(c).lower():
-        target_col = c
-        break
-if target_col is None:
-    print('Could not find target column containing "depress"')
+from artifact_bundle import save_artifacts
+from model_search import add_search_arguments, search_from_args
+from training_data import DEFAULT_CSV, FORM_FEATURES, load_dataset
+
+parser = argparse.ArgumentParser(description='Retrain the random forest on the form features only.')
+parser.add_argument('--csv', default=DEFAULT_CSV, help='dataset CSV (or a one-line file holding its path)')
+parser.add_argument('--no-cache', action='store_true', help='re-parse the CSV even if an encoded copy is cached')
+add_search_arguments(parser)
+args = parser.parse_args()
+
+# Load the selected visible features (matching the current form), label encode the
+# target, one-hot encode categoricals and split (shared loader: see training_data.py)
+try:
+    data = load_dataset(args.csv, features='form', use_cache=not args.no_cache)
+except ValueError as e:
+    print(e)
     sys.exit(1)
 
-# label encode target
-le = LabelEncoder()
-df[target_col] = le.fit_transform(df[target_col])
-
-# Selected visible features (matching the current form)
-selected = [
-    "Gender",
-    "Age",
-    "Academic Pressure",
-    "Work Pressure",
-    "CGPA",
-    "Study Satisfaction",
-    "Sleep Duration",
-    "Degree",
-    "Work/Study Hours",
-    "Financial Stress",
-    "Family History of Mental Illness",
-]
-
-missing = [c for c in selected if c not in df.columns]
-if missing:
-    print("Warning: some selected features not in dataset:", missing)
-
-X = df[[c for c in selected if c in df.columns]].copy()
-y = df[target_col]
-
-# one-hot encode categorical & fill
-X = pd.get_dummies(X, drop_first=True)
-X = X.fillna(0)
-
-# Save original and feature columns
-os.makedirs('model', exist_ok=True)
-with open('model/original_features.json', 'w', encoding='utf-8') as f:
-    json.dump(selected, f)
-with open('model/feature_columns.json', 'w', encoding='utf-8') as f:
-    json.dump(X.columns.tolist(), f)
-
-# train/test split
-if X.shape[0] == 0:
+X_train, X_test, y_train, y_test = data.X_train, data.X_test, data.y_train, data.y_test
+feature_cols = data.feature_encoder.feature_cols
+if X_train.shape[0] == 0:
     print('No training rows found after filtering features. Abort.')
     sys.exit(1)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-
 # model with class_weight to handle imbalance
-rf = RandomForestClassifier(random_state=42, class_weight='balanced')
 params = {'n_estimators':[100,200], 'max_depth':[None, 10, 20]}
-grid = GridSearchCV(rf, params, cv=3, scoring='accuracy', n_jobs=-1)
 
 print('Training reduced model...')
-grid.fit(X_train, y_train)
-best = grid.best_estimator_
+result = search_from_args(args, X_train, y_train, params, base_params={'random_state': 42, 'class_weight': 'balanced', 'n_jobs': -1}, cv=3)
+best = result.best_estimator
 
 preds = best.predict(X_test)
 print('Accuracy:', accuracy_score(y_test, preds))
 print(classification_report(y_test, preds))
 
-# save model + encoder
-pickle.dump(best, open('model/rf_model.pkl', 'wb'))
-pickle.dump(le, open('model/label_encoder.pkl', 'wb'))
-print('Saved model to model/rf_model.pkl')
+# save feature columns + model + encoder (JSON files and the memory-mapped bundle)
+manifest = save_artifacts('model', best, data.label_encoder, FORM_FEATURES, feature_cols)
+print('Saved model bundle to model/bundle (checksum %s)' % manifest['checksum'][:12])
 
 # quick sanity: print feature count
-print('Feature columns used:', len(X.columns))
+print('Feature columns used:', len(feature_cols))
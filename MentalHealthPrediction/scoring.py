@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Result of scoring one row: the full probability vector, the decoded class label,
+# the positive ('at risk') class probability and its human-friendly risk level
+Score = namedtuple('Score', ['probabilities', 'prediction', 'probability', 'risk_label'])
+
+
+def positive_index(encoder):
+    """Column of predict_proba for the 'at risk' class (label 1)."""
+    try:
+        return list(encoder.classes_).index(1)
+    except Exception:
+        return 1 if len(encoder.classes_) > 1 else 0
+
+
+def risk_label_for_probability(prob_pos):
+    # Map risk by probability (better UX than the raw class)
+    if prob_pos < 0.33:
+        return "Low Risk"
+    if prob_pos < 0.66:
+        return "Moderate Risk"
+    return "High Risk"
+
+
+class Scorer:
+    """Derives class, decoded label and risk from a single predict_proba pass.
+
+    model.predict() is just argmax over predict_proba, so calling both runs the
+    forest twice. The decoded label for every probability column and the
+    positive-class column are resolved once, when the model is loaded.
+    """
+
+    def __init__(self, predictor, encoder):
+        self.predictor = predictor
+        self.pos_index = positive_index(encoder)
+        # decoded label of each predict_proba column (model.classes_ are encoded targets)
+        self.decoded_classes = np.asarray(encoder.inverse_transform(np.asarray(predictor.classes_)))
+
+    def score_many(self, X):
+        """Score every row of X; returns (probabilities, decoded labels, positive-class probabilities)."""
+        probs = self.predictor.predict_proba(X)
+        labels = self.decoded_classes.take(np.argmax(probs, axis=1))
+        return probs, labels, probs[:, self.pos_index]
+
+    def score_rows(self, X):
+        """One Score per row of X, from a single predict_proba call."""
+        probs, labels, prob_pos = self.score_many(X)
+        return [Score(probs[i], labels[i], float(prob_pos[i]), risk_label_for_probability(float(prob_pos[i])))
+                for i in range(len(labels))]
+
+    def score(self, X):
+        """Score a single-row X."""
+        return self.score_rows(X)[0]
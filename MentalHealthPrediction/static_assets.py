@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from flask import request, send_from_directory
+
+# Optional: brotli variants are only written when the module is installed
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except Exception:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Fingerprinted static assets.
+#
+# build() copies every .css/.js file under static/ to static/dist/ as
+# name.<content hash>.ext, next to precompressed .gz and (with brotli installed)
+# .br variants, and writes static/dist/manifest.json. With init_app() in place,
+# url_for('static', filename='style.css') points at the fingerprinted copy. That
+# copy's URL changes whenever its content does, so it is served with a one-year
+# immutable Cache-Control header and the smallest encoding the client accepts.
+# init_app() rebuilds the manifest when a source file has changed, so a deploy
+# needs no extra step. `python static_assets.py` does the same from the command line.
+
+ASSET_EXTENSIONS = ('.css', '.js')
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# variants in order of preference: (Accept-Encoding token, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _sources(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if d != DIST_DIR]
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def read_manifest(static_dir):
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build(static_dir):
+    """Write fingerprinted + precompressed copies of the assets; returns the manifest."""
+    dist = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    assets = {}
+    for rel, path in _sources(static_dir):
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        stem, ext = os.path.splitext(rel)
+        fingerprinted = f'{stem}.{digest[:12]}{ext}'
+        out = os.path.join(dist, fingerprinted)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        sizes = {'identity': len(data)}
+        if not os.path.exists(out):
+            _write_atomic(out, data)
+            # mtime=0: identical input gives identical .gz bytes on every build
+            _write_atomic(out + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if BROTLI_AVAILABLE:
+                _write_atomic(out + '.br', brotli.compress(data, quality=11))
+        for token, suffix in ENCODINGS:
+            if os.path.exists(out + suffix):
+                sizes[token] = os.path.getsize(out + suffix)
+        assets[rel] = {'path': f'{DIST_DIR}/{fingerprinted}', 'sha256': digest, 'sizes': sizes}
+    manifest = {'assets': assets, 'version': hashlib.sha256(
+        ''.join(a['sha256'] for a in assets.values()).encode()).hexdigest()[:12]}
+    _write_atomic(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def is_current(static_dir, manifest):
+    if not manifest:
+        return False
+    sources = dict(_sources(static_dir))
+    if set(sources) != set(manifest['assets']):
+        return False
+    for rel, path in sources.items():
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != manifest['assets'][rel]['sha256']:
+                return False
+    return True
+
+
+def init_app(app):
+    """Point url_for('static', ...) at fingerprinted assets and serve them precompressed."""
+    static_dir = app.static_folder
+    manifest = read_manifest(static_dir)
+    if not is_current(static_dir, manifest):
+        try:
+            manifest = build(static_dir)
+        except OSError:
+            # read-only deploy without a prebuilt manifest: fall back to the plain files
+            manifest = None
+    app.extensions['static_assets'] = manifest
+    if not manifest:
+        return None
+    paths = {rel: a['path'] for rel, a in manifest['assets'].items()}
+    dist = os.path.join(static_dir, DIST_DIR)
+
+    @app.url_defaults
+    def _fingerprint(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in paths:
+            values['filename'] = paths[values['filename']]
+
+    def fingerprinted_asset(filename):
+        mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+        served, encoding = filename, None
+        for token, suffix in ENCODINGS:
+            if request.accept_encodings[token] > 0 and os.path.exists(os.path.join(dist, filename + suffix)):
+                served, encoding = filename + suffix, token
+                break
+        resp = send_from_directory(dist, served, mimetype=mimetype, max_age=31536000, conditional=True)
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+        resp.headers['Vary'] = 'Accept-Encoding'
+        resp.headers['Cache-Control'] = IMMUTABLE
+        return resp
+
+    # more specific than Flask's /static/<path:filename>, so it wins for dist/ files
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'static_dist', fingerprinted_asset)
+    return manifest
+
+
+if __name__ == '__main__':
+    static_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = build(static_dir)
+    for rel, asset in sorted(manifest['assets'].items()):
+        sizes = ', '.join(f'{k} {v}' for k, v in asset['sizes'].items())
+        print(f'{rel} -> {asset["path"]} ({sizes} bytes)')
+    if not BROTLI_AVAILABLE:
+        print('brotli is not installed; only gzip variants were written')
@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+# Concurrency stress test for the database profile (db_profile.py): --workers
+# processes, standing in for gunicorn workers, run signups and history writes
+# against one database for --duration seconds. Reports writes/s and how many
+# operations failed with "database is locked" (or any other error).
+#
+#   default  SQLite as the app ran before: rollback journal, synchronous=FULL, no busy_timeout
+#   tuned    the db_profile defaults: WAL, synchronous=NORMAL, busy_timeout=5000
+#
+# Each profile gets a fresh temporary SQLite file, or --url to test a server database.
+# Usage: python stress_db.py [--workers 4] [--duration 10] [--profile default tuned] [--url URL]
+
+PROFILES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT_MS': '0'},
+    'tuned': {},
+}
+# the test is about the database; keep password hashing out of the way
+HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+def make_app(url):
+    from flask import Flask
+
+    import db_profile
+    from models import db, set_password_policy
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db_profile.configure(app, os.path.dirname(os.path.abspath(__file__)))
+    db.init_app(app)
+    db_profile.attach(app, db)
+    set_password_policy(HASH_METHOD)
+    return app
+
+
+def worker(url, env, deadline, history_per_signup, out):
+    os.environ.update(env)
+    import history_store
+    from models import db, User
+
+    app = make_app(url)
+    counts = {'signups': 0, 'history_writes': 0, 'locked': 0, 'errors': 0}
+    with app.app_context():
+        while time.time() < deadline:
+            name = 'stress' + uuid.uuid4().hex[:12]
+            try:
+                user = User(username=name, email=f'{name}@example.com')
+                user.set_password(name)
+                db.session.add(user)
+                db.session.commit()
+                counts['signups'] += 1
+                for _ in range(history_per_signup):
+                    history_store.append_prediction(user.id, 0.5, 'Moderate Risk', 'Academic Pressure=3')
+                    counts['history_writes'] += 1
+            except Exception as e:
+                db.session.rollback()
+                counts['locked' if 'locked' in str(e) else 'errors'] += 1
+            finally:
+                db.session.remove()
+    out.put(counts)
+
+
+def run_profile(name, url, args):
+    env = {k: str(v) for k, v in PROFILES[name].items()}
+    os.environ.update(env)
+    from models import db
+    with make_app(url).app_context():
+        db.create_all()
+    for k in env:
+        os.environ.pop(k, None)
+
+    ctx = multiprocessing.get_context('spawn')
+    out = ctx.Queue()
+    # workers start at once; give spawn + imports a head start before the clock runs
+    start = time.time() + 3.0
+    deadline = start + args.duration
+    procs = [ctx.Process(target=_delayed_worker, args=(start, url, env, deadline, args.history_per_signup, out))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    totals = {'signups': 0, 'history_writes': 0, 'locked': 0, 'errors': 0}
+    for _ in procs:
+        for k, v in out.get().items():
+            totals[k] += v
+    for p in procs:
+        p.join()
+    writes = totals['signups'] + totals['history_writes']
+    print(f"{name:<8} {totals['signups'] / args.duration:9.1f} {totals['history_writes'] / args.duration:12.1f} "
+          f"{writes / args.duration:9.1f} {totals['locked']:7d} {totals['errors']:7d}")
+
+
+def _delayed_worker(start, *worker_args):
+    time.sleep(max(0.0, start - time.time()))
+    worker(*worker_args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Signup and history-write throughput with concurrent worker processes.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per profile')
+    parser.add_argument('--history-per-signup', type=int, default=5, help='history rows written after each signup')
+    parser.add_argument('--profile', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--url', default=None, help='database URL (default: a temporary SQLite file per profile)')
+    args = parser.parse_args(argv)
+
+    print(f"{args.workers} workers, {args.duration:g}s per profile")
+    print(f"{'profile':<8} {'signups/s':>9} {'history w/s':>12} {'writes/s':>9} {'locked':>7} {'errors':>7}")
+    for name in args.profile:
+        if args.url:
+            run_profile(name, args.url, args)
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            run_profile(name, f"sqlite:///{os.path.join(tmp, 'stress.db')}", args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_encoder import FeatureEncoder
+
+# Parity tests: FeatureEncoder must produce the same vectors as the pandas
+# get_dummies + reindex(FEATURE_COLS) encoding used at training time, for every
+# Degree / Sleep Duration / Gender / family-history category the form can send.
+# Run with `python -m pytest test_feature_encoder.py` from this directory.
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+# Every category with a dummy column, plus the values the form offers that were
+# dropped as the baseline (or never seen) and must encode as all zeros
+EXTRA = {
+    "Gender": ["Male", "Female", "Other"],
+    "Sleep Duration": ["5-6 hours", "7-8 hours", "Less than 5 hours", "More than 8 hours", "Others"],
+    "Degree": ["B.Arch", "Unknown degree", ""],
+    "Family History of Mental Illness": ["Yes", "No"],
+}
+
+BASE_FORM = {
+    "Age": "21", "Academic Pressure": "4", "Work Pressure": "0", "CGPA": "7.5",
+    "Study Satisfaction": "2", "Work/Study Hours": "6", "Financial Stress": "3",
+    "Family History of Mental Illness": "Yes",
+}
+
+
+def _load(name):
+    with open(os.path.join(MODEL_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def columns():
+    return _load("original_features.json"), _load("feature_columns.json")
+
+
+@pytest.fixture(scope="module")
+def encoder(columns):
+    return FeatureEncoder(*columns)
+
+
+def _categories(fe):
+    return {name: list(fe.categorical.get(name, {})) + [v for v in extra if v not in fe.categorical.get(name, {})]
+            for name, extra in EXTRA.items()}
+
+
+def _training_encoding(fe, original_features, feature_cols, rows):
+    """get_dummies + reindex, one row at a time, as the training scripts encode a frame."""
+    cat_cols = [c for c in fe.categorical if c in original_features]
+    expected = []
+    for r in rows:
+        df = pd.DataFrame([r])
+        # numeric columns that received strings are dummied (and then dropped) like categoricals
+        cols = [c for c in df.columns if c in cat_cols or not pd.api.types.is_numeric_dtype(df[c])]
+        df = pd.get_dummies(df, columns=cols)
+        expected.append(df.reindex(columns=feature_cols, fill_value=0).astype(float).values[0])
+    return np.vstack(expected)
+
+
+def _mismatches(got, expected, rows, feature_cols):
+    bad = np.flatnonzero(~np.all(got == expected, axis=1))
+    return [(rows[i], [feature_cols[j] for j in np.flatnonzero(got[i] != expected[i])]) for i in bad[:10]]
+
+
+def test_matches_get_dummies_for_every_category(encoder, columns):
+    original_features, feature_cols = columns
+    categories = _categories(encoder)
+    rows = [encoder.parse_form(dict(BASE_FORM, **dict(zip(categories, values))))
+            for values in itertools.product(*categories.values())]
+    # numeric edge cases: missing optional field and unparsable input
+    rows.append(encoder.parse_form(dict(BASE_FORM, **{"Work/Study Hours": ""})))
+    rows.append(encoder.parse_form(dict(BASE_FORM, **{"Age": "abc"})))
+    expected = _training_encoding(encoder, original_features, feature_cols, rows)
+
+    single = np.vstack([encoder.encode(r)[0] for r in rows])
+    assert not _mismatches(single, expected, rows, feature_cols)
+    assert not _mismatches(encoder.encode_many(rows), expected, rows, feature_cols)
+
+
+def test_every_categorical_column_reaches_the_model(encoder, columns):
+    # The baseline encoded the single form row with get_dummies(drop_first=True), which drops the only
+    # category present in each categorical column: Gender, Sleep Duration, Degree and family history never
+    # reached the model. Every known category must set its own dummy column and nothing else in its group.
+    original_features, feature_cols = columns
+    form = dict(BASE_FORM)
+    for name, values in encoder.categorical.items():
+        form[name] = next(iter(values))
+    row = encoder.parse_form(form)
+    X = encoder.encode(row)[0]
+    expected_cols = {f"{name}_{form[name]}" for name in encoder.categorical}
+    assert {feature_cols[j] for j in np.flatnonzero(X) if feature_cols[j] not in encoder.numeric} == expected_cols
+
+    baseline = pd.get_dummies(pd.DataFrame([row]), drop_first=True).reindex(columns=feature_cols, fill_value=0)
+    assert not baseline[sorted(expected_cols)].to_numpy().any()
+
+    for name, values in encoder.categorical.items():
+        group = list(values.values())
+        for value, idx in values.items():
+            X = encoder.encode(encoder.parse_form(dict(form, **{name: value})))[0]
+            assert X[idx] == 1.0
+            assert X[group].sum() == 1.0
+
+
+def test_dropped_and_unknown_categories_encode_as_zeros(encoder):
+    for name, values in [("Gender", ["Female", "Other"]), ("Sleep Duration", ["5-6 hours"]),
+                         ("Degree", ["B.Arch", "Unknown degree", ""]), ("Family History of Mental Illness", ["No"])]:
+        group = list(encoder.categorical[name].values())
+        for value in values:
+            X = encoder.encode(encoder.parse_form(dict(BASE_FORM, **{name: value})))[0]
+            assert not X[group].any(), (name, value)
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from artifact_bundle import save_artifacts
+from model_search import add_search_arguments, search_from_args
+from training_data import DEFAULT_CHUNKSIZE, DEFAULT_CSV, FORM_FEATURES, find_target, load_dataset, resolve_csv_path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Trains from the chunked two-pass loader in training_data.py and measures it
+# against the old path, which read the whole CSV into one DataFrame and one-hot
+# encoded all of it (several dense float64/object copies at once):
+#
+#   1. scan    - decide which columns are numeric, learn every categorical
+#                vocabulary and encode the target (which fixes the train/test split)
+#   2. build   - re-read with explicit dtypes (float32 for numeric columns,
+#                CategoricalDtype with the learned vocabulary for the rest) and
+#                fill a preallocated float32 matrix (or CSR with --sparse), laid
+#                out exactly like pd.get_dummies(drop_first=True), training rows first
+#
+# Usage:
+#   python train_streaming.py [csv] [--chunksize N] [--sparse] [--features all|form] [--search halving|random|grid]
+#   python train_streaming.py [csv] --compare [--load-only] [--sparse] [--trees N]   # peak RSS / wall time vs the pandas path
+
+PARAM_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [None, 10, 20],
+    "min_samples_split": [2, 5],
+    "min_samples_leaf": [1, 2]
+}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def load_streaming(csv_path, features="all", chunksize=DEFAULT_CHUNKSIZE, sparse=False, use_cache=False):
+    data = load_dataset(csv_path, features, chunksize, sparse, use_cache=use_cache)
+    enc = data.feature_encoder
+    return (data.X_train, data.X_test, data.y_train, data.y_test, enc.feature_cols, enc.original_features,
+            data.label_encoder)
+
+
+def load_pandas(csv_path, features="all", test_size=0.2):
+    """The current train_model.py / retrain_reduced.py path, for comparison."""
+    df = pd.read_csv(csv_path)
+    target = find_target(list(df.columns))
+    df = df[df[target].notna()]
+    le = LabelEncoder()
+    y = le.fit_transform(df[target])
+    if features == "form":
+        X = df[[c for c in FORM_FEATURES if c in df.columns]].copy()
+    else:
+        X = df.drop(columns=[target])
+    original_features = X.columns.tolist()
+    X = pd.get_dummies(X, drop_first=True)
+    X = X.fillna(0)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42, stratify=y)
+    return X_train, X_test, y_train, y_test, X.columns.tolist(), original_features, le
+
+
+def fit(X, y, args):
+    if args.search == "none":
+        # a single forest, as before the search stage existed
+        return search_from_args(args, X, y, {"n_estimators": [args.trees]}, base_params={"random_state": 42, "n_jobs": -1}).best_estimator
+    return search_from_args(args, X, y, PARAM_GRID, base_params={"random_state": 42, "n_jobs": -1}, cv=5).best_estimator
+
+
+def _mode_name(args):
+    return args.mode + ("+sparse" if args.sparse and args.mode == "streaming" else "")
+
+
+def _rss():
+    rss = peak_rss_mb()
+    return round(rss, 1) if rss is not None else None
+
+
+def run(args):
+    csv_path = resolve_csv_path(args.csv)
+    t0 = time.perf_counter()
+    if args.mode == "pandas":
+        X_train, X_test, y_train, y_test, cols, original_features, le = load_pandas(csv_path, args.features)
+    else:
+        X_train, X_test, y_train, y_test, cols, original_features, le = load_streaming(
+            csv_path, args.features, args.chunksize, args.sparse, use_cache=args.cache)
+    t_load = time.perf_counter() - t0
+    n_rows = X_train.shape[0] + X_test.shape[0]
+    print(f"Loaded {n_rows} rows x {len(cols)} features in {t_load:.1f}s ({_mode_name(args)})")
+    stats = {"mode": _mode_name(args), "rows": int(n_rows), "features": len(cols), "load_s": round(t_load, 2),
+             "fit_s": None, "total_s": round(t_load, 2), "peak_rss_mb": None, "accuracy": None}
+    if args.load_only:
+        stats["peak_rss_mb"] = _rss()
+        print("STATS " + json.dumps(stats))
+        return stats
+
+    t1 = time.perf_counter()
+    model = fit(X_train, y_train, args)
+    t_fit = time.perf_counter() - t1
+    predictions = model.predict(X_test)
+    accuracy = accuracy_score(y_test, predictions)
+    print("Accuracy:", accuracy)
+    print(classification_report(y_test, predictions))
+
+    if not args.no_save:
+        manifest = save_artifacts("model", model, le, original_features, cols)
+        print("Saved model bundle to model/bundle (checksum %s)" % manifest["checksum"][:12])
+
+    stats.update(fit_s=round(t_fit, 2), total_s=round(time.perf_counter() - t0, 2), peak_rss_mb=_rss(),
+                 accuracy=round(float(accuracy), 4))
+    print("STATS " + json.dumps(stats))
+    return stats
+
+
+def compare(args):
+    """Run the pandas and streaming paths in fresh processes so each peak RSS is its own."""
+    results = []
+    runs = [("pandas", []), ("streaming", [])] + ([("streaming", ["--sparse"])] if args.sparse else [])
+    for mode, extra in runs:
+        cmd = [sys.executable, os.path.abspath(__file__), args.csv, "--mode", mode, "--no-save",
+               "--features", args.features, "--chunksize", str(args.chunksize), "--trees", str(args.trees)] + extra
+        cmd += ["--search", args.search]
+        cmd += ["--time-budget", str(args.time_budget)] if args.time_budget else []
+        cmd += ["--warm-start"] if args.warm_start else []
+        cmd += ["--load-only"] if args.load_only else []
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        line = next((l for l in out.stdout.splitlines() if l.startswith("STATS ")), None)
+        if line is None:
+            print(f"{mode} run failed:\n{out.stdout}\n{out.stderr}")
+            continue
+        results.append(json.loads(line[len("STATS "):]))
+
+    def fmt(v, spec):
+        return format(v, spec) if v is not None else "n/a"
+
+    print(f"{'mode':<17} {'rows':>9} {'features':>8} {'load s':>7} {'fit s':>7} {'total s':>8} {'peak RSS MB':>12} {'accuracy':>9}")
+    for r in results:
+        print(f"{r['mode']:<17} {r['rows']:>9} {r['features']:>8} {r['load_s']:>7.1f} {fmt(r['fit_s'], '>7.1f')} "
+              f"{r['total_s']:>8.1f} {fmt(r['peak_rss_mb'], '>12.1f')} {fmt(r['accuracy'], '>9.4f')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the random forest from a CSV read in chunks.")
+    parser.add_argument("csv", nargs="?", default=DEFAULT_CSV)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows read per chunk")
+    parser.add_argument("--sparse", action="store_true",
+                        help="build a CSR matrix instead of a dense float32 one (smaller, but the forest fits much slower)")
+    parser.add_argument("--features", choices=["all", "form"], default="all",
+                        help="'all' columns (train_model.py) or the form's columns (retrain_reduced.py)")
+    add_search_arguments(parser, default="none")
+    parser.add_argument("--trees", type=int, default=100, help="n_estimators with --search none")
+    parser.add_argument("--mode", choices=["streaming", "pandas"], default="streaming")
+    parser.add_argument("--no-save", action="store_true", help="do not write model artifacts")
+    parser.add_argument("--cache", action="store_true", help="reuse/write the encoded dataset cache (training_data.py)")
+    parser.add_argument("--load-only", action="store_true", help="build the feature matrix and stop (no fit)")
+    parser.add_argument("--compare", action="store_true", help="report peak RSS and wall time of each path")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
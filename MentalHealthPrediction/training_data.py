@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from feature_encoder import FeatureEncoder
+
+# Dataset loading shared by the training scripts (train_model.py,
+# retrain_reduced.py and train_streaming.py).
+#
+# The CSV is read in two chunked passes (scan_schema, then build_matrix through
+# the same FeatureEncoder that serving uses) into a float32 matrix with the
+# training rows first. The result is cached under dataset/.cache/<key>/ as .npy
+# files keyed on the CSV's sha256 and the load options, so re-running training
+# on an unchanged dataset only hashes the file and maps the cached arrays.
+
+DEFAULT_CSV = os.path.join("dataset", "student_depression.csv")
+DEFAULT_CACHE_DIR = os.path.join("dataset", ".cache")
+DEFAULT_CHUNKSIZE = 50000
+# Bump when the encoding changes so stale caches are rebuilt
+CACHE_FORMAT = 1
+
+# Features on the prediction form (the reduced model's inputs)
+FORM_FEATURES = [
+    "Gender",
+    "Age",
+    "Academic Pressure",
+    "Work Pressure",
+    "CGPA",
+    "Study Satisfaction",
+    "Sleep Duration",
+    "Degree",
+    "Work/Study Hours",
+    "Financial Stress",
+    "Family History of Mental Illness",
+]
+
+
+# (X_train, X_test) are float32 views of one matrix; label_encoder maps y codes back to the CSV's labels
+Dataset = namedtuple('Dataset', ['X_train', 'X_test', 'y_train', 'y_test', 'feature_encoder', 'label_encoder',
+                                 'csv_sha256', 'from_cache'])
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def resolve_csv_path(path):
+    """Follow a one-line CSV that only holds the path of the real dataset."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        first = f.readline().strip()
+        rest = f.readline()
+    candidate = first.strip('"').strip("'")
+    if not rest.strip() and "," not in first and candidate and os.path.exists(candidate):
+        return candidate
+    return path
+
+
+def find_target(columns):
+    if "Depression_Level" in columns:
+        return "Depression_Level"
+    for col in columns:
+        if "depress" in str(col).lower():
+            return col
+    return None
+
+
+def _encode_target(y, seen):
+    """Codes for y in first-seen order, adding new values to `seen`."""
+    for v in y.unique():
+        if v not in seen:
+            seen[v] = len(seen)
+    return y.map(seen).to_numpy(dtype=np.int64)
+
+
+def scan_schema(csv_path, features="all", chunksize=DEFAULT_CHUNKSIZE):
+    """Pass 1: column kinds, categorical vocabularies, the encoded target and row count.
+
+    A column is numeric when the parser infers a numeric dtype for it in every
+    chunk, which is the same rule a single pd.read_csv applies to the whole file.
+    """
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    target = find_target(columns)
+    if target is None:
+        raise ValueError(f"Could not find a target column containing 'depress' in {columns}")
+    if features == "form":
+        missing = [c for c in FORM_FEATURES if c not in columns]
+        if missing:
+            print("Warning: some selected features not in dataset:", missing)
+        feature_names = [c for c in FORM_FEATURES if c in columns]
+    else:
+        feature_names = [c for c in columns if c != target]
+
+    numeric = {c: True for c in feature_names}
+    vocab = {c: set() for c in feature_names}
+    flipped_late = set()
+    seen = {}
+    codes, keep = [], []
+    for i, chunk in enumerate(pd.read_csv(csv_path, usecols=feature_names + [target], chunksize=chunksize)):
+        has_target = chunk[target].notna().to_numpy()
+        keep.append(has_target)
+        codes.append(_encode_target(chunk[target][has_target], seen))
+        chunk = chunk[has_target]
+        for c in feature_names:
+            s = chunk[c]
+            if numeric[c]:
+                if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+                    continue
+                if s.isna().all():
+                    continue
+                numeric[c] = False
+                if i > 0:
+                    flipped_late.add(c)
+            vocab[c].update(str(v) for v in s.dropna().unique())
+
+    if flipped_late:
+        # a column turned out to be categorical after its earlier values were skipped as numbers
+        for chunk in pd.read_csv(csv_path, usecols=sorted(flipped_late) + [target], dtype=str, chunksize=chunksize):
+            chunk = chunk[chunk[target].notna()]
+            for c in flipped_late:
+                vocab[c].update(chunk[c].dropna().unique())
+
+    # LabelEncoder order: classes sorted, codes remapped from first-seen order
+    values = list(seen)
+    order = sorted(range(len(values)), key=lambda k: values[k])
+    remap = np.empty(len(values), dtype=np.int64)
+    remap[order] = np.arange(len(values))
+    classes = np.array([values[k] for k in order])
+    y = remap[np.concatenate(codes)] if codes else np.zeros(0, dtype=np.int64)
+
+    keep = np.concatenate(keep) if keep else np.zeros(0, dtype=bool)
+    return {
+        "target": target,
+        "classes": classes,
+        "y": y,
+        "keep": keep,
+        "features": feature_names,
+        "numeric": [c for c in feature_names if numeric[c]],
+        "categorical": {c: sorted(vocab[c]) for c in feature_names if not numeric[c]},
+        "n_rows": int(len(y)),
+        "n_missing_target": int((~keep).sum()),
+    }
+
+
+def build_matrix(csv_path, schema, encoder, order=None, chunksize=DEFAULT_CHUNKSIZE, sparse=False):
+    """Pass 2: float32 feature matrix (dense, or CSR with sparse=True) with rows laid out as `order`.
+
+    order[k] is the CSV row (among rows with a target) that lands in row k, so a
+    train/test split can be written as two contiguous slices instead of copied
+    out with fancy indexing afterwards.
+    """
+    n = schema["n_rows"]
+    dest = np.arange(n)
+    if order is not None:
+        dest[np.asarray(order)] = np.arange(n)
+    dtypes = {c: np.float32 for c in schema["numeric"]}
+    dtypes.update({c: pd.CategoricalDtype(v) for c, v in schema["categorical"].items()})
+
+    X = None if sparse else np.zeros((n, encoder.n_features), dtype=np.float32)
+    blocks, block_rows = [], []
+    csv_row = row = 0
+    for chunk in pd.read_csv(csv_path, usecols=schema["features"], dtype=dtypes, chunksize=chunksize):
+        has_target = schema["keep"][csv_row:csv_row + len(chunk)]
+        csv_row += len(chunk)
+        chunk = chunk[has_target]
+        m = len(chunk)
+        block = encoder.encode_frame(chunk, np.zeros((m, encoder.n_features), dtype=np.float32))
+        if sparse:
+            from scipy import sparse as sp
+            blocks.append(sp.csr_matrix(block))
+            block_rows.append(dest[row:row + m])
+        else:
+            X[dest[row:row + m]] = block
+        row += m
+    if sparse:
+        from scipy import sparse as sp
+        if not blocks:
+            return sp.csr_matrix((0, encoder.n_features), dtype=np.float32)
+        X = sp.vstack(blocks, format="csr")
+        if order is not None:
+            X = X[np.argsort(np.concatenate(block_rows))]
+    return X
+
+
+def label_encoder_for(classes):
+    le = LabelEncoder()
+    le.classes_ = np.asarray(classes)
+    return le
+
+
+def _cache_key(csv_sha256, features, test_size, random_state):
+    h = hashlib.sha256(f"{CACHE_FORMAT}:{csv_sha256}:{features}:{test_size}:{random_state}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _read_cache(cache_path, csv_sha256):
+    with open(os.path.join(cache_path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    X = np.load(os.path.join(cache_path, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(cache_path, "y.npy"))
+    n_train = meta["n_train"]
+    encoder = FeatureEncoder(meta["original_features"], meta["feature_columns"])
+    return Dataset(X[:n_train], X[n_train:], y[:n_train], y[n_train:], encoder,
+                   label_encoder_for(np.asarray(meta["classes"])), csv_sha256, True)
+
+
+def _write_cache(cache_path, X, y, n_train, encoder, classes, csv_sha256):
+    tmp = f"{cache_path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "X.npy"), X)
+    np.save(os.path.join(tmp, "y.npy"), y)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "format": CACHE_FORMAT,
+            "csv_sha256": csv_sha256,
+            "n_train": int(n_train),
+            "classes": [c.item() if hasattr(c, "item") else c for c in classes],
+            "original_features": encoder.original_features,
+            "feature_columns": encoder.feature_cols,
+        }, f)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp, cache_path)
+
+
+def load_dataset(csv_path=DEFAULT_CSV, features="all", chunksize=DEFAULT_CHUNKSIZE, sparse=False,
+                 test_size=0.2, random_state=42, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+    """Encoded, split training data for `csv_path` ('all' columns or the 'form' ones).
+
+    The stratified split is decided from the target read in the first pass, and
+    the second pass writes the training rows first, so X_train and X_test are
+    views of one float32 matrix. Dense results are cached (see module comment);
+    sparse ones are always rebuilt.
+    """
+    csv_path = resolve_csv_path(csv_path)
+    csv_sha256 = file_sha256(csv_path)
+    cache_path = None
+    if use_cache and cache_dir and not sparse:
+        cache_path = os.path.join(cache_dir, _cache_key(csv_sha256, features, test_size, random_state))
+        if os.path.exists(os.path.join(cache_path, "meta.json")):
+            try:
+                data = _read_cache(cache_path, csv_sha256)
+                print(f"Loaded encoded dataset from cache {cache_path}")
+                return data
+            except Exception as e:
+                print(f"Ignoring unreadable dataset cache {cache_path}: {e}")
+
+    schema = scan_schema(csv_path, features, chunksize)
+    if schema["n_missing_target"]:
+        print(f"Skipped {schema['n_missing_target']} rows without a target value")
+    y = schema["y"]
+    if len(np.unique(y)) < 2:
+        raise ValueError(f"Target has fewer than 2 classes: {list(schema['classes'])}")
+    encoder = FeatureEncoder.from_vocabulary(schema["features"], schema["numeric"], schema["categorical"])
+    idx_train, idx_test = train_test_split(np.arange(len(y)), test_size=test_size, random_state=random_state, stratify=y)
+    order = np.concatenate([idx_train, idx_test])
+    X = build_matrix(csv_path, schema, encoder, order, chunksize, sparse)
+    y = y[order]
+    n_train = len(idx_train)
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            _write_cache(cache_path, X, y, n_train, encoder, schema["classes"], csv_sha256)
+        except OSError as e:
+            print(f"Could not write dataset cache {cache_path}: {e}")
+    return Dataset(X[:n_train], X[n_train:], y[:n_train], y[n_train:], encoder,
+                   label_encoder_for(schema["classes"]), csv_sha256, False)
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+
+class SessionUser(UserMixin):
+    """Read-only snapshot of the User columns pages need, detached from any DB session."""
+
+    __slots__ = ('id', 'username', 'email')
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email)
+
+
+class UserCache:
+    """Per-process LRU of SessionUser snapshots for Flask-Login's user_loader.
+
+    Without it every authenticated request runs a SELECT on the users table just
+    to put current_user together. Writes to a User in this process drop its
+    entry straight away (see models.py); the TTL bounds how long another worker
+    can keep serving a snapshot of a user that was changed or deleted elsewhere.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        """Cached snapshot for user_id, or load(user_id) -> User/None on a miss (None is not cached)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        user = load(user_id)
+        if user is None:
+            self.invalidate(user_id)
+            return None
+        snapshot = SessionUser.from_user(user)
+        with self._lock:
+            self._entries[user_id] = (snapshot, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
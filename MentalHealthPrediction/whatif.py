@@ -0,0 +1,119 @@
+import itertools
+import numbers
+
+import numpy as np
+
+# What-if sensitivity for one input row.
+#
+# build_grid() takes the user's pre-one-hot row and lays out every single-field
+# change to a Likert or categorical field (and optionally every pair of changes to
+# two different fields) as rows of one (n, n_features) array. It starts from the
+# encoded row and overwrites only each field's own columns with NumPy block
+# assignments, so the whole grid is scored with a single predict_proba call.
+# sensitivity() turns the positive-class probabilities back into a compact table:
+# per field, each alternative value with its probability and change from the
+# user's own score, plus the pairs that move the risk the most.
+
+# 1-5 scales on the form; other numeric fields (Age, CGPA, hours) are continuous and not varied
+LIKERT_FIELDS = ('Academic Pressure', 'Work Pressure', 'Study Satisfaction', 'Financial Stress')
+LIKERT_LEVELS = (1, 2, 3, 4, 5)
+# Categorical value without a dummy column (dropped at training time or never seen): encodes as all zeros
+OTHER_LEVEL = '(other)'
+# Upper bound on grid rows per request; pairs are the part that grows quadratically
+MAX_ROWS = 5000
+TOP_PAIRS = 10
+
+
+def _field_levels(encoder, name, current):
+    """(column indices, [(value, column values)]) for every alternative value of one field."""
+    if name in encoder.categorical:
+        categories = encoder.categorical[name]
+        if not categories:
+            return None
+        cols = list(categories.values())
+        levels = []
+        for value, idx in categories.items():
+            if value != current:
+                vec = np.zeros(len(cols))
+                vec[cols.index(idx)] = 1.0
+                levels.append((value, vec))
+        if current in categories:
+            levels.append((OTHER_LEVEL, np.zeros(len(cols))))
+        return cols, levels
+    if name in encoder.numeric and name in LIKERT_FIELDS:
+        current = current if isinstance(current, numbers.Real) and not isinstance(current, bool) else None
+        levels = [(v, np.array([float(v)])) for v in LIKERT_LEVELS if current is None or float(v) != float(current)]
+        return [encoder.numeric[name]], levels
+    return None
+
+
+def build_grid(encoder, orig_row, fields=None, pairs=False, max_rows=MAX_ROWS):
+    """Encode orig_row and all its perturbations.
+
+    Returns (X, changes): row 0 of X is the unchanged input and changes[i] is the
+    tuple of (field, value) edits that produced row i (empty for row 0). Pairs
+    are only added when they fit within max_rows.
+    """
+    names = [n for n in encoder.original_features if fields is None or n in fields]
+    per_field = []
+    for name in names:
+        spec = _field_levels(encoder, name, orig_row.get(name))
+        if spec is not None and spec[1]:
+            per_field.append((name,) + spec)
+
+    n_single = sum(len(levels) for _, _, levels in per_field)
+    field_pairs = list(itertools.combinations(range(len(per_field)), 2)) if pairs else []
+    n_pairs = sum(len(per_field[a][2]) * len(per_field[b][2]) for a, b in field_pairs)
+    if 1 + n_single + n_pairs > max_rows:
+        field_pairs, n_pairs = [], 0
+
+    base = encoder.encode(orig_row)
+    X = np.repeat(base, 1 + n_single + n_pairs, axis=0)
+    changes = [()]
+    start = 1
+    for name, cols, levels in per_field:
+        block = np.stack([vec for _, vec in levels])
+        X[start:start + len(levels), cols] = block
+        changes.extend(((name, value),) for value, _ in levels)
+        start += len(levels)
+    for a, b in field_pairs:
+        name_a, cols_a, levels_a = per_field[a]
+        name_b, cols_b, levels_b = per_field[b]
+        n = len(levels_a) * len(levels_b)
+        # every level of a against every level of b: a varies slowest
+        X[start:start + n, cols_a] = np.repeat(np.stack([v for _, v in levels_a]), len(levels_b), axis=0)
+        X[start:start + n, cols_b] = np.tile(np.stack([v for _, v in levels_b]), (len(levels_a), 1))
+        changes.extend(((name_a, va), (name_b, vb)) for va, _ in levels_a for vb, _ in levels_b)
+        start += n
+    return X, changes
+
+
+def sensitivity(orig_row, changes, prob_pos, top_pairs=TOP_PAIRS):
+    """Compact table from the probabilities of build_grid()'s rows.
+
+    fields: {field: {'current': value, 'levels': [[value, probability, delta], ...]}}
+    pairs:  the top_pairs pairs with the largest absolute change, each with the
+            interaction (pair delta minus the sum of the two single deltas).
+    """
+    prob_pos = np.asarray(prob_pos, dtype=np.float64)
+    base = float(prob_pos[0])
+    deltas = prob_pos - base
+    fields = {}
+    single = {}
+    pair_rows = []
+    for i, change in enumerate(changes):
+        if len(change) == 1:
+            (name, value), = change
+            entry = fields.setdefault(name, {'current': orig_row.get(name), 'levels': []})
+            entry['levels'].append([value, round(float(prob_pos[i]), 4), round(float(deltas[i]), 4)])
+            single[change[0]] = float(deltas[i])
+        elif len(change) == 2:
+            pair_rows.append(i)
+    pair_rows.sort(key=lambda i: -abs(deltas[i]))
+    pairs = []
+    for i in pair_rows[:top_pairs]:
+        a, b = changes[i]
+        pairs.append({'changes': {a[0]: a[1], b[0]: b[1]}, 'probability': round(float(prob_pos[i]), 4),
+                      'delta': round(float(deltas[i]), 4),
+                      'interaction': round(float(deltas[i]) - single.get(a, 0.0) - single.get(b, 0.0), 4)})
+    return {'probability': round(base, 4), 'fields': fields, 'pairs': pairs, 'rows_scored': len(changes)}